@@ -0,0 +1,349 @@
+import os
+import re
+import math
+import time
+import heapq
+import asyncio
+import itertools
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy import select, func
+from starlette.datastructures import Headers, QueryParams
+
+from database import Job
+from jobs import ACTIVE_STATUSES
+from llm_router import OLLAMA_HOSTS, LLM_HOST_CONCURRENCY
+import telemetry
+
+# Requests per second and burst size allowed per API key (X-API-Key, else client address); 0 disables
+RATE_LIMIT = float(os.getenv("PAGEMONK_RATE_LIMIT", "20"))
+RATE_BURST = float(os.getenv("PAGEMONK_RATE_BURST", "100"))
+# Per-key overrides: "key:rate[:burst],..."
+RATE_LIMIT_KEYS = os.getenv("PAGEMONK_RATE_LIMIT_KEYS", "")
+# Clients whose buckets are remembered; the least recently seen are forgotten first
+RATE_LIMIT_CLIENTS = int(os.getenv("PAGEMONK_RATE_LIMIT_CLIENTS", "10000"))
+# Largest accepted upload, checked against Content-Length and again while the body streams
+MAX_UPLOAD_BYTES = int(float(os.getenv("PAGEMONK_MAX_UPLOAD_MB", "100")) * 1024 * 1024)
+# Uploads received at once, and uploads allowed to wait for a turn
+UPLOAD_CONCURRENCY = int(os.getenv("PAGEMONK_UPLOAD_CONCURRENCY", "8"))
+UPLOAD_QUEUE = int(os.getenv("PAGEMONK_UPLOAD_QUEUE", "32"))
+# Structuring and extraction requests served at once by this process, and how many may wait
+LLM_REQUEST_CONCURRENCY = int(
+    os.getenv("PAGEMONK_LLM_REQUEST_CONCURRENCY", str(LLM_HOST_CONCURRENCY * len(OLLAMA_HOSTS)))
+)
+LLM_REQUEST_QUEUE = int(os.getenv("PAGEMONK_LLM_REQUEST_QUEUE", "32"))
+# Queued parse jobs above which /parse is refused; 0 disables
+PARSE_QUEUE_LIMIT = int(os.getenv("PAGEMONK_PARSE_QUEUE_LIMIT", "1000"))
+# Share of each queue and of each stage's slots bulk work may take; the rest is kept for interactive requests
+BULK_SHARE = float(os.getenv("PAGEMONK_BULK_SHARE", "0.5"))
+# Longest a request waits for a stage slot before it is turned away
+MAX_WAIT_SECONDS = float(os.getenv("PAGEMONK_ADMISSION_MAX_WAIT", "30"))
+RETRY_AFTER_MAX = 300
+
+INTERACTIVE = 0
+BULK = 1
+PRIORITIES = {"interactive": INTERACTIVE, "bulk": BULK}
+PRIORITY_NAMES = {value: name for name, value in PRIORITIES.items()}
+
+
+class Overloaded(Exception):
+    """A request turned away so the service can keep up with the work it already has"""
+
+    def __init__(self, stage: str, retry_after: float, reason: str):
+        super().__init__(f"{stage} is over capacity ({reason})")
+        self.stage = stage
+        self.reason = reason
+        self.retry_after = max(1, min(RETRY_AFTER_MAX, math.ceil(retry_after)))
+        telemetry.ADMISSION_REJECTED.labels(stage, reason).inc()
+
+
+def overloaded_response(exc: Overloaded) -> JSONResponse:
+    return JSONResponse(
+        {"detail": str(exc), "stage": exc.stage, "reason": exc.reason, "retry_after": exc.retry_after},
+        status_code=429,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, cost: float = 1) -> float:
+        """Spend tokens; returns 0 if there were enough, else seconds until there will be"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+def _parse_key_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+    limits = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        key, _, rest = entry.partition(":")
+        rate, _, burst = rest.partition(":")
+        limits[key] = (float(rate), float(burst or RATE_BURST))
+    return limits
+
+
+class RateLimiter:
+    """Token buckets per client, held in this process"""
+
+    def __init__(self, rate: float = RATE_LIMIT, burst: float = RATE_BURST, key_limits: str = RATE_LIMIT_KEYS,
+                 max_clients: int = RATE_LIMIT_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.key_limits = _parse_key_limits(key_limits)
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def check(self, client: str, stage: str, cost: float = 1):
+        """Charge a request to its client's bucket, raising Overloaded when it is empty"""
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            rate, burst = self.key_limits.get(client.removeprefix("key:"), (self.rate, self.burst))
+            if rate <= 0:
+                return
+            bucket = self._buckets[client] = TokenBucket(rate, burst)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+        wait = bucket.take(min(cost, bucket.burst))
+        if wait:
+            raise Overloaded(stage, wait, "rate_limited")
+
+
+def client_key(headers: Headers, scope) -> str:
+    api_key = headers.get("x-api-key")
+    if api_key:
+        return f"key:{api_key}"
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class StageGate:
+    """Bounded, prioritised admission to a stage served by this process
+
+    At most `concurrency` requests run at once; up to `queue_limit` more wait,
+    interactive ones first. Bulk requests may use only BULK_SHARE of the slots
+    and of the queue. A request that cannot wait is refused with a Retry-After
+    estimated from the queue ahead of it and recent service times.
+    """
+
+    def __init__(self, stage: str, concurrency: int, queue_limit: int):
+        self.stage = stage
+        self.concurrency = concurrency
+        self.queue_limit = queue_limit
+        self.bulk_concurrency = max(1, int(concurrency * BULK_SHARE))
+        self.running = {INTERACTIVE: 0, BULK: 0}
+        self.waiting = {INTERACTIVE: 0, BULK: 0}
+        self.service_seconds = 1.0  # moving average of how long a request holds its slot
+        self._waiters: List[tuple] = []  # heap of (priority, sequence, future)
+        self._sequence = itertools.count()
+
+    def _can_run(self, priority: int) -> bool:
+        if sum(self.running.values()) >= self.concurrency:
+            return False
+        return priority == INTERACTIVE or self.running[BULK] < self.bulk_concurrency
+
+    def retry_after(self) -> float:
+        return (sum(self.waiting.values()) + 1) * self.service_seconds / self.concurrency
+
+    async def acquire(self, priority: int):
+        """Wait for a slot, raising Overloaded if the queue is full or the wait runs too long"""
+        ahead = self.waiting[INTERACTIVE] + (self.waiting[BULK] if priority == BULK else 0)
+        if not ahead and self._can_run(priority):
+            self.running[priority] += 1
+            return
+
+        queue_limit = self.queue_limit if priority == INTERACTIVE else int(self.queue_limit * BULK_SHARE)
+        if sum(self.waiting.values()) >= queue_limit:
+            raise Overloaded(self.stage, self.retry_after(), "queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self.waiting[priority] += 1
+        telemetry.ADMISSION_WAITING.labels(self.stage).inc()
+        start = time.monotonic()
+        try:
+            await asyncio.wait({future}, timeout=MAX_WAIT_SECONDS)
+        except asyncio.CancelledError:
+            # The client went away; give back a slot granted meanwhile
+            if future.done():
+                self.release(priority, 0)
+            else:
+                self._abandon(priority, future)
+            raise
+        finally:
+            telemetry.ADMISSION_WAITING.labels(self.stage).dec()
+        telemetry.ADMISSION_WAIT_SECONDS.labels(self.stage, PRIORITY_NAMES[priority]).observe(time.monotonic() - start)
+        if not future.done():
+            self._abandon(priority, future)
+            raise Overloaded(self.stage, self.retry_after(), "wait_timeout")
+
+    def release(self, priority: int, elapsed: float):
+        self.running[priority] -= 1
+        self.service_seconds += 0.2 * (elapsed - self.service_seconds)
+        self._grant()
+
+    def _abandon(self, priority: int, future: asyncio.Future):
+        # Left in the heap; _grant skips it
+        future.cancel()
+        self.waiting[priority] -= 1
+
+    def _grant(self):
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._can_run(priority):
+                return
+            heapq.heappop(self._waiters)
+            self.running[priority] += 1
+            self.waiting[priority] -= 1
+            future.set_result(None)
+
+    def status(self) -> Dict[str, object]:
+        return {
+            "concurrency": self.concurrency,
+            "queue_limit": self.queue_limit,
+            "running": {PRIORITY_NAMES[p]: n for p, n in self.running.items()},
+            "waiting": {PRIORITY_NAMES[p]: n for p, n in self.waiting.items()},
+            "service_seconds": round(self.service_seconds, 3),
+        }
+
+
+def check_parse_queue(db, document_id: int, priority: int):
+    """Refuse new parse jobs while the queue is full, with a Retry-After from the recent completion rate
+
+    A document that already has an active job is let through; its job is reused.
+    """
+    if PARSE_QUEUE_LIMIT <= 0:
+        return
+    active = db.scalar(
+        select(Job.id)
+        .where(Job.document_id == document_id, Job.kind == "parse", Job.status.in_(ACTIVE_STATUSES))
+        .limit(1)
+    )
+    if active:
+        return
+    limit = PARSE_QUEUE_LIMIT if priority == INTERACTIVE else int(PARSE_QUEUE_LIMIT * BULK_SHARE)
+    queued = db.scalar(select(func.count()).select_from(Job).where(Job.status == "queued"))
+    if queued < limit:
+        return
+    window = 60
+    completed = db.scalar(
+        select(func.count()).select_from(Job).where(
+            Job.status == "completed", Job.updated_at >= datetime.utcnow() - timedelta(seconds=window)
+        )
+    )
+    excess = queued - limit + 1
+    raise Overloaded("parse", excess * window / completed if completed else RETRY_AFTER_MAX, "queue_full")
+
+
+# Ingestion routes: (method, path, stage, default priority). A stage with a gate
+# below limits how many of its requests this process serves at once.
+ROUTES = [
+    ("POST", re.compile(r"/upload"), "upload", INTERACTIVE),
+    ("POST", re.compile(r"/parse/\d+"), "parse", INTERACTIVE),
+    ("POST", re.compile(r"/structure(/stream)?"), "llm", INTERACTIVE),
+    ("POST", re.compile(r"/extract/batch"), "llm", BULK),
+    ("POST", re.compile(r"/extract/\d+"), "llm", INTERACTIVE),
+]
+
+rate_limiter = RateLimiter()
+gates = {
+    gate.stage: gate
+    for gate in (
+        StageGate("upload", UPLOAD_CONCURRENCY, UPLOAD_QUEUE),
+        StageGate("llm", LLM_REQUEST_CONCURRENCY, LLM_REQUEST_QUEUE),
+    )
+    if gate.concurrency > 0
+}
+
+
+def request_priority(query_string: str, default: int) -> int:
+    """The priority a request asks for with ?priority=; it may lower its route's default, not raise it"""
+    requested = PRIORITIES.get(QueryParams(query_string).get("priority", ""), default)
+    return max(requested, default)
+
+
+def _limit_body(receive, limit: int):
+    received = 0
+
+    async def limited_receive():
+        nonlocal received
+        message = await receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > limit:
+                telemetry.ADMISSION_REJECTED.labels("upload", "too_large").inc()
+                raise HTTPException(status_code=413, detail=f"Upload exceeds {limit} bytes")
+        return message
+
+    return limited_receive
+
+
+class AdmissionMiddleware:
+    """Rate limits ingestion requests per client, caps upload size and queues them per stage
+
+    Runs before the request body is read, so refused uploads are not received
+    and a slot is held until the response, streamed or not, has been sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        route = _match(scope) if scope["type"] == "http" else None
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        stage, default_priority = route
+        priority = request_priority(scope.get("query_string", b"").decode("latin-1"), default_priority)
+        headers = Headers(scope=scope)
+        gate = gates.get(stage)
+        try:
+            rate_limiter.check(client_key(headers, scope), stage)
+            if stage == "upload":
+                length = headers.get("content-length", "")
+                if length.isdigit() and int(length) > MAX_UPLOAD_BYTES:
+                    telemetry.ADMISSION_REJECTED.labels(stage, "too_large").inc()
+                    response = JSONResponse({"detail": f"Upload exceeds {MAX_UPLOAD_BYTES} bytes"}, status_code=413)
+                    await response(scope, receive, send)
+                    return
+                receive = _limit_body(receive, MAX_UPLOAD_BYTES)
+            if gate:
+                await gate.acquire(priority)
+        except Overloaded as exc:
+            await overloaded_response(exc)(scope, receive, send)
+            return
+
+        start = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if gate:
+                gate.release(priority, time.monotonic() - start)
+
+
+def _match(scope) -> Optional[Tuple[str, int]]:
+    for method, path, stage, priority in ROUTES:
+        if scope["method"] == method and path.fullmatch(scope["path"]):
+            return stage, priority
+    return None
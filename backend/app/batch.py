@@ -0,0 +1,111 @@
+import os
+import json
+import asyncio
+from typing import AsyncIterator, Dict, Any, List
+
+from database import SessionLocal, Document, Schema
+from processor import processor
+from extractions import schema_version, find_extraction, save_extraction
+
+BATCH_CONCURRENCY = int(os.getenv("PAGEMONK_BATCH_CONCURRENCY", "4"))
+
+
+def load_schemas(db, schema_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """Load and decode each requested schema once for the whole batch"""
+    schemas = {}
+    for schema in db.query(Schema).filter(Schema.id.in_(schema_ids)).all():
+        schema_def = schema.schema_definition
+        if isinstance(schema_def, str):
+            schema_def = json.loads(schema_def)
+        schemas[schema.id] = schema_def
+    return schemas
+
+
+async def run_batch_extraction(
+    document_ids: List[int],
+    schemas: Dict[int, Dict[str, Any]],
+    concurrency: int = BATCH_CONCURRENCY,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Apply every schema to every document, yielding results as they finish
+
+    Documents are fanned out to a fixed number of worker coroutines. All
+    schemas for one document go out as a single merged prompt.
+    """
+    todo: asyncio.Queue = asyncio.Queue()
+    for document_id in document_ids:
+        todo.put_nowait(document_id)
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def worker():
+        # Each worker owns a session; it is only ever used from one thread at a time
+        db = SessionLocal()
+        try:
+            while True:
+                try:
+                    document_id = todo.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                for result in await _extract_document(db, document_id, schemas):
+                    await results.put(result)
+        finally:
+            db.close()
+
+    async def run_workers():
+        try:
+            await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(document_ids))))))
+        finally:
+            results.put_nowait(None)
+
+    runner = asyncio.ensure_future(run_workers())
+    try:
+        while True:
+            result = await results.get()
+            if result is None:
+                break
+            yield result
+        # Surface a worker crash instead of ending the stream silently
+        await runner
+    finally:
+        runner.cancel()
+
+
+async def _extract_document(db, document_id: int, schemas: Dict[int, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Extract all schemas from one document and persist the result"""
+    def load():
+        # Reading the text decompresses its blob, so it happens here rather than on the event loop
+        document = db.query(Document).filter(Document.id == document_id).first()
+        return document, document.original_content if document else None
+
+    document, content = await asyncio.to_thread(load)
+    if not document:
+        return [{"document_id": document_id, "schema_id": schema_id, "error": "Document not found"} for schema_id in schemas]
+    if not content:
+        return [{"document_id": document_id, "schema_id": schema_id, "error": "Document not yet processed"} for schema_id in schemas]
+
+    # Schemas already extracted from this text with the same version and model are reused
+    stored = await asyncio.to_thread(lambda: {
+        schema_id: find_extraction(db, document, schema_id, schema_version(schema))
+        for schema_id, schema in schemas.items()
+    })
+    results = {schema_id: extraction.result for schema_id, extraction in stored.items() if extraction}
+    pending = {schema_id: schema for schema_id, schema in schemas.items() if schema_id not in results}
+
+    if pending:
+        try:
+            extracted = await processor.extract_with_schemas(content, pending)
+        except Exception as e:
+            return [{"document_id": document_id, "schema_id": schema_id, "error": f"Extraction failed: {str(e)}"} for schema_id in schemas]
+
+        def persist():
+            for schema_id, (data, field_sources) in extracted.items():
+                save_extraction(db, document, schema_id, pending[schema_id], data, field_sources)
+            document.extracted_schema = extracted[list(pending)[-1]][0]
+            db.commit()
+
+        await asyncio.to_thread(persist)
+        results.update({schema_id: data for schema_id, (data, _) in extracted.items()})
+
+    return [
+        {"document_id": document_id, "schema_id": schema_id, "extracted_data": results[schema_id], "cached": schema_id not in pending}
+        for schema_id in schemas
+    ]
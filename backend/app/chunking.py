@@ -0,0 +1,162 @@
+import re
+from typing import List, NamedTuple, Optional, Tuple
+
+# Extracted text marks page boundaries with a form feed, like pdftotext does
+PAGE_BREAK = "\f"
+
+# Boundary strengths: the chunker prefers to cut at the strongest one available
+PARAGRAPH, HEADING, PAGE = 1, 2, 3
+
+_HEADING_RE = re.compile(
+    r"^(#{1,6}\s+\S.*"                        # markdown heading
+    r"|(\d+(\.\d+)*|[IVXLC]+)[.)]\s+[A-Z].{0,80}"  # numbered section: "3.2 Payment Terms"
+    r"|[A-Z][A-Z0-9 ,&/'()-]{3,80})$"           # short all-caps line: "TERMS AND CONDITIONS"
+)
+
+
+class Unit(NamedTuple):
+    text: str
+    page: int
+    boundary: int  # strength of the break before this unit
+    heading: Optional[str]
+
+
+class Chunk(NamedTuple):
+    index: int
+    text: str
+    first_page: int
+    last_page: int
+    heading: Optional[str]  # section heading in effect where the chunk starts
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for small models: about four characters per token"""
+    return len(text) // 4 + 1
+
+
+def split_pages(text: str) -> List[str]:
+    return text.split(PAGE_BREAK)
+
+
+def join_pages(pages: List[str], separator: str = f"\n{PAGE_BREAK}") -> Tuple[str, List[Tuple[int, int]]]:
+    """Join stripped page texts with page breaks, skipping blank pages
+
+    Also returns each page's (start, end) offsets in the joined text; blank
+    pages get an empty range.
+    """
+    parts: List[str] = []
+    offsets: List[Tuple[int, int]] = []
+    position = 0
+    for page in pages:
+        page = page.strip()
+        if not page:
+            offsets.append((position, position))
+            continue
+        if parts:
+            parts.append(separator)
+            position += len(separator)
+        parts.append(page)
+        offsets.append((position, position + len(page)))
+        position += len(page)
+    return "".join(parts), offsets
+
+
+def _split_oversized(text: str, max_tokens: int) -> List[str]:
+    """Break a block larger than the budget on lines, then hard character cuts"""
+    max_chars = max_tokens * 4
+    pieces, current = [], ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(line[:max_chars])
+            line = line[max_chars:]
+        if len(current) + len(line) > max_chars and current:
+            pieces.append(current)
+            current = ""
+        current += line
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _units(text: str, max_tokens: int) -> List[Unit]:
+    """Split text into paragraph units tagged with the boundary before each one"""
+    units = []
+    heading = None
+    for page_number, page in enumerate(split_pages(text), start=1):
+        boundary = PAGE
+        for block in re.split(r"\n\s*\n", page):
+            block = block.strip("\n")
+            if not block.strip():
+                continue
+
+            first_line = block.strip().splitlines()[0].strip()
+            if _HEADING_RE.match(first_line):
+                heading = first_line.lstrip("#").strip()
+                boundary = max(boundary, HEADING)
+
+            for i, piece in enumerate(_split_oversized(block, max_tokens)):
+                units.append(Unit(piece, page_number, boundary if i == 0 else 0, heading))
+            boundary = PARAGRAPH
+    return units
+
+
+def _best_cut(units: List[Unit], sizes: List[int], max_tokens: int) -> int:
+    """Pick where to end a chunk: the strongest boundary past half the budget"""
+    best, best_strength = len(units), -1
+    total = 0
+    for i in range(1, len(units)):
+        total += sizes[i - 1]
+        if total > max_tokens:
+            break
+        if total >= max_tokens // 2 and units[i].boundary >= best_strength:
+            best, best_strength = i, units[i].boundary
+    return best
+
+
+def chunk_text(text: str, max_tokens: int) -> List[Chunk]:
+    """Split text on page, heading and paragraph boundaries within a token budget"""
+    chunks: List[Chunk] = []
+    current: List[Unit] = []
+    sizes: List[int] = []
+
+    def emit(units: List[Unit]):
+        chunks.append(Chunk(
+            index=len(chunks),
+            text="\n\n".join(unit.text for unit in units),
+            first_page=units[0].page,
+            last_page=units[-1].page,
+            heading=units[0].heading,
+        ))
+
+    for unit in _units(text, max_tokens):
+        size = estimate_tokens(unit.text)
+        while current and sum(sizes) + size > max_tokens:
+            cut = _best_cut(current, sizes, max_tokens)
+            emit(current[:cut])
+            current, sizes = current[cut:], sizes[cut:]
+        current.append(unit)
+        sizes.append(size)
+
+    if current:
+        emit(current)
+    return chunks
+
+
+def continuity_note(chunks: List[Chunk], chunk: Chunk, overlap_chars: int = 300) -> str:
+    """Context given to a chunk so its markdown continues the previous one"""
+    if chunk.index == 0:
+        return f"This is part 1 of {len(chunks)} of a longer document."
+
+    previous_tail = chunks[chunk.index - 1].text[-overlap_chars:]
+    note = (
+        f"This is part {chunk.index + 1} of {len(chunks)} of a longer document. "
+        "Continue the structure of the previous parts: do not add a document title "
+        "and do not repeat content from the previous part.\n"
+        f"The previous part ended with:\n{previous_tail}"
+    )
+    if chunk.heading:
+        note += f"\nThe current section is: {chunk.heading}"
+    return note
@@ -1,28 +1,150 @@
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean
+import zlib
+import hashlib
+from typing import Dict
+from sqlalchemy import create_engine, event, select, union, Column, Index, Integer, Float, LargeBinary, String, Text, DateTime, Boolean
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker, object_session
 from datetime import datetime
 
-# SQLite database setup
-DATABASE_URL = "sqlite:///./pagemonk.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# Database setup: SQLite by default, any SQLAlchemy URL (e.g. postgresql://) via DATABASE_URL
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./pagemonk.db")
+DB_POOL_SIZE = int(os.getenv("PAGEMONK_DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("PAGEMONK_DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("PAGEMONK_DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("PAGEMONK_DB_POOL_RECYCLE", "1800"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("PAGEMONK_SQLITE_BUSY_TIMEOUT_MS", "30000"))
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune every new SQLite connection for concurrent readers and writers"""
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers proceed while one writer commits
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # NORMAL is durable across application crashes in WAL mode and avoids an fsync per commit
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-65536")  # 64 MiB page cache
+    cursor.close()
+
+def create_db_engine(url: str = DATABASE_URL):
+    """Build an engine with pragmas and pool sizing suited to the backend"""
+    if url.startswith("sqlite"):
+        in_memory = url in ("sqlite://", "sqlite:///:memory:")
+        pool_options = {} if in_memory else {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+        }
+        sqlite_engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+            **pool_options,
+        )
+        event.listen(sqlite_engine, "connect", _sqlite_pragmas)
+        return sqlite_engine
+
+    return create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+class ContentBlob(Base):
+    __tablename__ = "content_blobs"
+    
+    hash = Column(String, primary_key=True)  # SHA-256 of the uncompressed text
+    data = Column(LargeBinary)  # zlib-compressed UTF-8
+    size = Column(Integer)
+    compressed_size = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+def blob_hash(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+def load_blobs(session, hashes) -> Dict[str, str]:
+    """Fetch and decompress several blobs in one query"""
+    hashes = {digest for digest in hashes if digest}
+    if not hashes:
+        return {}
+    rows = session.query(ContentBlob.hash, ContentBlob.data).filter(ContentBlob.hash.in_(hashes)).all()
+    return {digest: zlib.decompress(data).decode("utf-8") for digest, data in rows}
+
+def _blob_attribute(name: str):
+    """A text attribute stored as a compressed, deduplicated blob and loaded on first access"""
+    hash_attr = f"{name}_hash"
+
+    def getter(self):
+        digest = getattr(self, hash_attr)
+        if digest is None:
+            return None
+        # Cached per digest, so a rollback that restores the old hash also restores the old text
+        loaded = self.__dict__.setdefault("_loaded_blobs", {})
+        if loaded.get(name, (None,))[0] != digest:
+            session = object_session(self)
+            if session is not None:
+                value = load_blobs(session, [digest]).get(digest)
+            else:
+                with SessionLocal() as session:
+                    value = load_blobs(session, [digest]).get(digest)
+            loaded[name] = (digest, value)
+        return loaded[name][1]
+
+    def setter(self, value):
+        if value is None:
+            setattr(self, hash_attr, None)
+            return
+        digest = blob_hash(value)
+        self.__dict__.setdefault("_loaded_blobs", {})[name] = (digest, value)
+        # Written by the before_flush hook below, together with the row that references it
+        self.__dict__.setdefault("_pending_blobs", {})[digest] = value
+        setattr(self, hash_attr, digest)
+
+    return property(getter, setter)
+
 class Document(Base):
     __tablename__ = "documents"
     
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, index=True)
-    original_content = Column(Text)
-    markdown_content = Column(Text)
-    structured_content = Column(Text)
-    extracted_schema = Column(Text)
-    upload_date = Column(DateTime, default=datetime.utcnow)
+    # Large text lives in content_blobs; these hold the SHA-256 of each value
+    original_content_hash = Column(String)
+    markdown_content_hash = Column(String)
+    structured_content_hash = Column(String)
+    extracted_schema_hash = Column(String)
+    upload_date = Column(DateTime, default=datetime.utcnow, index=True)
     file_size = Column(Integer)
     file_type = Column(String)
-    processing_status = Column(String, default="pending")  # pending, processing, completed, failed
+    processing_status = Column(String, default="pending", index=True)  # pending, processing, completed, failed
+    content_hash = Column(String, index=True)  # SHA-256 of the uploaded file
+    storage_path = Column(String)
+    # Revisions of a document form a chain through previous_version_id
+    version = Column(Integer, default=1)
+    previous_version_id = Column(Integer, index=True)
+
+    # Supports status-filtered keyset pagination without a sort
+    __table_args__ = (Index("ix_documents_status_id", "processing_status", "id"),)
+
+    @property
+    def file_path(self) -> str:
+        """Location of the uploaded file on disk"""
+        # Documents uploaded before the blob store were saved by filename
+        return self.storage_path or os.path.join("uploads", self.filename)
+
+    original_content = _blob_attribute("original_content")
+    markdown_content = _blob_attribute("markdown_content")
+    structured_content = _blob_attribute("structured_content")
+    extracted_schema = _blob_attribute("extracted_schema")
 
 class Schema(Base):
     __tablename__ = "schemas"
@@ -34,8 +156,151 @@ class Schema(Base):
     created_date = Column(DateTime, default=datetime.utcnow)
     is_active = Column(Boolean, default=True)
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, index=True)
+    kind = Column(String, default="parse")
+    status = Column(String, default="queued", index=True)  # queued, running, completed, failed
+    priority = Column(Integer, default=0)  # 0 interactive, 1 bulk; lower runs first
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    next_run_at = Column(DateTime, default=datetime.utcnow, index=True)
+    claim_token = Column(String, index=True)
+    locked_at = Column(DateTime)
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class JobEvent(Base):
+    """Progress events for a document's processing, read by the SSE endpoint"""
+    __tablename__ = "job_events"
+    
+    id = Column(Integer, primary_key=True)
+    document_id = Column(Integer)
+    job_id = Column(Integer)
+    event = Column(String)  # uploaded, queued, processing, page, text_extracted, chunk, markdown, retry, completed, failed
+    data = Column(Text)  # JSON payload
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+    __table_args__ = (Index("ix_job_events_document_id", "document_id", "id"),)
+
+class Extraction(Base):
+    __tablename__ = "extractions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, index=True)
+    schema_id = Column(Integer, index=True)
+    schema_version = Column(String)  # hash of the schema definition used
+    model = Column(String)
+    content_hash = Column(String)  # original_content_hash of the text that was extracted from
+    result = Column(Text)  # extracted JSON as returned to the client
+    field_sources = Column(Text)  # JSON {field: "rule" | "llm"}
+    is_current = Column(Boolean, default=True)  # latest extraction for this document and schema
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_extractions_lookup", "document_id", "schema_id", "schema_version", "model"),
+        Index("ix_extractions_schema_current", "schema_id", "is_current"),
+    )
+
+class ExtractionValue(Base):
+    """One extracted scalar per row, so documents can be filtered by field value"""
+    __tablename__ = "extraction_values"
+    
+    id = Column(Integer, primary_key=True)
+    extraction_id = Column(Integer, index=True)
+    document_id = Column(Integer)
+    schema_id = Column(Integer)
+    field = Column(String)  # dotted path for nested fields: "line_items.amount"
+    value_text = Column(Text)
+    value_number = Column(Float)  # set when the value is numeric or a parseable amount
+
+    __table_args__ = (
+        Index("ix_extraction_values_number", "schema_id", "field", "value_number"),
+        Index("ix_extraction_values_text", "schema_id", "field", "value_text"),
+    )
+
+class SearchChunk(Base):
+    """A chunk of a document's text in the search index; its id is its row in the vector file"""
+    __tablename__ = "search_chunks"
+    
+    id = Column(Integer, primary_key=True)
+    document_id = Column(Integer, index=True)
+    content_hash = Column(String)  # original_content_hash of the indexed text
+    ordinal = Column(Integer)
+    first_page = Column(Integer)
+    last_page = Column(Integer)
+    text = Column(Text)
+    length = Column(Integer)  # tokens, for BM25 length normalization
+
+class SearchPosting(Base):
+    """Inverted index: how often a term occurs in a chunk"""
+    __tablename__ = "search_postings"
+    
+    term = Column(String, primary_key=True)
+    chunk_id = Column(Integer, primary_key=True)
+    document_id = Column(Integer)
+    tf = Column(Integer)
+    chunk_length = Column(Integer)  # copied from the chunk so scoring needs no join
+
+    __table_args__ = (Index("ix_search_postings_document", "document_id"),)
+
+class DocumentPage(Base):
+    """A page of a parsed document: its fingerprints and where its text and markdown are
+
+    Offsets point into the document's original_content and markdown_content.
+    Pages structured together share a segment, and its markdown range.
+    """
+    __tablename__ = "document_pages"
+    
+    document_id = Column(Integer, primary_key=True)
+    page_number = Column(Integer, primary_key=True)
+    fingerprint = Column(String)  # hash of the page in the source file
+    text_hash = Column(String, index=True)  # SHA-256 of the page's extracted text
+    text_start = Column(Integer)
+    text_end = Column(Integer)
+    segment_first_page = Column(Integer)
+    markdown_start = Column(Integer)
+    markdown_end = Column(Integer)
+
+@event.listens_for(Session, "before_flush")
+def _write_pending_blobs(session, flush_context, instances):
+    """Insert blobs set on documents in this flush, skipping ones already stored"""
+    pending = {}
+    for obj in list(session.new) + list(session.dirty):
+        pending.update(obj.__dict__.pop("_pending_blobs", {}))
+    for digest, value in pending.items():
+        data = zlib.compress(value.encode("utf-8"), 6)
+        session.execute(
+            _insert_ignore(ContentBlob).values(
+                hash=digest,
+                data=data,
+                size=len(value.encode("utf-8")),
+                compressed_size=len(data),
+                created_at=datetime.utcnow(),
+            )
+        )
+
+def _insert_ignore(table):
+    """INSERT that silently skips rows whose primary key already exists"""
+    if engine.dialect.name == "postgresql":
+        return postgresql_insert(table).on_conflict_do_nothing()
+    return sqlite_insert(table).on_conflict_do_nothing()
+
+def prune_unreferenced_blobs(session) -> int:
+    """Delete blobs no document points at any more"""
+    referenced = union(*[
+        select(column).where(column.isnot(None))
+        for column in (
+            Document.original_content_hash,
+            Document.markdown_content_hash,
+            Document.structured_content_hash,
+            Document.extracted_schema_hash,
+        )
+    ])
+    return session.query(ContentBlob).filter(ContentBlob.hash.notin_(referenced)).delete(synchronize_session=False)
 
 def get_db():
     db = SessionLocal()
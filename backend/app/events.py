@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+from database import SessionLocal, Document, JobEvent
+
+# How often the SSE endpoint checks for new events
+EVENT_POLL_INTERVAL = float(os.getenv("PAGEMONK_EVENT_POLL_INTERVAL", "0.25"))
+# Generated markdown is written as one event per this many seconds, not per token
+EVENT_FLUSH_INTERVAL = float(os.getenv("PAGEMONK_EVENT_FLUSH_INTERVAL", "0.2"))
+EVENT_RETENTION_SECONDS = int(os.getenv("PAGEMONK_EVENT_RETENTION", "3600"))
+# Comment lines keep idle connections open through proxies
+KEEPALIVE_SECONDS = 15
+
+TERMINAL_EVENTS = {"completed", "failed"}
+
+
+def record_event(db, document_id: int, event: str, data: Optional[Dict[str, Any]] = None, job_id: Optional[int] = None):
+    """Add an event to the caller's session; it is written with the caller's commit"""
+    db.add(JobEvent(document_id=document_id, job_id=job_id, event=event, data=json.dumps(data or {})))
+
+
+def write_event(document_id: int, event: str, data: Optional[Dict[str, Any]] = None, job_id: Optional[int] = None):
+    """Write an event in its own transaction, independent of any work in progress"""
+    with SessionLocal() as db:
+        record_event(db, document_id, event, data, job_id)
+        db.commit()
+
+
+def prune_events(db) -> int:
+    cutoff = datetime.utcnow() - timedelta(seconds=EVENT_RETENTION_SECONDS)
+    return db.query(JobEvent).filter(JobEvent.created_at < cutoff).delete(synchronize_session=False)
+
+
+class EventRecorder:
+    """Emits a job's progress events, batching generated markdown into few writes"""
+
+    def __init__(self, document_id: int, job_id: Optional[int] = None):
+        self.document_id = document_id
+        self.job_id = job_id
+        self._markdown: List[str] = []
+        self._last_flush = time.monotonic()
+
+    async def emit(self, event: str, **data):
+        await self.flush()
+        await asyncio.to_thread(write_event, self.document_id, event, data, self.job_id)
+
+    async def markdown(self, text: str):
+        self._markdown.append(text)
+        if time.monotonic() - self._last_flush >= EVENT_FLUSH_INTERVAL:
+            await self.flush()
+
+    async def flush(self):
+        self._last_flush = time.monotonic()
+        if self._markdown:
+            text, self._markdown = "".join(self._markdown), []
+            await asyncio.to_thread(write_event, self.document_id, "markdown", {"text": text}, self.job_id)
+
+
+def format_sse(event: str, data: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _events_after(document_id: int, after_id: int, kinds: Optional[Iterable[str]] = None):
+    with SessionLocal() as db:
+        query = db.query(JobEvent).filter(JobEvent.document_id == document_id, JobEvent.id > after_id)
+        if kinds is not None:
+            query = query.filter(JobEvent.event.in_(kinds))
+        events = query.order_by(JobEvent.id).all()
+        status = None
+        if not events:
+            status = db.query(Document.processing_status).filter(Document.id == document_id).scalar()
+        return [(e.id, e.event, json.loads(e.data or "{}")) for e in events], status
+
+
+async def stream_events(document_id: int, after_id: int = 0) -> AsyncIterator[str]:
+    """Yield a document's progress events as SSE until processing completes or fails
+
+    Events are read from the job_events table, so progress made by worker
+    processes reaches any API process. Reconnecting clients resume after
+    the last event id they saw.
+    """
+    last_sent = time.monotonic()
+    while True:
+        events, status = await asyncio.to_thread(_events_after, document_id, after_id)
+        for event_id, event, data in events:
+            after_id = event_id
+            yield format_sse(event, data, event_id)
+            if event in TERMINAL_EVENTS:
+                return
+        if events:
+            last_sent = time.monotonic()
+        elif status in TERMINAL_EVENTS:
+            # Finished before events were recorded, or its events were pruned
+            yield format_sse(status, {"status": status})
+            return
+        elif time.monotonic() - last_sent >= KEEPALIVE_SECONDS:
+            last_sent = time.monotonic()
+            yield ": keepalive\n\n"
+        await asyncio.sleep(EVENT_POLL_INTERVAL)
+
+
+async def follow_pages(document_id: int) -> AsyncIterator[Dict[str, Any]]:
+    """Yield the page events of a document's running parse, then its final status
+
+    Items are page event payloads ({"page", "pages_done", "text"}) in the order
+    pages were extracted; the last item is {"status": "completed" | "failed"}.
+    """
+    after_id = 0
+    kinds = ("page", *TERMINAL_EVENTS)
+    while True:
+        events, status = await asyncio.to_thread(_events_after, document_id, after_id, kinds)
+        for event_id, event, data in events:
+            after_id = event_id
+            if event in TERMINAL_EVENTS:
+                yield {"status": event}
+                return
+            if "text" in data:
+                yield data
+        if not events and status in TERMINAL_EVENTS:
+            yield {"status": status}
+            return
+        await asyncio.sleep(EVENT_POLL_INTERVAL)
@@ -0,0 +1,155 @@
+import json
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from database import Document, Extraction, ExtractionValue
+from processor import parse_json_response, EXTRACTION_MODEL
+from validation import as_number
+
+# Comparison operators accepted by query filters
+NUMERIC_OPERATORS = {"gt", "gte", "lt", "lte"}
+FILTER_OPERATORS = NUMERIC_OPERATORS | {"eq", "ne", "contains"}
+
+
+def schema_version(schema_def: Dict[str, Any]) -> str:
+    """Identify a schema definition by its content, so edits start a new version"""
+    canonical = json.dumps(schema_def, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def flatten_values(data: Any, prefix: str = "") -> List[Tuple[str, Any]]:
+    """Flatten extracted JSON into (dotted field path, scalar) pairs
+
+    List items share their parent's path, so "line_items.amount" matches
+    any line item's amount.
+    """
+    if isinstance(data, dict):
+        return [
+            pair for key, value in data.items()
+            for pair in flatten_values(value, f"{prefix}.{key}" if prefix else key)
+        ]
+    if isinstance(data, list):
+        return [pair for item in data for pair in flatten_values(item, prefix)]
+    return [(prefix, data)] if prefix and data is not None else []
+
+
+def find_extraction(db, document: Document, schema_id: int, version: str, model: str = EXTRACTION_MODEL) -> Optional[Extraction]:
+    """Latest stored extraction of this document's current text with this schema version and model"""
+    return (
+        db.query(Extraction)
+        .filter(
+            Extraction.document_id == document.id,
+            Extraction.schema_id == schema_id,
+            Extraction.schema_version == version,
+            Extraction.model == model,
+            Extraction.content_hash == document.original_content_hash,
+        )
+        .order_by(Extraction.id.desc())
+        .first()
+    )
+
+
+def save_extraction(
+    db,
+    document: Document,
+    schema_id: int,
+    schema_def: Dict[str, Any],
+    result: str,
+    field_sources: Optional[Dict[str, str]] = None,
+    model: str = EXTRACTION_MODEL,
+) -> Extraction:
+    """Record an extraction and index its field values; the caller commits"""
+    db.query(Extraction).filter(
+        Extraction.document_id == document.id,
+        Extraction.schema_id == schema_id,
+        Extraction.is_current == True,
+    ).update({"is_current": False}, synchronize_session=False)
+
+    extraction = Extraction(
+        document_id=document.id,
+        schema_id=schema_id,
+        schema_version=schema_version(schema_def),
+        model=model,
+        content_hash=document.original_content_hash,
+        result=result,
+        field_sources=json.dumps(field_sources) if field_sources is not None else None,
+    )
+    db.add(extraction)
+    db.flush()
+
+    try:
+        parsed = parse_json_response(result)
+    except ValueError:
+        # Unparseable answers are kept for reference but cannot be queried
+        parsed = None
+    if isinstance(parsed, dict):
+        db.add_all(
+            ExtractionValue(
+                extraction_id=extraction.id,
+                document_id=document.id,
+                schema_id=schema_id,
+                field=field,
+                value_text=value if isinstance(value, str) else json.dumps(value),
+                value_number=as_number(value),
+            )
+            for field, value in flatten_values(parsed)
+        )
+    return extraction
+
+
+def _value_condition(op: str, value: Any):
+    number = as_number(value)
+    if op in NUMERIC_OPERATORS:
+        if number is None:
+            raise ValueError(f"Operator '{op}' needs a numeric value, got {value!r}")
+        column = ExtractionValue.value_number
+        return {
+            "gt": column > number, "gte": column >= number,
+            "lt": column < number, "lte": column <= number,
+        }[op]
+    if op == "contains":
+        return ExtractionValue.value_text.ilike(f"%{value}%")
+    if number is not None:
+        return ExtractionValue.value_number == number if op == "eq" else ExtractionValue.value_number != number
+    text_value = value if isinstance(value, str) else json.dumps(value)
+    return ExtractionValue.value_text == text_value if op == "eq" else ExtractionValue.value_text != text_value
+
+
+def query_extractions(db, schema_id: int, filters: List[Dict[str, Any]], limit: int = 100) -> List[Extraction]:
+    """Current extractions for a schema whose field values match every filter
+
+    Each filter is {"field", "op", "value"}; a filter matches when any
+    value stored under that field satisfies it.
+    """
+    query = db.query(Extraction).filter(Extraction.schema_id == schema_id, Extraction.is_current == True)
+    for condition in filters:
+        op = condition.get("op", "eq")
+        if op not in FILTER_OPERATORS:
+            raise ValueError(f"Unknown operator '{op}'; expected one of {sorted(FILTER_OPERATORS)}")
+        matching = select(ExtractionValue.extraction_id).where(
+            ExtractionValue.schema_id == schema_id,
+            ExtractionValue.field == condition["field"],
+            _value_condition(op, condition.get("value")),
+        )
+        query = query.filter(Extraction.id.in_(matching))
+    return query.order_by(Extraction.document_id).limit(limit).all()
+
+
+def extraction_payload(extraction: Extraction) -> Dict[str, Any]:
+    try:
+        data = parse_json_response(extraction.result)
+    except ValueError:
+        data = extraction.result
+    return {
+        "extraction_id": extraction.id,
+        "document_id": extraction.document_id,
+        "schema_id": extraction.schema_id,
+        "schema_version": extraction.schema_version,
+        "model": extraction.model,
+        "is_current": extraction.is_current,
+        "created_at": extraction.created_at.isoformat() if extraction.created_at else None,
+        "extracted_data": data,
+        "field_sources": json.loads(extraction.field_sources) if extraction.field_sources else None,
+    }
@@ -0,0 +1,416 @@
+import os
+import uuid
+import asyncio
+import threading
+import multiprocessing
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, update
+
+from database import SessionLocal, Document, Job, JobEvent
+from events import EventRecorder, record_event, prune_events
+from migrations import run_migrations
+from processor import processor, page_content, structure_pieces, STRUCTURE_CHUNK_TOKENS
+from chunking import join_pages
+import versions
+from telemetry import JOBS, stage, start_trace, record_stage, log_error, mark_process_dead
+
+# Queue settings, overridable through the environment
+WORKER_COUNT = int(os.getenv("PAGEMONK_WORKERS", "2"))
+MAX_ATTEMPTS = int(os.getenv("PAGEMONK_JOB_MAX_ATTEMPTS", "3"))
+RETRY_BACKOFF_SECONDS = float(os.getenv("PAGEMONK_JOB_RETRY_BACKOFF", "5"))
+LEASE_SECONDS = int(os.getenv("PAGEMONK_JOB_LEASE", "120"))
+POLL_INTERVAL = float(os.getenv("PAGEMONK_JOB_POLL_INTERVAL", "1.0"))
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+def enqueue_parse(db, document: Document, priority: int = 0) -> Job:
+    """Queue a parse job for a document, reusing an active job if there is one
+
+    Lower priority values are claimed first; an active job is raised to the
+    priority of a more urgent request for the same document.
+    """
+    job = (
+        db.query(Job)
+        .filter(Job.document_id == document.id, Job.kind == "parse", Job.status.in_(ACTIVE_STATUSES))
+        .first()
+    )
+    if job:
+        if job.status == "queued" and (job.priority or 0) > priority:
+            job.priority = priority
+            db.commit()
+        return job
+
+    job = Job(document_id=document.id, kind="parse", priority=priority, max_attempts=MAX_ATTEMPTS)
+    document.processing_status = "queued"
+    db.add(job)
+    # A new run starts a fresh event stream: drop events from earlier parses
+    db.query(JobEvent).filter(JobEvent.document_id == document.id, JobEvent.job_id.isnot(None)).delete(
+        synchronize_session=False
+    )
+    prune_events(db)
+    db.flush()
+    record_event(db, document.id, "queued", {"job_id": job.id}, job.id)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def claim_job(db) -> Optional[Job]:
+    """Atomically claim the most urgent, then oldest, runnable job, or return None if the queue is empty"""
+    token = uuid.uuid4().hex
+    now = datetime.utcnow()
+
+    next_id = (
+        select(Job.id)
+        .where(Job.status == "queued", Job.next_run_at <= now)
+        .order_by(Job.priority, Job.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    # The status check in the outer WHERE makes the claim a compare-and-set,
+    # so two workers racing for the same row cannot both win it.
+    result = db.execute(
+        update(Job)
+        .where(Job.id == next_id, Job.status == "queued")
+        .values(
+            status="running",
+            claim_token=token,
+            locked_at=now,
+            updated_at=now,
+            attempts=Job.attempts + 1,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+    if result.rowcount == 0:
+        return None
+    return db.query(Job).filter(Job.claim_token == token).first()
+
+
+def recover_stale_jobs(db) -> int:
+    """Requeue jobs whose worker stopped heartbeating and documents stuck in processing"""
+    cutoff = datetime.utcnow() - timedelta(seconds=LEASE_SECONDS)
+    recovered = 0
+
+    stale_jobs = db.query(Job).filter(Job.status == "running", Job.locked_at < cutoff).all()
+    for job in stale_jobs:
+        _schedule_retry(db, job, "Worker lease expired")
+        recovered += 1
+
+    # Documents left in "processing" without any live job (e.g. parsed inline
+    # before the queue existed, or the job row was lost) get a fresh job.
+    active_ids = select(Job.document_id).where(Job.status.in_(ACTIVE_STATUSES))
+    orphans = (
+        db.query(Document)
+        .filter(Document.processing_status.in_(("queued", "processing")), Document.id.notin_(active_ids))
+        .all()
+    )
+    for document in orphans:
+        db.add(Job(document_id=document.id, kind="parse", max_attempts=MAX_ATTEMPTS))
+        document.processing_status = "queued"
+        recovered += 1
+
+    db.commit()
+    return recovered
+
+
+def _schedule_retry(db, job: Job, error: str):
+    """Put a job back on the queue with exponential backoff, or fail it for good"""
+    now = datetime.utcnow()
+    document = db.query(Document).filter(Document.id == job.document_id).first()
+
+    job.last_error = error
+    job.claim_token = None
+    job.locked_at = None
+    job.updated_at = now
+
+    if job.attempts >= job.max_attempts:
+        job.status = "failed"
+        if document:
+            document.processing_status = "failed"
+            document.structured_content = f"Processing failed: {error}"
+        record_event(db, job.document_id, "failed", {"error": error, "attempts": job.attempts}, job.id)
+    else:
+        delay = RETRY_BACKOFF_SECONDS * (2 ** max(job.attempts - 1, 0))
+        job.status = "queued"
+        job.next_run_at = now + timedelta(seconds=delay)
+        if document:
+            document.processing_status = "queued"
+        record_event(db, job.document_id, "retry", {"error": error, "attempts": job.attempts, "delay": delay}, job.id)
+
+
+def find_parsed_duplicate(db, document: Document) -> Optional[Document]:
+    """Find another completed document with identical file content"""
+    if not document.content_hash:
+        return None
+    return (
+        db.query(Document)
+        .filter(
+            Document.content_hash == document.content_hash,
+            Document.id != document.id,
+            Document.processing_status == "completed",
+            Document.original_content_hash.isnot(None),
+        )
+        .order_by(Document.id.desc())
+        .first()
+    )
+
+
+async def process_parse(db, document: Document, events: Optional[EventRecorder] = None):
+    """Run OCR and LLM structuring for a document, reporting progress to `events`
+
+    Pages unchanged since the document's previous version (or a parsed copy
+    of the same file) keep their text and markdown; only the rest go through
+    OCR and the LLM. An earlier upload with the same filename lends its page
+    fingerprints to skip OCR, but only becomes the previous version if
+    enough pages match.
+    """
+    events = events or EventRecorder(document.id)
+
+    duplicate = find_parsed_duplicate(db, document)
+    base = duplicate or versions.previous_version(db, document)
+    candidate = None if base else versions.previous_upload(db, document)
+    base_pages = versions.load_pages(db, base or candidate) if base or candidate else []
+    if duplicate:
+        # Same bytes were already OCR'd; reuse the pages instead of redoing them
+        pages = [versions.Page(page.number, page.fingerprint, page.text) for page in base_pages]
+        pages = pages or versions.pages_from_text(duplicate.original_content)
+    else:
+        # Extract text using OCR
+        pages_done = 0
+
+        async def on_page(page_number, page_text):
+            nonlocal pages_done
+            pages_done += 1
+            # The text lets GET /documents/{id}/pages stream pages while the parse runs
+            await events.emit("page", page=page_number, pages_done=pages_done, text=page_text)
+
+        known = {page.fingerprint: page.text for page in base_pages if page.fingerprint}
+        pages = [versions.Page(*page) for page in await processor.extract_pages(document.file_path, on_page, known)]
+    raw_content = page_content(document.file_path, pages)
+    document.original_content = raw_content
+    await events.emit("text_extracted", characters=len(raw_content), reused=bool(duplicate))
+
+    if base is None:
+        base = versions.link_similar(db, document, pages, candidate)
+        if base is not candidate:
+            base_pages = versions.load_pages(db, base) if base else []
+
+    if any(page.text.strip() for page in pages):
+        segments = versions.plan_segments(pages, base_pages, STRUCTURE_CHUNK_TOKENS)
+    else:
+        # Nothing was extracted: structure the explanatory message, as before
+        segments = [versions.Segment(1, len(pages), raw_content, None)]
+
+    # Reused segments become one ready piece each; the rest go to the LLM
+    pieces, owners, ready = [], [], {}
+    for owner, text, context in structure_pieces([(s.text, s.first_page, s.last_page) for s in segments]):
+        if segments[owner].markdown is not None:
+            if owners and owners[-1] == owner:
+                continue
+            ready[len(pieces)] = segments[owner].markdown
+        pieces.append((text, context))
+        owners.append(owner)
+    if base_pages:
+        reused_pages = sum(s.last_page - s.first_page + 1 for s in segments if s.markdown is not None)
+        await events.emit("incremental", base_document_id=base.id, pages=len(pages), reused_pages=reused_pages)
+
+    # Structure using LLM, streaming markdown to listeners as it is generated
+    parts = [[] for _ in pieces]
+    current = 0
+    async for kind, payload in processor.stream_structure_pieces(pieces, ready=ready):
+        if kind == "chunk":
+            current, total = payload
+            await events.emit("chunk", index=current, total=total, reused=current in ready)
+        else:
+            parts[current].append(payload)
+            await events.markdown(payload)
+    await events.flush()
+
+    # Splice the segments' markdown back together in page order
+    segment_parts = [[] for _ in segments]
+    for owner, piece_parts in zip(owners, parts):
+        segment_parts[owner].append("".join(piece_parts).strip())
+    structured_content, markdown_offsets = join_pages(["\n\n".join(p) for p in segment_parts], "\n\n")
+    document.markdown_content = structured_content
+    document.structured_content = structured_content
+    versions.save_pages(db, document, pages, segments, markdown_offsets)
+
+
+def _commit(db):
+    with stage("db_commit"):
+        db.commit()
+
+
+async def run_job(db, job: Job):
+    """Execute a claimed job and record its outcome"""
+    start_trace(f"job-{job.id}")
+    record_stage("queue_wait", (datetime.utcnow() - job.next_run_at).total_seconds())
+
+    document = db.query(Document).filter(Document.id == job.document_id).first()
+    if not document:
+        job.status = "failed"
+        job.last_error = "Document not found"
+        job.updated_at = datetime.utcnow()
+        _commit(db)
+        JOBS.labels("failed").inc()
+        return
+
+    document.processing_status = "processing"
+    record_event(db, document.id, "processing", {"attempt": job.attempts}, job.id)
+    _commit(db)
+
+    try:
+        with stage("parse_job", document_id=document.id, attempt=job.attempts):
+            await process_parse(db, document, EventRecorder(document.id, job.id))
+    except Exception as e:
+        log_error("parse job failed", job_id=job.id, document_id=document.id, error=str(e))
+        db.rollback()
+        job = db.query(Job).filter(Job.id == job.id).first()
+        _schedule_retry(db, job, str(e))
+        _commit(db)
+        JOBS.labels("failed" if job.status == "failed" else "retried").inc()
+        return
+
+    document.processing_status = "completed"
+    job.status = "completed"
+    job.claim_token = None
+    job.updated_at = datetime.utcnow()
+    record_event(db, document.id, "completed", {"job_id": job.id}, job.id)
+    _commit(db)
+    JOBS.labels("completed").inc()
+
+    # The parse already succeeded: a failed index update is logged, not retried
+    import search
+    try:
+        with stage("search_index", document_id=document.id):
+            search.index_document(db, document)
+    except Exception as e:
+        db.rollback()
+        log_error("search indexing failed", document_id=document.id, error=str(e))
+
+
+class _Heartbeat:
+    """Keeps a claimed job's lease fresh while it runs"""
+
+    def __init__(self, job_id: int, token: str):
+        self.job_id = job_id
+        self.token = token
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(LEASE_SECONDS / 3):
+            db = SessionLocal()
+            try:
+                db.execute(
+                    update(Job)
+                    .where(Job.id == self.job_id, Job.claim_token == self.token)
+                    .values(locked_at=datetime.utcnow())
+                    .execution_options(synchronize_session=False)
+                )
+                db.commit()
+            except Exception as e:
+                log_error("refreshing job lease failed", job_id=self.job_id, error=str(e))
+            finally:
+                db.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def worker_loop(stop_event):
+    """Claim and run jobs until asked to stop"""
+    # One event loop per worker process, reused across jobs
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    last_recovery = datetime.min
+
+    while not stop_event.is_set():
+        db = SessionLocal()
+        try:
+            if datetime.utcnow() - last_recovery > timedelta(seconds=LEASE_SECONDS):
+                recover_stale_jobs(db)
+                last_recovery = datetime.utcnow()
+
+            job = claim_job(db)
+            if job is None:
+                stop_event.wait(POLL_INTERVAL)
+                continue
+
+            with _Heartbeat(job.id, job.claim_token):
+                loop.run_until_complete(run_job(db, job))
+        except Exception as e:
+            log_error("job worker error", error=str(e))
+            stop_event.wait(POLL_INTERVAL)
+        finally:
+            db.close()
+
+    processor.shutdown()
+    loop.close()
+
+
+class WorkerPool:
+    """A fixed-size pool of worker processes draining the job queue"""
+
+    def __init__(self, size: int = WORKER_COUNT):
+        self.size = size
+        self._ctx = multiprocessing.get_context("spawn")
+        # Created on start: it launches multiprocessing's resource tracker process
+        self._stop_event = None
+        self._processes = []
+
+    def start(self):
+        self._stop_event = self._ctx.Event()
+        db = SessionLocal()
+        try:
+            recover_stale_jobs(db)
+        finally:
+            db.close()
+
+        for i in range(self.size):
+            process = self._ctx.Process(
+                target=worker_loop,
+                args=(self._stop_event,),
+                name=f"pagemonk-worker-{i}",
+            )
+            process.start()
+            self._processes.append(process)
+
+    def alive(self) -> int:
+        return sum(process.is_alive() for process in self._processes)
+
+    def stop(self, timeout: float = 10.0):
+        if self._stop_event is None:
+            return
+        self._stop_event.set()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+            # Its in-flight gauges no longer count
+            mark_process_dead(process.pid)
+        self._processes = []
+
+
+if __name__ == "__main__":
+    # Standalone worker deployment: run the API with PAGEMONK_WORKERS=0 and
+    # start this module separately to scale workers independently.
+    run_migrations()
+    pool = WorkerPool(max(WORKER_COUNT, 1))
+    pool.start()
+    try:
+        for process in pool._processes:
+            process.join()
+    except KeyboardInterrupt:
+        pool.stop()
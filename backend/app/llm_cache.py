@@ -0,0 +1,140 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional, Dict, Any
+
+LLM_CACHE_DB = os.getenv("PAGEMONK_LLM_CACHE_DB", "llm_cache.db")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("PAGEMONK_LLM_CACHE_MAX_ENTRIES", "50000"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("PAGEMONK_LLM_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+LLM_CACHE_TTL = int(os.getenv("PAGEMONK_LLM_CACHE_TTL", str(30 * 24 * 3600)))
+
+
+def _sha256(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def normalize_template(template: str) -> str:
+    """Collapse whitespace so re-indented prompts share cache entries"""
+    return re.sub(r"\s+", " ", template or "").strip()
+
+
+def cache_key(model: str, template: str, content: str) -> str:
+    """Key an LLM call on model, normalized prompt template and content"""
+    template_hash = _sha256(normalize_template(template))
+    content_hash = _sha256(content or "")
+    return _sha256(f"{model}:{template_hash}:{content_hash}")
+
+
+class LLMCache:
+    """SQLite-backed LLM response cache with LRU, TTL and size-based eviction"""
+
+    def __init__(
+        self,
+        path: str = LLM_CACHE_DB,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        max_bytes: int = LLM_CACHE_MAX_BYTES,
+        ttl: int = LLM_CACHE_TTL,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, model TEXT, response TEXT, size INTEGER,"
+                " created_at REAL, last_access REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_last_access ON llm_cache (last_access)")
+            conn.execute("CREATE TABLE IF NOT EXISTS llm_cache_stats (name TEXT PRIMARY KEY, value INTEGER)")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, conn: sqlite3.Connection, name: str):
+        conn.execute(
+            "INSERT INTO llm_cache_stats (name, value) VALUES (?, 1)"
+            " ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+
+        if row and now - row[1] > self.ttl:
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            row = None
+
+        if row is None:
+            self._count(conn, "misses")
+            return None
+
+        conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+        self._count(conn, "hits")
+        return row[0]
+
+    def put(self, key: str, model: str, response: str):
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, model, response, size, created_at, last_access)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (key, model, response, len(response.encode("utf-8")), now, now),
+        )
+        self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Drop expired entries, then least recently used ones until under the limits"""
+        conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+
+        entries, total_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        if entries <= self.max_entries and total_bytes <= self.max_bytes:
+            return
+
+        evicted = 0
+        for key, size in conn.execute("SELECT key, size FROM llm_cache ORDER BY last_access").fetchall():
+            if entries <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            entries -= 1
+            total_bytes -= size
+            evicted += 1
+
+        conn.execute(
+            "INSERT INTO llm_cache_stats (name, value) VALUES ('evictions', ?)"
+            " ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (evicted,),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        counters = dict(conn.execute("SELECT name, value FROM llm_cache_stats").fetchall())
+        entries, total_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "entries": entries,
+            "bytes": total_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+        }
+
+
+llm_cache = LLMCache()
@@ -0,0 +1,377 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict, defaultdict
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from telemetry import (
+    stage, record_llm_call, log_error, LLM_ROUTED, LLM_COALESCED, LLM_HOST_IN_FLIGHT, LLM_HOST_ERRORS,
+)
+
+if TYPE_CHECKING:
+    import ollama
+
+# Ollama servers to spread LLM calls over; OLLAMA_HOST alone still works for one server
+OLLAMA_HOSTS = [
+    host.strip()
+    for host in os.getenv("OLLAMA_HOSTS", os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434")).split(",")
+    if host.strip()
+]
+# Concurrent requests (and pooled connections) per host, per process
+LLM_HOST_CONCURRENCY = int(os.getenv("PAGEMONK_LLM_HOST_CONCURRENCY", os.getenv("PAGEMONK_LLM_CONCURRENCY", "2")))
+# "affinity" keeps each model on the hosts that already have it loaded; "least_loaded" ignores models
+LLM_ROUTING = os.getenv("PAGEMONK_LLM_ROUTING", "affinity")
+# Models a host keeps loaded at once (Ollama's OLLAMA_MAX_LOADED_MODELS)
+LLM_MODELS_PER_HOST = int(os.getenv("PAGEMONK_LLM_MODELS_PER_HOST", "1"))
+# Sent with every request so Ollama keeps the model resident between calls ("-1" keeps it forever)
+LLM_KEEP_ALIVE = os.getenv("PAGEMONK_LLM_KEEP_ALIVE", "30m")
+# Calls waiting for a warm host, per slot on those hosts, before one is loaded elsewhere
+SPILL_QUEUE_FACTOR = 2
+# A host that refused a connection gets no traffic for this long
+LLM_HOST_RETRY_SECONDS = float(os.getenv("PAGEMONK_LLM_HOST_RETRY_SECONDS", "15"))
+
+
+def _host_errors() -> tuple:
+    """Failures that say nothing about the request itself, so another host may serve it"""
+    import httpx
+    return (ConnectionError, httpx.TransportError)
+
+
+def _keep_alive(value: str):
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+class OllamaHost:
+    """One Ollama server: its client, concurrency cap and the models believed loaded"""
+
+    def __init__(self, url: str, capacity: int):
+        self.url = url
+        self.capacity = capacity
+        self.in_flight = 0
+        # Least recently used first
+        self.models: "OrderedDict[str, None]" = OrderedDict()
+        self.down_until = 0.0
+        self._client = None
+
+    @property
+    def client(self) -> "ollama.AsyncClient":
+        if self._client is None:
+            # Imported on first use: the client stack is slow to import and API
+            # processes that never call the LLM should not pay for it
+            import httpx
+            import ollama
+            self._client = ollama.AsyncClient(
+                host=self.url,
+                limits=httpx.Limits(max_connections=self.capacity, max_keepalive_connections=self.capacity),
+            )
+        return self._client
+
+    @property
+    def load(self) -> Tuple[float, int]:
+        return self.in_flight / self.capacity, self.in_flight
+
+    def use(self, model: str, models_per_host: int):
+        self.models[model] = None
+        self.models.move_to_end(model)
+        while len(self.models) > models_per_host:
+            self.models.popitem(last=False)
+
+
+class _Broadcast:
+    """One streamed LLM call shared by every caller that asked for the same thing"""
+
+    def __init__(self):
+        self.parts: List[Mapping[str, Any]] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.listeners = 0
+        self.task: Optional[asyncio.Future] = None
+        self.changed = asyncio.Condition()
+
+    async def publish(self, part=None, error=None, done=False):
+        async with self.changed:
+            if part is not None:
+                self.parts.append(part)
+            self.error = error or self.error
+            self.done = done or self.done
+            self.changed.notify_all()
+
+    async def follow(self) -> AsyncIterator[Mapping[str, Any]]:
+        """Replay the parts produced so far, then yield new ones until the call ends"""
+        seen = 0
+        while True:
+            async with self.changed:
+                while seen >= len(self.parts) and not self.done:
+                    await self.changed.wait()
+                parts, seen = self.parts[seen:], len(self.parts)
+                done, error = self.done, self.error
+            for part in parts:
+                yield part
+            if done:
+                if error is not None:
+                    raise error
+                return
+
+
+class LLMRouter:
+    """Routes Ollama calls across a pool of hosts
+
+    Calls go to a host that already has the model loaded when one has a free
+    slot, so models are not swapped in and out. When every such host is busy
+    the call waits for one, unless the queue grows long; then the model is
+    loaded on a host with room for it, or on an idle host whose models no
+    call is waiting for. Identical calls in flight are coalesced into one
+    request whose answer every caller receives.
+    """
+
+    def __init__(
+        self,
+        hosts: Sequence[str] = OLLAMA_HOSTS,
+        capacity: int = LLM_HOST_CONCURRENCY,
+        routing: str = LLM_ROUTING,
+        models_per_host: int = LLM_MODELS_PER_HOST,
+        keep_alive: str = LLM_KEEP_ALIVE,
+    ):
+        self.hosts = [OllamaHost(url, capacity) for url in hosts]
+        self.routing = routing
+        self.models_per_host = models_per_host
+        self.keep_alive = _keep_alive(keep_alive)
+        self._changed = asyncio.Condition()
+        self._waiting: Dict[str, int] = defaultdict(int)
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+        self._probed = False
+
+    def _pick(self, model: str, exclude: Sequence[OllamaHost]) -> Optional[OllamaHost]:
+        """Choose a host with a free slot for `model`, or None to wait"""
+        now = time.monotonic()
+        candidates = [host for host in self.hosts if host not in exclude]
+        # Hosts marked down still get traffic when nothing else is left
+        candidates = [host for host in candidates if host.down_until <= now] or candidates
+        free = [host for host in candidates if host.in_flight < host.capacity]
+        if not free:
+            return None
+        if self.routing != "affinity":
+            return min(free, key=lambda host: host.load)
+
+        warm = [host for host in candidates if model in host.models]
+        warm_free = [host for host in warm if host in free]
+        if warm_free:
+            return min(warm_free, key=lambda host: host.load)
+
+        # Load the model where it displaces nothing, else on an idle host whose
+        # models nobody is waiting for
+        roomy = [host for host in free if len(host.models) < self.models_per_host]
+        idle = [
+            host for host in free
+            if host.in_flight == 0 and not any(self._waiting[loaded] for loaded in host.models)
+        ]
+        if warm:
+            # Waiting for a warm host beats a cold load unless the queue is long
+            if self._waiting[model] <= SPILL_QUEUE_FACTOR * sum(host.capacity for host in warm):
+                return None
+            spare = roomy or idle
+        else:
+            spare = roomy or idle or free
+        return min(spare, key=lambda host: host.load) if spare else None
+
+    async def _probe(self):
+        """Learn which models each host already has loaded (once per process)"""
+        self._probed = True
+
+        async def probe(host):
+            try:
+                response = await asyncio.wait_for(host.client.ps(), timeout=2)
+                for loaded in response.get("models") or []:
+                    host.use(loaded.get("model") or loaded.get("name"), self.models_per_host)
+            except Exception:
+                # Unreachable hosts are found out by the first real request
+                pass
+
+        await asyncio.gather(*(probe(host) for host in self.hosts))
+
+    async def _acquire(self, model: str, exclude: Sequence[OllamaHost] = ()) -> Tuple[OllamaHost, bool]:
+        if not self._probed and self.routing == "affinity":
+            await self._probe()
+        async with self._changed:
+            self._waiting[model] += 1
+            try:
+                while True:
+                    host = self._pick(model, exclude)
+                    if host is not None:
+                        break
+                    await self._changed.wait()
+            finally:
+                self._waiting[model] -= 1
+            warm = model in host.models
+            host.in_flight += 1
+            host.use(model, self.models_per_host)
+        LLM_HOST_IN_FLIGHT.labels(host.url).inc()
+        return host, warm
+
+    async def _release(self, host: OllamaHost):
+        LLM_HOST_IN_FLIGHT.labels(host.url).dec()
+        async with self._changed:
+            host.in_flight -= 1
+            self._changed.notify_all()
+
+    def _host_failed(self, host: OllamaHost, model: str, error: BaseException):
+        host.down_until = time.monotonic() + LLM_HOST_RETRY_SECONDS
+        host.models.pop(model, None)
+        LLM_HOST_ERRORS.labels(host.url).inc()
+        log_error("Ollama host unreachable", host=host.url, model=model, error=str(error))
+
+    async def _call(self, model: str, request: Callable[["ollama.AsyncClient"], Awaitable[Any]]) -> Any:
+        """Run a non-streaming request on a routed host, moving to another host if it is unreachable"""
+        tried: List[OllamaHost] = []
+        while True:
+            host, warm = await self._acquire(model, tried)
+            try:
+                with stage("llm", model=model, host=host.url, warm=warm):
+                    start = time.perf_counter()
+                    response = await request(host.client)
+                    record_llm_call(model, response, time.perf_counter() - start)
+                LLM_ROUTED.labels(host.url, model, "warm" if warm else "cold").inc()
+                return response
+            except _host_errors() as e:
+                self._host_failed(host, model, e)
+                tried.append(host)
+                if len(tried) >= len(self.hosts):
+                    raise
+            finally:
+                await self._release(host)
+
+    async def _call_stream(self, model: str, messages: Sequence[Mapping[str, Any]]) -> AsyncIterator[Mapping[str, Any]]:
+        tried: List[OllamaHost] = []
+        while True:
+            host, warm = await self._acquire(model, tried)
+            started = False
+            try:
+                with stage("llm", model=model, host=host.url, warm=warm):
+                    start = time.perf_counter()
+                    stream = await host.client.chat(
+                        model=model, messages=messages, stream=True, keep_alive=self.keep_alive
+                    )
+                    async for part in stream:
+                        started = True
+                        yield part
+                        if part.get('done'):
+                            # Token counts and timings arrive with the final part
+                            record_llm_call(model, part, time.perf_counter() - start)
+                LLM_ROUTED.labels(host.url, model, "warm" if warm else "cold").inc()
+                return
+            except _host_errors() as e:
+                self._host_failed(host, model, e)
+                tried.append(host)
+                # Output already passed on cannot be taken back
+                if started or len(tried) >= len(self.hosts):
+                    raise
+            finally:
+                await self._release(host)
+
+    @staticmethod
+    def _key(*parts) -> str:
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    async def chat(
+        self, model: str, messages: Sequence[Mapping[str, Any]], format: Optional[Dict[str, Any]] = None
+    ) -> Mapping[str, Any]:
+        """Chat on the best host; identical calls already in flight share its response"""
+        key = self._key("chat", model, messages, format)
+        while key in self._calls:
+            pending = self._calls[key]
+            LLM_COALESCED.labels(model).inc()
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The caller that made the request went away; make it again
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            response = await self._call(
+                model,
+                lambda client: client.chat(model=model, messages=messages, format=format, keep_alive=self.keep_alive),
+            )
+            future.set_result(response)
+            return response
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Followers re-raise it; without them it must not be reported as unretrieved
+            future.exception()
+            raise
+        finally:
+            self._calls.pop(key, None)
+
+    async def stream_chat(self, model: str, messages: Sequence[Mapping[str, Any]]) -> AsyncIterator[Mapping[str, Any]]:
+        """Stream a chat from the best host; identical streams in flight are shared, from the start"""
+        key = self._key("stream", model, messages)
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = self._streams[key] = _Broadcast()
+            broadcast.task = asyncio.ensure_future(self._produce(key, broadcast, model, messages))
+        else:
+            LLM_COALESCED.labels(model).inc()
+
+        broadcast.listeners += 1
+        try:
+            async for part in broadcast.follow():
+                yield part
+        finally:
+            broadcast.listeners -= 1
+            if broadcast.listeners == 0 and not broadcast.done:
+                broadcast.task.cancel()
+
+    async def _produce(self, key: str, broadcast: _Broadcast, model: str, messages: Sequence[Mapping[str, Any]]):
+        try:
+            async for part in self._call_stream(model, messages):
+                await broadcast.publish(part)
+            await broadcast.publish(done=True)
+        except asyncio.CancelledError:
+            broadcast.done = True
+            raise
+        except Exception as e:
+            await broadcast.publish(error=e, done=True)
+        finally:
+            if self._streams.get(key) is broadcast:
+                del self._streams[key]
+
+    async def warm(self, models: Sequence[str]) -> Dict[str, bool]:
+        """Load models ahead of traffic, one host each when there are enough hosts
+
+        Placement follows the routing rules, so with two hosts and two models
+        each host gets its own model and later calls find it resident.
+        """
+        warmed = {}
+        for model in models:
+            try:
+                # An empty prompt makes Ollama load the model and return
+                await self._call(model, lambda client: client.generate(model=model, keep_alive=self.keep_alive))
+                warmed[model] = True
+            except Exception as e:
+                log_error("warming model failed", model=model, error=str(e))
+                warmed[model] = False
+        return warmed
+
+    def status(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        return [
+            {
+                "host": host.url,
+                "in_flight": host.in_flight,
+                "capacity": host.capacity,
+                "models": list(host.models),
+                "down": host.down_until > now,
+            }
+            for host in self.hosts
+        ]
@@ -1,18 +1,52 @@
-from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, BackgroundTasks, Query, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse, JSONResponse, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, func, text
 from sqlalchemy.orm import Session
 import os
-import shutil
 from typing import List, Optional
+from datetime import datetime
 import json
+import time
+import asyncio
+import logging
 
-from database import get_db, Document, Schema
-from models import DocumentResponse, SchemaCreate, SchemaResponse, ParseRequest, StructureRequest
+from database import engine, get_db, SessionLocal, Document, DocumentPage, Schema, Job, JobEvent, Extraction, ExtractionValue, load_blobs, prune_unreferenced_blobs
+from models import DocumentResponse, SchemaCreate, SchemaResponse, ParseRequest, StructureRequest, JobResponse, BatchExtractRequest, ExtractionQuery
 from processor import processor
+from llm_router import LLM_HOST_RETRY_SECONDS
+from jobs import WorkerPool, WORKER_COUNT, enqueue_parse
+from storage import blob_store, UPLOAD_DIR
+from llm_cache import llm_cache
+from batch import load_schemas, run_batch_extraction
+from migrations import run_migrations
+from events import record_event, stream_events, follow_pages, format_sse
+from extractions import schema_version, find_extraction, save_extraction, query_extractions, extraction_payload
+import rules
+import versions
+import admission
+import telemetry
+from telemetry import stage, log
+
+# "all" runs the API with parse workers and model warmup; "api" only serves HTTP
+# (start `python jobs.py` separately), so API replicas start fast
+ROLE = os.getenv("PAGEMONK_ROLE", "all")
+# Whether /ready waits for the LLM models to be loaded on the Ollama hosts
+READY_REQUIRES_WARM_MODELS = os.getenv("PAGEMONK_READY_REQUIRES_WARM_MODELS", "0").lower() in ("1", "true", "yes")
+
+# Startup progress, reported by /ready
+readiness = {"migrations": "pending", "models": "pending" if ROLE == "all" else "skipped"}
+STARTED_AT = time.monotonic()
 
 app = FastAPI(title="PageMonk", description="Document parsing and extraction service", version="1.0.0")
 
+# Rate limits, upload size cap and per-stage queues for ingestion routes; added
+# first so it runs inside CORS and tracing, and its 429s carry their headers
+app.add_middleware(admission.AdmissionMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -20,16 +54,121 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Trace-Id", "Retry-After"],
 )
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Time each request and tag its logs and spans with a trace id
+
+    Clients can pass their own id in X-Request-ID; sending X-PageMonk-Trace: 1
+    logs a span for every pipeline stage the request runs.
+    """
+    trace_id = telemetry.start_trace(
+        request.headers.get("x-request-id"),
+        enabled=request.headers.get("x-pagemonk-trace", "").lower() in ("1", "true"),
+    )
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        # Label by route template, not the raw path, to keep label values bounded
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        elapsed = time.perf_counter() - start
+        telemetry.HTTP_SECONDS.labels(request.method, route, str(status)).observe(elapsed)
+        if route not in ("/metrics", "/ready"):
+            log(logging.INFO, "request", method=request.method, route=route, status=status,
+                duration_ms=round(elapsed * 1000, 1))
+    response.headers["X-Trace-Id"] = trace_id
+    return response
+
+@app.exception_handler(admission.Overloaded)
+async def overloaded_handler(request: Request, exc: admission.Overloaded):
+    return admission.overloaded_response(exc)
+
 # Static files
-os.makedirs("uploads", exist_ok=True)
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+
+# Background workers for the parse queue
+worker_pool = WorkerPool(WORKER_COUNT if ROLE == "all" else 0)
+
+@app.on_event("startup")
+async def apply_migrations():
+    if ROLE == "all":
+        # This process spawns every worker that writes to the metrics dir, so
+        # anything already there is from an earlier run
+        telemetry.reset_metrics_dir()
+    # Runs before the workers start so they never see an old schema
+    try:
+        applied = await run_in_threadpool(run_migrations)
+    except Exception:
+        readiness["migrations"] = "failed"
+        raise
+    readiness["migrations"] = "done"
+    if applied:
+        log(logging.INFO, "applied database migrations", versions=applied)
+    # Workers from an earlier run may have died without cleaning up their gauges
+    telemetry.clear_dead_processes()
+
+@app.on_event("startup")
+async def start_workers():
+    if worker_pool.size > 0:
+        worker_pool.start()
+
+@app.on_event("startup")
+async def warm_models():
+    if ROLE != "all":
+        return
+
+    # Loads in the background; requests arriving meanwhile are routed as usual.
+    # Retries until every model is loaded, so a late Ollama does not leave the process unready
+    async def warm():
+        readiness["models"] = "warming"
+        while not all((await processor.warm_models()).values()):
+            readiness["models"] = "failed"
+            await asyncio.sleep(LLM_HOST_RETRY_SECONDS)
+        readiness["models"] = "warm"
+
+    app.state.warm_task = asyncio.create_task(warm())
+
+@app.on_event("shutdown")
+async def stop_workers():
+    worker_pool.stop()
+    processor.shutdown()
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to PageMonk - Document Processing API"}
 
+def _ping_database():
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 503 until migrations have run and the database answers"""
+    checks = dict(readiness)
+    try:
+        await run_in_threadpool(_ping_database)
+        checks["database"] = "ok"
+    except Exception as e:
+        checks["database"] = f"error: {e}"
+    checks["workers"] = {"configured": worker_pool.size, "alive": worker_pool.alive()}
+
+    is_ready = checks["migrations"] == "done" and checks["database"] == "ok"
+    if READY_REQUIRES_WARM_MODELS:
+        is_ready = is_ready and checks["models"] in ("warm", "skipped")
+    body = {
+        "ready": is_ready,
+        "role": ROLE,
+        "uptime_seconds": round(time.monotonic() - STARTED_AT, 3),
+        "checks": checks,
+    }
+    return JSONResponse(body, status_code=200 if is_ready else 503)
+
 @app.post("/upload", response_model=DocumentResponse)
 async def upload_document(
     background_tasks: BackgroundTasks,
@@ -38,71 +177,111 @@ async def upload_document(
 ):
     """Upload a document for processing"""
     
-    # Save uploaded file
-    file_path = f"uploads/{file.filename}"
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    # Get file size
-    file_size = os.path.getsize(file_path)
+    # Save uploaded file into the content-addressed store
+    with stage("upload_save") as span:
+        content_hash, file_size, storage_path, _ = await blob_store.save_upload(file)
+        span["bytes"] = file_size
     
     # Create database record
     db_document = Document(
         filename=file.filename,
         file_size=file_size,
         file_type=file.content_type or "unknown",
-        processing_status="uploaded"
+        processing_status="uploaded",
+        content_hash=content_hash,
+        storage_path=storage_path
     )
     db.add(db_document)
-    db.commit()
+    db.flush()
+    record_event(db, db_document.id, "uploaded", {"file_size": file_size, "content_hash": content_hash})
+    with stage("db_commit"):
+        db.commit()
     db.refresh(db_document)
     
     return db_document
 
-@app.post("/parse/{document_id}")
+@app.post("/parse/{document_id}", status_code=202)
 async def parse_document(
     document_id: int,
-    background_tasks: BackgroundTasks,
+    priority: str = Query("interactive", pattern="^(interactive|bulk)$"),
     db: Session = Depends(get_db)
 ):
-    """Parse document to markdown using OCR and LLM structuring"""
+    """Queue a document for OCR and LLM structuring
+
+    Bulk jobs run after interactive ones and are refused sooner when the queue is long.
+    """
     
     document = db.query(Document).filter(Document.id == document_id).first()
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    # Update status
-    document.processing_status = "processing"
-    db.commit()
+    admission.check_parse_queue(db, document_id, admission.PRIORITIES[priority])
+    job = enqueue_parse(db, document, admission.PRIORITIES[priority])
+    return {"message": "Document queued", "job_id": job.id, "status": job.status}
+
+# Headers that stop proxies from buffering server-sent events
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@app.get("/documents/{document_id}/events")
+async def document_events(
+    document_id: int,
+    after: int = 0,
+    last_event_id: Optional[int] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """Stream a document's processing progress as server-sent events
+
+    Events: uploaded, queued, processing, page (per extracted page, with its text), text_extracted,
+    chunk (per LLM chunk), markdown (generated text), retry, and finally completed
+    or failed. Reconnecting EventSource clients resume from Last-Event-ID.
+    """
+    if not db.query(Document.id).filter(Document.id == document_id).first():
+        raise HTTPException(status_code=404, detail="Document not found")
+    return StreamingResponse(
+        stream_events(document_id, last_event_id or after),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: int, db: Session = Depends(get_db)):
+    """Get the state of a background job"""
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/extract/stats")
+async def get_extraction_stats():
+    """Get per-field counts of rule-based versus LLM extraction"""
+    return {"fields": rules.stats()}
+
+@app.post("/extract/batch")
+async def extract_batch(request: BatchExtractRequest, db: Session = Depends(get_db)):
+    """Apply one or more schemas to many documents, streaming NDJSON results"""
+    schemas = load_schemas(db, request.schema_ids)
+    missing = set(request.schema_ids) - set(schemas)
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Schema not found: {sorted(missing)}")
     
-    try:
-        file_path = f"uploads/{document.filename}"
-        
-        # Extract text using OCR
-        raw_content = await processor.extract_text_with_ocr(file_path)
-        document.original_content = raw_content
-        
-        # Structure using LLM
-        structured_content = await processor.structure_with_llm(raw_content)
-        document.markdown_content = structured_content
-        document.structured_content = structured_content
-        
-        document.processing_status = "completed"
-        
-    except Exception as e:
-        document.processing_status = "failed"
-        document.structured_content = f"Processing failed: {str(e)}"
+    async def result_stream():
+        async for result in run_batch_extraction(request.document_ids, schemas):
+            yield json.dumps(result) + "\n"
     
-    db.commit()
-    return {"message": "Document processed", "status": document.processing_status}
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
 
 @app.post("/extract/{document_id}")
 async def extract_with_schema(
     document_id: int,
     schema_id: int,
+    refresh: bool = False,
     db: Session = Depends(get_db)
 ):
-    """Extract information from document using a predefined schema"""
+    """Extract information from document using a predefined schema
+
+    A stored extraction of the same text, schema version and model is
+    returned without calling the LLM unless refresh is set.
+    """
     
     document = db.query(Document).filter(Document.id == document_id).first()
     if not document:
@@ -120,26 +299,161 @@ async def extract_with_schema(
         schema_def = schema.schema_definition
         if isinstance(schema_def, str):
             schema_def = json.loads(schema_def)
+        
+        if not refresh:
+            stored = find_extraction(db, document, schema_id, schema_version(schema_def))
+            if stored:
+                return {
+                    "extracted_data": stored.result,
+                    "field_sources": json.loads(stored.field_sources) if stored.field_sources else None,
+                    "extraction_id": stored.id,
+                    "cached": True,
+                }
             
         # Extract using schema
-        extracted_data = await processor.extract_with_schema(
+        extracted_data, field_sources = await processor.extract_with_schema_detailed(
             document.original_content, 
             schema_def
         )
         
+        extraction = save_extraction(db, document, schema_id, schema_def, extracted_data, field_sources)
         document.extracted_schema = extracted_data
         db.commit()
         
-        return {"extracted_data": extracted_data}
+        return {
+            "extracted_data": extracted_data,
+            "field_sources": field_sources,
+            "extraction_id": extraction.id,
+            "cached": False,
+        }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Extraction failed: {str(e)}")
 
-@app.get("/documents", response_model=List[DocumentResponse])
-async def get_documents(db: Session = Depends(get_db)):
-    """Get all documents"""
-    documents = db.query(Document).all()
-    return documents
+@app.post("/extractions/query")
+async def query_extracted_fields(query: ExtractionQuery, db: Session = Depends(get_db)):
+    """Find documents by stored extracted field values, without calling the LLM"""
+    try:
+        extractions = query_extractions(
+            db, query.schema_id, [f.model_dump() for f in query.filters], min(query.limit, MAX_PAGE_SIZE)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return [extraction_payload(extraction) for extraction in extractions]
+
+@app.get("/documents/{document_id}/extractions")
+async def get_document_extractions(document_id: int, schema_id: Optional[int] = None, db: Session = Depends(get_db)):
+    """Get the extraction history of a document, newest first"""
+    query = db.query(Extraction).filter(Extraction.document_id == document_id)
+    if schema_id is not None:
+        query = query.filter(Extraction.schema_id == schema_id)
+    return [extraction_payload(extraction) for extraction in query.order_by(Extraction.id.desc()).all()]
+
+# Document listing: columns that hold large text and are left out of summaries
+DOCUMENT_CONTENT_FIELDS = {"markdown_content", "structured_content", "extracted_schema"}
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def _document_listing(columns, cursor, order, status, uploaded_after, uploaded_before):
+    """Build a keyset-paginated, projected query over documents"""
+    # Content fields are selected as blob hashes and loaded afterwards in one batch
+    query = select(*[
+        getattr(Document, f"{column}_hash" if column in DOCUMENT_CONTENT_FIELDS else column)
+        for column in columns
+    ])
+    if status:
+        query = query.where(Document.processing_status == status)
+    if uploaded_after:
+        query = query.where(Document.upload_date >= uploaded_after)
+    if uploaded_before:
+        query = query.where(Document.upload_date < uploaded_before)
+    if order == "desc":
+        if cursor is not None:
+            query = query.where(Document.id < cursor)
+        return query.order_by(Document.id.desc())
+    if cursor is not None:
+        query = query.where(Document.id > cursor)
+    return query.order_by(Document.id)
+
+def _listing_rows(db, rows, columns):
+    """Turn projected rows into dicts, swapping content hashes for their text"""
+    content_columns = [column for column in columns if column in DOCUMENT_CONTENT_FIELDS]
+    rows = [dict(row._mapping) for row in rows]
+    if content_columns:
+        blobs = load_blobs(db, [row[f"{column}_hash"] for row in rows for column in content_columns])
+        for row in rows:
+            for column in content_columns:
+                row[column] = blobs.get(row.pop(f"{column}_hash"))
+    return rows
+
+@app.get("/documents")
+async def get_documents(
+    cursor: Optional[int] = Query(None, description="Return documents after this id (from X-Next-Cursor)"),
+    limit: Optional[int] = Query(None, ge=1, description="Page size; NDJSON streams everything when omitted"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    status: Optional[str] = None,
+    uploaded_after: Optional[datetime] = None,
+    uploaded_before: Optional[datetime] = None,
+    view: str = Query("full", pattern="^(full|summary)$", description="'summary' leaves out content fields"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: Session = Depends(get_db)
+):
+    """List documents a page at a time, optionally projected or streamed as NDJSON"""
+    available = list(DocumentResponse.model_fields)
+    if fields:
+        columns = [column.strip() for column in fields.split(",") if column.strip()]
+        unknown = set(columns) - set(available)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {sorted(unknown)}")
+        if "id" not in columns:
+            columns.insert(0, "id")
+    elif view == "summary":
+        columns = [column for column in available if column not in DOCUMENT_CONTENT_FIELDS]
+    else:
+        columns = available
+
+    query = _document_listing(columns, cursor, order, status, uploaded_after, uploaded_before)
+
+    if format == "ndjson":
+        if limit:
+            query = query.limit(limit)
+
+        def export_rows():
+            # Own session: the request-scoped one may close before streaming ends
+            export_db = SessionLocal()
+            try:
+                for partition in export_db.execute(query).yield_per(500).partitions():
+                    for row in _listing_rows(export_db, partition, columns):
+                        yield json.dumps(jsonable_encoder(row)) + "\n"
+            finally:
+                export_db.close()
+
+        return StreamingResponse(export_rows(), media_type="application/x-ndjson")
+
+    page_size = min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    rows = _listing_rows(db, db.execute(query.limit(page_size)).all(), columns)
+    headers = {"X-Next-Cursor": str(rows[-1]["id"])} if len(rows) == page_size else {}
+    return JSONResponse(jsonable_encoder(rows), headers=headers)
+
+@app.get("/search")
+async def search_documents(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    document_id: Optional[int] = None,
+):
+    """Full-text search over parsed documents, with highlighted snippets"""
+    import search
+
+    def run():
+        db = SessionLocal()
+        try:
+            return search.search(db, q, limit, document_id)
+        finally:
+            db.close()
+
+    with stage("search"):
+        return await run_in_threadpool(run)
 
 @app.get("/documents/{document_id}", response_model=DocumentResponse)
 async def get_document(document_id: int, db: Session = Depends(get_db)):
@@ -149,10 +463,93 @@ async def get_document(document_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Document not found")
     return document
 
+@app.get("/documents/{document_id}/versions", response_model=List[DocumentResponse])
+async def get_document_versions(document_id: int, db: Session = Depends(get_db)):
+    """All versions of a document, oldest first"""
+    document = db.query(Document).filter(Document.id == document_id).first()
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return versions.version_chain(db, document)
+
+@app.get("/documents/{document_id}/diff")
+async def diff_document(document_id: int, against: Optional[int] = None, db: Session = Depends(get_db)):
+    """Page-level changes from the previous version (or from document `against`)"""
+    document = db.query(Document).filter(Document.id == document_id).first()
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    previous_id = against or document.previous_version_id
+    if previous_id is None:
+        raise HTTPException(status_code=400, detail="Document has no previous version; pass `against`")
+    previous = db.query(Document).filter(Document.id == previous_id).first()
+    if not previous:
+        raise HTTPException(status_code=404, detail="Document not found")
+    try:
+        return versions.diff_versions(db, document, previous)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/documents/{document_id}/pages")
+async def stream_document_pages(document_id: int, db: Session = Depends(get_db)):
+    """Stream a document's text as NDJSON, one line per page
+
+    Pages of a parsed document come from the stored parse; nothing is extracted
+    here. While a parse is queued or running, each page is sent as soon as it
+    is extracted (in extraction order), and pages not reported during the run
+    follow once it completes. A failed parse ends the stream with an
+    {"error": ...} line. A document that was never queued gets 409.
+    """
+    document = db.query(Document).filter(Document.id == document_id).first()
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    status = document.processing_status
+    if status not in ("completed", "queued", "processing"):
+        raise HTTPException(
+            status_code=409, detail=f"Document not yet processed; queue it with POST /parse/{document_id}"
+        )
+
+    def stored_pages():
+        with SessionLocal() as session:
+            stored = session.get(Document, document_id)
+            # Documents parsed before page fingerprints were stored only have the joined text
+            pages = versions.load_pages(session, stored) or versions.pages_from_text(stored.original_content)
+            return [(page.number, page.text) for page in pages]
+
+    def page_line(page_number, page_text):
+        return json.dumps({"page": page_number, "text": page_text}) + "\n"
+
+    if status == "completed":
+        pages = await run_in_threadpool(stored_pages)
+        return StreamingResponse(
+            (page_line(page_number, page_text) for page_number, page_text in pages),
+            media_type="application/x-ndjson",
+        )
+
+    async def follow_parse():
+        sent = set()
+        async for data in follow_pages(document_id):
+            if data.get("status") == "failed":
+                yield json.dumps({"error": "Processing failed"}) + "\n"
+            elif data.get("status") == "completed":
+                for page_number, page_text in await run_in_threadpool(stored_pages):
+                    if page_number not in sent:
+                        yield page_line(page_number, page_text)
+            elif data["page"] not in sent:
+                # A retried job reports its pages again
+                sent.add(data["page"])
+                yield page_line(data["page"], data["text"])
+
+    return StreamingResponse(follow_parse(), media_type="application/x-ndjson")
+
 @app.delete("/delete_all_documents")
 async def delete_all_document(db: Session = Depends(get_db)):
+    import search
     count = db.query(Document).delete()
-    db.query(Document).delete()
+    db.query(ExtractionValue).delete()
+    db.query(Extraction).delete()
+    db.query(JobEvent).delete()
+    db.query(DocumentPage).delete()
+    search.clear_index(db)
+    prune_unreferenced_blobs(db)
     db.commit()
     return {f"Deleted {count} documents"}
 
@@ -219,6 +616,61 @@ async def structure_content(request: StructureRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Structuring failed: {str(e)}")
 
+@app.post("/structure/stream")
+async def structure_content_stream(request: StructureRequest):
+    """Structure raw content, streaming markdown tokens as server-sent events"""
+    async def token_stream():
+        try:
+            async for kind, payload in processor.stream_structure(request.content, request.instructions):
+                if kind == "chunk":
+                    index, total = payload
+                    yield format_sse("chunk", {"index": index, "total": total})
+                else:
+                    yield format_sse("token", {"text": payload})
+            yield format_sse("done", {})
+        except Exception as e:
+            yield format_sse("error", {"detail": f"Structuring failed: {str(e)}"})
+
+    return StreamingResponse(token_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Get LLM response cache hit/miss counters and size"""
+    return {"llm": await run_in_threadpool(llm_cache.stats)}
+
+@app.get("/admission/stats")
+async def get_admission_stats():
+    """Slots in use and requests waiting per ingestion stage in this process"""
+    return {name: gate.status() for name, gate in admission.gates.items()}
+
+@app.get("/llm/hosts")
+async def get_llm_hosts():
+    """Ollama hosts as seen by the API process: load, resident models and health"""
+    return {"routing": processor.llm.routing, "hosts": processor.llm.status()}
+
+class QueueCollector:
+    """Reports job queue depth from the jobs table at scrape time"""
+
+    def collect(self):
+        from prometheus_client.core import GaugeMetricFamily
+        db = SessionLocal()
+        try:
+            counts = dict(db.query(Job.status, func.count(Job.id)).group_by(Job.status).all())
+        finally:
+            db.close()
+        depth = GaugeMetricFamily("pagemonk_jobs", "Jobs in the queue by status", labels=["status"])
+        for status in ("queued", "running", "completed", "failed"):
+            depth.add_metric([status], counts.get(status, 0))
+        yield depth
+        yield GaugeMetricFamily("pagemonk_workers", "Configured parse worker processes", value=WORKER_COUNT)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics from the API and all worker processes"""
+    from prometheus_client import CONTENT_TYPE_LATEST
+    body = await run_in_threadpool(telemetry.render_metrics, [QueueCollector()])
+    return Response(body, media_type=CONTENT_TYPE_LATEST)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
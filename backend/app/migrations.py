@@ -0,0 +1,376 @@
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: SQLite migrations run without a cross-process lock
+    fcntl = None
+
+from sqlalchemy import inspect, text, Boolean, Column, DateTime, Float, Index, Integer, LargeBinary, MetaData, String, Table, Text
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import engine, blob_hash
+
+# Applied migration versions are recorded here
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String),
+    Column("applied_at", DateTime),
+)
+
+# Postgres advisory lock key held while migrations run
+MIGRATION_LOCK_ID = 0x5041474D  # "PAGM"
+
+
+# Every migration works on the tables as they were when it was written, never
+# on the live models: a database created or upgraded later must go through the
+# same steps, and columns or indexes added to the models cannot leak into an
+# earlier migration. A migration that changes a table defines its own snapshot.
+_schema_v1 = MetaData()
+Table(
+    "documents",
+    _schema_v1,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("filename", String, index=True),
+    Column("original_content_hash", String),
+    Column("markdown_content_hash", String),
+    Column("structured_content_hash", String),
+    Column("extracted_schema_hash", String),
+    Column("upload_date", DateTime, index=True),
+    Column("file_size", Integer),
+    Column("file_type", String),
+    Column("processing_status", String, index=True),
+    Column("content_hash", String, index=True),
+    Column("storage_path", String),
+    Index("ix_documents_status_id", "processing_status", "id"),
+)
+Table(
+    "schemas",
+    _schema_v1,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String, index=True),
+    Column("description", Text),
+    Column("schema_definition", Text),
+    Column("created_date", DateTime),
+    Column("is_active", Boolean),
+)
+Table(
+    "jobs",
+    _schema_v1,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("document_id", Integer, index=True),
+    Column("kind", String),
+    Column("status", String, index=True),
+    Column("attempts", Integer),
+    Column("max_attempts", Integer),
+    Column("next_run_at", DateTime, index=True),
+    Column("claim_token", String, index=True),
+    Column("locked_at", DateTime),
+    Column("last_error", Text),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+)
+Table(
+    "content_blobs",
+    _schema_v1,
+    Column("hash", String, primary_key=True),
+    Column("data", LargeBinary),
+    Column("size", Integer),
+    Column("compressed_size", Integer),
+    Column("created_at", DateTime),
+)
+
+# Columns and indexes migration 2 adds to databases from before migration 1
+_documents_v2 = Table(
+    "documents",
+    MetaData(),
+    Column("id", Integer, primary_key=True, index=True),
+    Column("filename", String, index=True),
+    Column("upload_date", DateTime, index=True),
+    Column("processing_status", String, index=True),
+    Column("content_hash", String, index=True),
+    Column("storage_path", String),
+    Column("original_content_hash", String),
+    Column("markdown_content_hash", String),
+    Column("structured_content_hash", String),
+    Column("extracted_schema_hash", String),
+    Index("ix_documents_status_id", "processing_status", "id"),
+)
+_jobs_v2 = Table(
+    "jobs",
+    MetaData(),
+    Column("id", Integer, primary_key=True, index=True),
+    Column("document_id", Integer, index=True),
+    Column("status", String, index=True),
+    Column("next_run_at", DateTime, index=True),
+    Column("claim_token", String, index=True),
+)
+_content_blobs_v3 = _schema_v1.tables["content_blobs"]
+
+_schema_v4 = MetaData()
+Table(
+    "extractions",
+    _schema_v4,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("document_id", Integer, index=True),
+    Column("schema_id", Integer, index=True),
+    Column("schema_version", String),
+    Column("model", String),
+    Column("content_hash", String),
+    Column("result", Text),
+    Column("field_sources", Text),
+    Column("is_current", Boolean),
+    Column("created_at", DateTime),
+    Index("ix_extractions_lookup", "document_id", "schema_id", "schema_version", "model"),
+    Index("ix_extractions_schema_current", "schema_id", "is_current"),
+)
+Table(
+    "extraction_values",
+    _schema_v4,
+    Column("id", Integer, primary_key=True),
+    Column("extraction_id", Integer, index=True),
+    Column("document_id", Integer),
+    Column("schema_id", Integer),
+    Column("field", String),
+    Column("value_text", Text),
+    Column("value_number", Float),
+    Index("ix_extraction_values_number", "schema_id", "field", "value_number"),
+    Index("ix_extraction_values_text", "schema_id", "field", "value_text"),
+)
+
+_schema_v5 = MetaData()
+Table(
+    "job_events",
+    _schema_v5,
+    Column("id", Integer, primary_key=True),
+    Column("document_id", Integer),
+    Column("job_id", Integer),
+    Column("event", String),
+    Column("data", Text),
+    Column("created_at", DateTime, index=True),
+    Index("ix_job_events_document_id", "document_id", "id"),
+)
+
+_schema_v6 = MetaData()
+Table(
+    "search_chunks",
+    _schema_v6,
+    Column("id", Integer, primary_key=True),
+    Column("document_id", Integer, index=True),
+    Column("content_hash", String),
+    Column("ordinal", Integer),
+    Column("first_page", Integer),
+    Column("last_page", Integer),
+    Column("text", Text),
+    Column("length", Integer),
+)
+Table(
+    "search_postings",
+    _schema_v6,
+    Column("term", String, primary_key=True),
+    Column("chunk_id", Integer, primary_key=True),
+    Column("document_id", Integer),
+    Column("tf", Integer),
+    Column("chunk_length", Integer),
+    Index("ix_search_postings_document", "document_id"),
+)
+
+_schema_v7 = MetaData()
+_documents_v7 = Table(
+    "documents",
+    _schema_v7,
+    Column("id", Integer, primary_key=True),
+    Column("version", Integer),
+    Column("previous_version_id", Integer, index=True),
+)
+_document_pages_v7 = Table(
+    "document_pages",
+    _schema_v7,
+    Column("document_id", Integer, primary_key=True),
+    Column("page_number", Integer, primary_key=True),
+    Column("fingerprint", String),
+    Column("text_hash", String, index=True),
+    Column("text_start", Integer),
+    Column("text_end", Integer),
+    Column("segment_first_page", Integer),
+    Column("markdown_start", Integer),
+    Column("markdown_end", Integer),
+)
+
+_jobs_v8 = Table(
+    "jobs",
+    MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("priority", Integer),
+)
+
+
+def _insert_ignore(conn, table: Table):
+    insert = postgresql_insert if conn.dialect.name == "postgresql" else sqlite_insert
+    return insert(table).on_conflict_do_nothing()
+
+
+def _add_column(conn, column: Column):
+    """Add a snapshot column to its table unless it is already there"""
+    existing = {c["name"] for c in inspect(conn).get_columns(column.table.name)}
+    if column.name not in existing:
+        column_type = column.type.compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE {column.table.name} ADD COLUMN {column.name} {column_type}"))
+
+
+def _create_indexes(conn, table: Table):
+    for index in table.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def _0001_initial_schema(conn):
+    """Create any missing tables
+
+    Databases that predate versioned migrations already have some tables;
+    create_all only adds the ones that are missing.
+    """
+    _schema_v1.create_all(bind=conn)
+
+
+def _0002_upload_store_and_listing_columns(conn):
+    """Columns and indexes added for the blob store, job queue and paginated listing"""
+    for name in ("content_hash", "storage_path"):
+        _add_column(conn, _documents_v2.c[name])
+    for name in ("original_content", "markdown_content", "structured_content", "extracted_schema"):
+        _add_column(conn, _documents_v2.c[f"{name}_hash"])
+    _create_indexes(conn, _documents_v2)
+    _create_indexes(conn, _jobs_v2)
+
+
+def _0003_move_inline_content(conn):
+    """Move text stored inline in the documents table into content_blobs
+
+    Databases created before the content store kept the four text fields as
+    columns on documents. Their values are copied into blobs, the hash
+    columns are filled in, and the old columns are dropped.
+    """
+    legacy = [
+        column["name"] for column in inspect(conn).get_columns("documents")
+        if column["name"] in ("original_content", "markdown_content", "structured_content", "extracted_schema")
+    ]
+    if not legacy:
+        return
+
+    columns = ", ".join(legacy + [f"{name}_hash" for name in legacy])
+    for row in conn.execute(text(f"SELECT id, {columns} FROM documents")).all():
+        for name in legacy:
+            value = getattr(row, name)
+            if value is None or getattr(row, f"{name}_hash") is not None:
+                continue
+            digest = blob_hash(value)
+            encoded = value.encode("utf-8")
+            data = zlib.compress(encoded, 6)
+            conn.execute(_insert_ignore(conn, _content_blobs_v3).values(
+                hash=digest, data=data, size=len(encoded), compressed_size=len(data), created_at=datetime.utcnow(),
+            ))
+            conn.execute(
+                text(f"UPDATE documents SET {name}_hash = :digest WHERE id = :id"), {"digest": digest, "id": row.id}
+            )
+
+    for name in legacy:
+        conn.execute(text(f"ALTER TABLE documents DROP COLUMN {name}"))
+
+
+def _0004_extraction_history(conn):
+    """Extraction history and the field value index"""
+    _schema_v4.create_all(bind=conn)
+
+
+def _0005_job_events(conn):
+    """Progress events streamed to clients over SSE"""
+    _schema_v5.create_all(bind=conn)
+
+
+def _0006_search_index(conn):
+    """Search index: document chunks and their term postings"""
+    _schema_v6.create_all(bind=conn)
+
+
+def _0007_document_versions(conn):
+    """Document version links and per-page fingerprints for incremental reparsing"""
+    for name in ("version", "previous_version_id"):
+        _add_column(conn, _documents_v7.c[name])
+    conn.execute(text("UPDATE documents SET version = 1 WHERE version IS NULL"))
+    _create_indexes(conn, _documents_v7)
+    _document_pages_v7.create(conn, checkfirst=True)
+
+
+def _0008_job_priority(conn):
+    """Priority classes for parse jobs"""
+    _add_column(conn, _jobs_v8.c.priority)
+    conn.execute(text("UPDATE jobs SET priority = 0 WHERE priority IS NULL"))
+
+
+# Ordered list of (version, migration). Append new migrations; never edit applied ones.
+MIGRATIONS: List[Tuple[int, Callable]] = [
+    (1, _0001_initial_schema),
+    (2, _0002_upload_store_and_listing_columns),
+    (3, _0003_move_inline_content),
+    (4, _0004_extraction_history),
+    (5, _0005_job_events),
+    (6, _0006_search_index),
+    (7, _0007_document_versions),
+    (8, _0008_job_priority),
+]
+
+
+@contextmanager
+def _migration_lock(bind):
+    """Let one process at a time migrate; the API and every worker run migrations at startup"""
+    if bind.dialect.name == "postgresql":
+        with bind.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+    elif bind.dialect.name == "sqlite" and bind.url.database not in (None, "", ":memory:") and fcntl:
+        with open(f"{bind.url.database}.migrate.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    else:
+        yield
+
+
+def run_migrations(bind=engine) -> List[int]:
+    """Apply pending migrations in order, each in its own transaction
+
+    Applied versions are read under the migration lock, so processes that
+    start together apply each migration once; the others find it done.
+    """
+    with _migration_lock(bind):
+        schema_migrations.create(bind, checkfirst=True)
+        with bind.connect() as conn:
+            applied = {row.version for row in conn.execute(schema_migrations.select())}
+
+        newly_applied = []
+        for version, migration in MIGRATIONS:
+            if version in applied:
+                continue
+            with bind.begin() as conn:
+                migration(conn)
+                conn.execute(schema_migrations.insert().values(
+                    version=version,
+                    description=(migration.__doc__ or "").strip().splitlines()[0],
+                    applied_at=datetime.utcnow(),
+                ))
+            newly_applied.append(version)
+    return newly_applied
+
+
+if __name__ == "__main__":
+    versions = run_migrations()
+    print(f"Applied migrations: {versions}" if versions else "Database is up to date")
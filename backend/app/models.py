@@ -16,6 +16,9 @@ class DocumentResponse(BaseModel):
     file_size: int
     file_type: str
     processing_status: str
+    content_hash: Optional[str] = None
+    version: Optional[int] = None
+    previous_version_id: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -43,4 +46,34 @@ class ParseRequest(BaseModel):
 
 class StructureRequest(BaseModel):
     content: str
-    instructions: Optional[str] = "Structure this content in a clear, organized markdown format"
\ No newline at end of file
+    instructions: Optional[str] = "Structure this content in a clear, organized markdown format"
+
+class JobResponse(BaseModel):
+    id: int
+    document_id: int
+    kind: str
+    status: str
+    priority: Optional[int] = None
+    attempts: int
+    max_attempts: int
+    next_run_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class BatchExtractRequest(BaseModel):
+    document_ids: List[int]
+    schema_ids: List[int]
+
+class FieldFilter(BaseModel):
+    field: str = Field(..., description="Extracted field, dotted for nested fields")
+    op: str = Field("eq", description="eq, ne, gt, gte, lt, lte or contains")
+    value: Any
+
+class ExtractionQuery(BaseModel):
+    schema_id: int
+    filters: List[FieldFilter] = []
+    limit: int = 100
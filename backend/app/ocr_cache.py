@@ -0,0 +1,39 @@
+import os
+import hashlib
+import tempfile
+from typing import Optional
+
+OCR_CACHE_DIR = os.getenv("PAGEMONK_OCR_CACHE_DIR", "cache/ocr")
+
+
+class OCRCache:
+    """On-disk cache of OCR text keyed by page content hash and OCR settings"""
+
+    def __init__(self, root: str = OCR_CACHE_DIR):
+        self.root = root
+
+    def _key(self, fingerprint: str, settings: str) -> str:
+        return hashlib.sha256(f"{fingerprint}:{settings}".encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        # Shard by hash prefix so no single directory grows unbounded
+        return os.path.join(self.root, key[:2], key[2:4], f"{key}.txt")
+
+    def get(self, fingerprint: str, settings: str) -> Optional[str]:
+        try:
+            with open(self._path(self._key(fingerprint, settings)), encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, fingerprint: str, settings: str, text: str):
+        path = self._path(self._key(fingerprint, settings))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file and rename so readers never see partial entries
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+
+ocr_cache = OCRCache()
@@ -0,0 +1,68 @@
+import os
+from typing import TYPE_CHECKING
+
+from telemetry import log_error
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# "auto" uses tesserocr when it is installed, otherwise the pytesseract CLI wrapper
+OCR_ENGINE = os.getenv("PAGEMONK_OCR_ENGINE", "auto")
+OCR_LANG = os.getenv("PAGEMONK_OCR_LANG", "eng")
+
+# One Tesseract instance per process, created by init_worker or on first use
+_api = None
+_api_failed = False
+# The tesserocr module once imported, or False when it is not installed
+_tesserocr = None
+
+
+def _load_tesserocr():
+    """Optional: keeps Tesseract loaded in-process (pip install tesserocr)"""
+    global _tesserocr
+    if _tesserocr is None:
+        try:
+            import tesserocr
+            _tesserocr = tesserocr
+        except ImportError:
+            _tesserocr = False
+    return _tesserocr or None
+
+
+def engine_name() -> str:
+    if OCR_ENGINE == "pytesseract" or _api_failed or _load_tesserocr() is None:
+        return "pytesseract"
+    return "tesserocr"
+
+
+def _get_api():
+    global _api, _api_failed
+    if _api is None:
+        try:
+            _api = _load_tesserocr().PyTessBaseAPI(lang=OCR_LANG)
+        except RuntimeError as e:
+            # Usually missing language data; the CLI may still work
+            log_error("starting tesserocr failed, falling back to pytesseract", error=str(e))
+            _api_failed = True
+    return _api
+
+
+def init_worker():
+    """Process pool initializer: load Tesseract and its language data once per worker"""
+    if OCR_ENGINE == "tesserocr" and _load_tesserocr() is None:
+        log_error("tesserocr is not installed, falling back to pytesseract")
+    if engine_name() == "tesserocr":
+        _get_api()
+
+
+def image_to_string(img: "Image.Image", psm: int) -> str:
+    """OCR an in-memory image with the given page segmentation mode"""
+    if engine_name() == "tesserocr":
+        api = _get_api()
+        if api is not None:
+            api.SetPageSegMode(psm)
+            api.SetImage(img)
+            return api.GetUTF8Text()
+    # Spawns a tesseract process and round-trips the image through temp files
+    import pytesseract
+    return pytesseract.image_to_string(img, lang=OCR_LANG, config=f"--psm {psm}")
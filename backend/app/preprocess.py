@@ -0,0 +1,144 @@
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Images are scaled down to roughly this resolution before OCR; Tesseract gains
+# nothing from more pixels but its runtime grows with them
+OCR_TARGET_DPI = int(os.getenv("PAGEMONK_OCR_TARGET_DPI", "300"))
+# Assumed page height (inches) when an image carries no usable DPI, e.g. phone photos
+ASSUMED_PAGE_INCHES = 11.7
+# Stored DPI below this is a camera or screen default (72, 96), not a scan resolution
+MIN_SCAN_DPI = 150
+# Skew angles searched, in degrees either way
+DESKEW_MAX_ANGLE = float(os.getenv("PAGEMONK_OCR_DESKEW_MAX_ANGLE", "5"))
+DESKEW_STEP = 0.25
+# Images with fewer pixels than this are OCR'd whole instead of in tiles
+OCR_TILE_MIN_PIXELS = int(os.getenv("PAGEMONK_OCR_TILE_MIN_PIXELS", str(2_000_000)))
+# Target height of a tile; tiles are cut at blank rows between lines of text
+OCR_TILE_HEIGHT = int(os.getenv("PAGEMONK_OCR_TILE_HEIGHT", "800"))
+
+
+def to_grayscale(img: Image.Image) -> np.ndarray:
+    """8-bit grayscale pixels, flattening any transparency onto white"""
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img.convert("RGBA"), mask=img.convert("RGBA").split()[-1])
+        img = background
+    return np.asarray(img.convert("L"), dtype=np.uint8)
+
+
+def downscale(img: Image.Image, target_dpi: int = OCR_TARGET_DPI) -> Image.Image:
+    """Shrink an image to about `target_dpi`, never enlarging it"""
+    dpi = img.info.get("dpi", (0, 0))[1] if isinstance(img.info.get("dpi"), tuple) else 0
+    if dpi >= MIN_SCAN_DPI:
+        scale = target_dpi / dpi
+    else:
+        # Without a usable DPI, assume the long side spans a full page
+        scale = target_dpi * ASSUMED_PAGE_INCHES / max(img.size)
+    if scale >= 1:
+        return img
+    size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    return img.resize(size, Image.LANCZOS)
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    """Gray level that best separates ink from background (Otsu's method)"""
+    histogram = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = histogram.sum()
+    if total == 0:
+        return 128
+    levels = np.arange(256, dtype=np.float64)
+    weight_below = np.cumsum(histogram)
+    weight_above = total - weight_below
+    mass_below = np.cumsum(histogram * levels)
+    mean_below = mass_below / np.maximum(weight_below, 1)
+    mean_above = (mass_below[-1] - mass_below) / np.maximum(weight_above, 1)
+    between_variance = weight_below * weight_above * (mean_below - mean_above) ** 2
+    return int(np.argmax(between_variance))
+
+
+def binarize(gray: np.ndarray) -> np.ndarray:
+    """Black text on white: 0 for ink, 255 for background"""
+    return np.where(gray > otsu_threshold(gray), 255, 0).astype(np.uint8)
+
+
+def estimate_skew(ink: np.ndarray, max_angle: float = DESKEW_MAX_ANGLE) -> float:
+    """Angle (degrees) that makes text lines horizontal
+
+    Tries rotations of a reduced ink mask and keeps the one whose row sums
+    vary most: aligned text lines give sharp peaks and empty gaps.
+    """
+    if max_angle <= 0 or not ink.any():
+        return 0.0
+    mask = Image.fromarray(ink.astype(np.uint8) * 255)
+    mask.thumbnail((1000, 1000))
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-max_angle, max_angle + DESKEW_STEP / 2, DESKEW_STEP):
+        rows = np.asarray(mask.rotate(float(angle), resample=Image.NEAREST, fillcolor=0), dtype=np.float64).sum(axis=1)
+        score = float(np.square(np.diff(rows)).sum())
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def text_bands(ink: np.ndarray, min_gap: int = 3) -> List[Tuple[int, int]]:
+    """Row ranges [top, bottom) that contain ink, split at blank gaps"""
+    rows = ink.any(axis=1)
+    if not rows.any():
+        return []
+    # Edges where rows switch between blank and inked
+    padded = np.concatenate(([False], rows, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    bands = list(zip(edges[::2], edges[1::2]))
+    merged = [bands[0]]
+    for top, bottom in bands[1:]:
+        if top - merged[-1][1] < min_gap:
+            merged[-1] = (merged[-1][0], bottom)
+        else:
+            merged.append((top, bottom))
+    return [(int(top), int(bottom)) for top, bottom in merged]
+
+
+def tile_rows(ink: np.ndarray, tile_height: int = OCR_TILE_HEIGHT, margin: int = 4) -> List[Tuple[int, int]]:
+    """Group text bands into tiles of about `tile_height` rows, cutting only between bands"""
+    tiles: List[Tuple[int, int]] = []
+    for top, bottom in text_bands(ink):
+        top, bottom = max(0, top - margin), min(ink.shape[0], bottom + margin)
+        if tiles and bottom - tiles[-1][0] <= tile_height:
+            tiles[-1] = (tiles[-1][0], bottom)
+        else:
+            tiles.append((top, bottom))
+    return tiles
+
+
+def prepare_image(img: Image.Image, tile: bool = True, target_dpi: Optional[int] = OCR_TARGET_DPI) -> List[np.ndarray]:
+    """Grayscale, downscale, deskew and binarize an image, then cut it into text tiles
+
+    Returns the binarized tiles in reading order (top to bottom). Blank
+    regions are dropped; small images come back as a single tile.
+    """
+    if target_dpi:
+        img = downscale(img, target_dpi)
+    gray = to_grayscale(img)
+
+    angle = estimate_skew(gray <= otsu_threshold(gray))
+    if angle:
+        gray = np.asarray(
+            Image.fromarray(gray).rotate(angle, resample=Image.BILINEAR, expand=True, fillcolor=255), dtype=np.uint8
+        )
+
+    binary = binarize(gray)
+    if not tile or binary.size < OCR_TILE_MIN_PIXELS:
+        return [binary]
+
+    tiles = tile_rows(binary == 0)
+    # Crop columns to the inked area of each tile as well
+    result = []
+    for top, bottom in tiles:
+        band = binary[top:bottom]
+        columns = np.flatnonzero((band == 0).any(axis=0))
+        left, right = max(0, columns[0] - 8), min(band.shape[1], columns[-1] + 9)
+        result.append(np.ascontiguousarray(band[:, left:right]))
+    return result
@@ -1,135 +1,687 @@
 import os
+import re
 import json
-from typing import Optional, Dict, Any
-import PyPDF2
-from PIL import Image
-import pytesseract
-import ollama
-import requests
+import math
+import hashlib
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Optional, Dict, Any, List, Tuple, AsyncIterator, Awaitable, Callable
+
+from ocr_cache import ocr_cache
+from llm_cache import llm_cache, cache_key
+from chunking import Chunk, chunk_text, continuity_note, estimate_tokens, join_pages
+from retrieval import index_store, RETRIEVAL_MIN_TOKENS
+from rules import extract_fields, record_sources
+import ocr_engine
+from validation import to_json_schema, repair_json, validate_fields
+from telemetry import stage, log_error, record_cache_lookup
+from llm_router import LLMRouter
+
+# The PDF and OCR stacks (PyPDF2, pdf2image, Pillow, numpy) are imported inside
+# the functions that run in the CPU pool, so API processes never load them
+if TYPE_CHECKING:
+    import numpy as np
+
+# Concurrency limits per pipeline stage, overridable through the environment.
+# Every parse worker process has its own pool, so by default the cores are split between them
+_PARSE_WORKERS = max(1, int(os.getenv("PAGEMONK_WORKERS", "2")))
+CPU_WORKERS = int(os.getenv("PAGEMONK_CPU_WORKERS", str(max(1, (os.cpu_count() or 2) // _PARSE_WORKERS))))
+# OCR leaves one pool process free by default, so text-layer extraction does not queue behind it
+OCR_CONCURRENCY = int(os.getenv("PAGEMONK_OCR_CONCURRENCY", str(max(1, CPU_WORKERS - 1))))
+PDF_TEXT_CONCURRENCY = int(os.getenv("PAGEMONK_PDF_TEXT_CONCURRENCY", str(CPU_WORKERS)))
+PREPROCESS_CONCURRENCY = int(os.getenv("PAGEMONK_PREPROCESS_CONCURRENCY", str(CPU_WORKERS)))
+# Page ranges handed out per pool worker; more ranges stream results sooner
+PDF_RANGES_PER_WORKER = int(os.getenv("PAGEMONK_PDF_RANGES_PER_WORKER", "4"))
+
+# Scanned PDF pages: pages with less text than this are rasterized and OCR'd
+PDF_TEXT_MIN_CHARS = int(os.getenv("PAGEMONK_PDF_TEXT_MIN_CHARS", "20"))
+PDF_OCR_DPI = int(os.getenv("PAGEMONK_PDF_OCR_DPI", "300"))
+PDF_OCR_BATCH_PAGES = int(os.getenv("PAGEMONK_PDF_OCR_BATCH_PAGES", "4"))
+PDF_OCR_PSM = 3
+# Image tiles are single blocks of text
+IMAGE_OCR_PSM = 6
+# Bumped when preprocessing changes so cached OCR text is not reused
+OCR_PREPROCESS_VERSION = 1
+
+# Model used to structure extracted text into markdown
+STRUCTURE_MODEL = os.getenv("PAGEMONK_STRUCTURE_MODEL", "qwen2.5:0.5b")
+# Model used for schema extraction; stored with each extraction so results can be reused
+EXTRACTION_MODEL = os.getenv("PAGEMONK_EXTRACTION_MODEL", "qwen3:0.6b")
+# Models loaded onto the Ollama hosts at startup
+LLM_WARM_MODELS = [
+    model.strip()
+    for model in os.getenv("PAGEMONK_LLM_WARM_MODELS", f"{STRUCTURE_MODEL},{EXTRACTION_MODEL}").split(",")
+    if model.strip()
+]
+# Follow-up requests for fields whose values failed validation
+EXTRACTION_REPAIR_ATTEMPTS = int(os.getenv("PAGEMONK_EXTRACTION_REPAIR_ATTEMPTS", "1"))
+
+# Structuring: documents over this many tokens are split and structured in parallel
+STRUCTURE_CHUNK_TOKENS = int(os.getenv("PAGEMONK_STRUCTURE_CHUNK_TOKENS", "1200"))
+
+DEFAULT_STRUCTURE_INSTRUCTIONS = """
+            Please structure this content into clean, well-organized markdown format.
+            Include appropriate headings, lists, tables where relevant, and maintain the logical flow of information.
+            Make it easy to read and understand.
+            """
+
+
+def _pdf_page_count(file_path: str) -> int:
+    """Count the pages of a PDF (runs in the CPU pool)"""
+    import PyPDF2
+    try:
+        with open(file_path, 'rb') as file:
+            return len(PyPDF2.PdfReader(file).pages)
+    except Exception as e:
+        raise RuntimeError(f"Error reading PDF: {str(e)}") from e
+
+
+def _page_fingerprint(page) -> str:
+    """Hash a PDF page's content stream and images, independent of the file around it"""
+    digest = hashlib.sha256()
+    digest.update(repr([float(v) for v in page.mediabox]).encode())
+    digest.update(str(page.get('/Rotate', 0)).encode())
+
+    contents = page.get_contents()
+    if contents is not None:
+        digest.update(contents.get_data())
+
+    resources = page.get('/Resources')
+    xobjects = resources.get_object().get('/XObject') if resources else None
+    if xobjects:
+        xobjects = xobjects.get_object()
+        for name in sorted(xobjects):
+            # Raw (still encoded) stream bytes are enough to identify the image
+            digest.update(getattr(xobjects[name].get_object(), '_data', b''))
+
+    return digest.hexdigest()
+
+
+def _pdf_range_to_text(file_path: str, start: int, end: int) -> Tuple[int, List[Tuple[str, str]]]:
+    """Extract (text, fingerprint) for pages [start, end) of a PDF (runs in the CPU pool)"""
+    import PyPDF2
+    try:
+        with open(file_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            pages = []
+            for i in range(start, end):
+                page = pdf_reader.pages[i]
+                pages.append((page.extract_text() or "", _page_fingerprint(page)))
+            return start, pages
+    except Exception as e:
+        raise RuntimeError(f"Error reading PDF: {str(e)}") from e
+
+
+def _ocr_pdf_pages(file_path: str, page_numbers: List[int], dpi: int) -> List[Tuple[int, str]]:
+    """Rasterize and OCR a batch of image-only PDF pages (runs in the CPU pool)"""
+    from PIL import Image
+    from pdf2image import convert_from_path
+    from preprocess import prepare_image
+    try:
+        results = []
+        for page_number in page_numbers:
+            images = convert_from_path(
+                file_path, dpi=dpi, first_page=page_number, last_page=page_number, grayscale=True
+            )
+            if images:
+                # Already rasterized at the OCR DPI: deskew and binarize only
+                binary = prepare_image(images[0], tile=False, target_dpi=None)[0]
+                page_text = ocr_engine.image_to_string(Image.fromarray(binary), PDF_OCR_PSM)
+            else:
+                page_text = ""
+            results.append((page_number, page_text))
+        return results
+    except Exception as e:
+        raise RuntimeError(f"Error running OCR on PDF pages: {str(e)}") from e
+
+
+def _page_ranges(page_count: int, parts: int) -> List[Tuple[int, int]]:
+    """Split page indexes into contiguous ranges, a few per pool worker"""
+    size = max(1, math.ceil(page_count / max(parts, 1)))
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+
+def structure_pieces(segments: List[Tuple[str, int, int]]) -> List[Tuple[int, str, str]]:
+    """Split page-aligned segments (text, first_page, last_page) into structuring pieces
+
+    Returns (segment index, text, context) for each piece. Segments over the
+    chunk budget are chunked like stream_structure does; a single piece gets
+    no continuity context.
+    """
+    chunks: List[Chunk] = []
+    owners: List[int] = []
+    for owner, (text, first_page, last_page) in enumerate(segments):
+        if estimate_tokens(text) <= STRUCTURE_CHUNK_TOKENS:
+            parts = [Chunk(0, text, first_page, last_page, None)]
+        else:
+            parts = [
+                chunk._replace(first_page=first_page + chunk.first_page - 1, last_page=first_page + chunk.last_page - 1)
+                for chunk in chunk_text(text, STRUCTURE_CHUNK_TOKENS)
+            ]
+        for part in parts:
+            chunks.append(part._replace(index=len(chunks)))
+            owners.append(owner)
+    if len(chunks) == 1:
+        return [(0, chunks[0].text, "")]
+    return [(owner, chunk.text, continuity_note(chunks, chunk)) for owner, chunk in zip(owners, chunks)]
+
+
+def _file_fingerprint(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def page_content(file_path: str, pages: List[Tuple[int, str, str]]) -> str:
+    """The document text for extracted pages: page texts joined with page breaks"""
+    text, _ = join_pages([page_text for _, _, page_text in pages])
+    if not text and os.path.splitext(file_path)[1].lower() == '.pdf':
+        return f"PDF processed ({len(pages)} pages) but no text was detected, even with OCR."
+    return text
+
+
+def _prepare_image_file(file_path: str) -> Tuple[List["np.ndarray"], Tuple[int, int]]:
+    """Preprocess an image file into binarized text tiles (runs in the CPU pool)"""
+    from PIL import Image
+    from preprocess import prepare_image
+    try:
+        with Image.open(file_path) as img:
+            img.load()
+            return prepare_image(img), img.size
+    except Exception as e:
+        raise RuntimeError(f"Error processing image with OCR: {str(e)}") from e
+
+
+def _ocr_tile(tile: "np.ndarray") -> str:
+    """OCR one preprocessed tile (Tesseract, runs in the CPU pool)"""
+    from PIL import Image
+    try:
+        return ocr_engine.image_to_string(Image.fromarray(tile), IMAGE_OCR_PSM)
+    except Exception as e:
+        raise RuntimeError(f"Error processing image with OCR: {str(e)}") from e
+
+
+def parse_json_response(text: str) -> Dict[str, Any]:
+    """Pull the JSON object out of an LLM answer, dropping think-tags and code fences"""
+    stripped = re.sub(r"<think>.*?</think>", "", text, flags=re.DOTALL)
+    start, end = stripped.find("{"), stripped.rfind("}")
+    if start != -1 and end > start:
+        try:
+            return json.loads(stripped[start:end + 1])
+        except ValueError:
+            pass
+    # Trailing commas, truncation and surrounding prose
+    return repair_json(text)
+
+
+def _merge_fields(schema: Dict[str, Any], rule_values: Dict[str, Any], llm_values: Dict[str, Any]) -> Dict[str, Any]:
+    """Combine rule and LLM results in schema field order"""
+    return {
+        field: rule_values[field] if field in rule_values else llm_values.get(field)
+        for field in schema
+    }
+
 
 class DocumentProcessor:
     def __init__(self):
-        pass
-        
-    async def extract_text_with_ocr(self, file_path: str) -> str:
-        """Extract text from document using OCR and text extraction"""
+        self._cpu_pool = None
+        # Pool tasks in flight per stage
+        self._cpu_slots = {
+            "pdf_parse": asyncio.Semaphore(PDF_TEXT_CONCURRENCY),
+            "preprocess": asyncio.Semaphore(PREPROCESS_CONCURRENCY),
+            "ocr": asyncio.Semaphore(OCR_CONCURRENCY),
+        }
+        # Ollama hosts, with per-host concurrency limits
+        self.llm = LLMRouter()
+
+    @property
+    def cpu_pool(self) -> ProcessPoolExecutor:
+        """Bounded process pool for CPU-bound PDF parsing and OCR, created on first use"""
+        if self._cpu_pool is None:
+            self._cpu_pool = ProcessPoolExecutor(
+                max_workers=CPU_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                # Each worker keeps one Tesseract instance loaded for its lifetime
+                initializer=ocr_engine.init_worker,
+            )
+        return self._cpu_pool
+
+    async def _run_cpu(self, func, *args, stage_name: str):
+        """Run a CPU-bound function in the process pool without blocking the event loop
+
+        Each stage is bounded separately. Time spent waiting for a slot is not
+        counted towards `stage_name`.
+        """
+        async with self._cpu_slots[stage_name]:
+            with stage(stage_name):
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self.cpu_pool, func, *args)
+
+    async def _chat(self, model: str, prompt: str, format: Optional[Dict[str, Any]] = None) -> str:
+        """Send a single-message chat to Ollama through the host router
+
+        `format` is a JSON Schema the answer is constrained to.
+        """
+        response = await self.llm.chat(
+            model,
+            [{
+                'role': 'user',
+                'content': prompt
+            }],
+            format=format,
+        )
+        return response['message']['content']
+
+    async def _cached_chat(
+        self, model: str, prompt: str, template: str, content: str, format: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Chat through the persistent response cache keyed on model, template and content"""
+        if format is not None:
+            template = f"{template}\nformat:{json.dumps(format, sort_keys=True)}"
+        key = cache_key(model, template, content)
+        cached = await asyncio.to_thread(llm_cache.get, key)
+        record_cache_lookup("llm", cached is not None)
+        if cached is not None:
+            return cached
+
+        result = await self._chat(model, prompt, format)
+        await asyncio.to_thread(llm_cache.put, key, model, result)
+        return result
+
+    def shutdown(self):
+        """Release the process pool"""
+        if self._cpu_pool is not None:
+            self._cpu_pool.shutdown(cancel_futures=True)
+            self._cpu_pool = None
+
+    async def _stream_chat(self, model: str, prompt: str) -> AsyncIterator[str]:
+        """Stream a single-message chat from Ollama, yielding content as it is generated"""
+        async for part in self.llm.stream_chat(model, [{
+            'role': 'user',
+            'content': prompt
+        }]):
+            token = part['message']['content']
+            if token:
+                yield token
+
+    async def warm_models(self) -> Dict[str, bool]:
+        """Load the structuring and extraction models onto the Ollama hosts"""
+        return await self.llm.warm(LLM_WARM_MODELS)
+
+    async def extract_text_with_ocr(
+        self, file_path: str, on_page: Optional[Callable[[int, str], Awaitable[None]]] = None
+    ) -> str:
+        """Extract text from document using OCR and text extraction
+
+        `on_page` is awaited with each page number and text as soon as that page is ready.
+        """
+        pages = await self.extract_pages(file_path, on_page)
+        return page_content(file_path, pages)
+
+    async def extract_pages(
+        self,
+        file_path: str,
+        on_page: Optional[Callable[[int, str], Awaitable[None]]] = None,
+        known: Optional[Dict[str, str]] = None,
+    ) -> List[Tuple[int, str, str]]:
+        """Extract (page_number, fingerprint, text) for every page, in page order
+
+        `known` maps page fingerprints to text extracted earlier (e.g. from a
+        previous version of the document); those pages are not OCR'd again.
+        """
         try:
             file_extension = os.path.splitext(file_path)[1].lower()
-            
+
             if file_extension == '.pdf':
-                return self._extract_from_pdf(file_path)
+                pages = []
+                async for page in self._iter_pdf_pages(file_path, known):
+                    pages.append(page)
+                    if on_page:
+                        await on_page(page[0], page[2])
+                return sorted(pages)
             elif file_extension in ['.jpg', '.jpeg', '.png']:
-                return self._extract_from_image(file_path)
+                fingerprint = await asyncio.to_thread(_file_fingerprint, file_path)
+                text = (known or {}).get(fingerprint)
+                if text is None:
+                    text = await self._extract_from_image(file_path)
+                if on_page:
+                    await on_page(1, text)
+                return [(1, fingerprint, text)]
             else:
-                return "Unsupported file format"
-                
+                return [(1, "", "Unsupported file format")]
+
         except Exception as e:
-            print(f"Error in text extraction: {e}")
-            return f"Error extracting text: {str(e)}"
-    
-    def _extract_from_pdf(self, file_path: str) -> str:
-        """Extract text from PDF using PyPDF2"""
+            log_error("text extraction failed", file=os.path.basename(file_path), error=str(e))
+            raise
+
+    async def _iter_pdf_pages(
+        self, file_path: str, known: Optional[Dict[str, str]] = None
+    ) -> AsyncIterator[Tuple[int, str, str]]:
+        """Yield (page_number, fingerprint, text) for each PDF page as soon as it is extracted
+
+        Pages with a text layer are returned directly. Image-only pages are
+        looked up in `known` and the OCR cache by content hash, and misses are
+        rasterized and OCR'd in batches across the CPU pool.
+        """
+        known = known or {}
+        page_count = await self._run_cpu(_pdf_page_count, file_path, stage_name="pdf_parse")
+        ocr_settings = f"dpi={PDF_OCR_DPI}:--psm {PDF_OCR_PSM}:lang={ocr_engine.OCR_LANG}:prep={OCR_PREPROCESS_VERSION}"
+
+        async def read_range(start, end):
+            return "text", await self._run_cpu(_pdf_range_to_text, file_path, start, end, stage_name="pdf_parse")
+
+        async def ocr_batch(batch):
+            page_numbers = [page_number for page_number, _ in batch]
+            return "ocr", (batch, await self._run_cpu(_ocr_pdf_pages, file_path, page_numbers, PDF_OCR_DPI, stage_name="ocr"))
+
+        pending = {
+            asyncio.ensure_future(read_range(start, end))
+            for start, end in _page_ranges(page_count, CPU_WORKERS * PDF_RANGES_PER_WORKER)
+        }
+        ranges_left = len(pending)
+        batch = []
+
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages:
-                    page_text = page.extract_text()
-                    if page_text.strip():
-                        text += page_text + "\n"
-                
-                # If PDF has no extractable text, it might be scanned - convert to image and OCR
-                if not text.strip():
-                    # For scanned PDFs, you would need pdf2image library
-                    # For now, return a message indicating OCR is needed
-                    return "This appears to be a scanned PDF. Please use an image format for OCR processing."
-                
-                return text.strip()
-        except Exception as e:
-            return f"Error reading PDF: {str(e)}"
-    
-    def _extract_from_image(self, file_path: str) -> str:
-        """Extract text from image using OCR (Tesseract)"""
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    kind, payload = task.result()
+
+                    if kind == "text":
+                        ranges_left -= 1
+                        start, pages = payload
+                        for offset, (page_text, fingerprint) in enumerate(pages):
+                            page_number = start + offset + 1
+                            if len(page_text.strip()) >= PDF_TEXT_MIN_CHARS:
+                                yield page_number, fingerprint, page_text
+                                continue
+
+                            if fingerprint in known:
+                                yield page_number, fingerprint, known[fingerprint]
+                                continue
+
+                            cached = await asyncio.to_thread(ocr_cache.get, fingerprint, ocr_settings)
+                            record_cache_lookup("ocr", cached is not None)
+                            if cached is not None:
+                                yield page_number, fingerprint, cached
+                                continue
+
+                            batch.append((page_number, fingerprint))
+                            if len(batch) >= PDF_OCR_BATCH_PAGES:
+                                pending.add(asyncio.ensure_future(ocr_batch(batch)))
+                                batch = []
+                    else:
+                        batch_pages, results = payload
+                        fingerprints = dict(batch_pages)
+                        for page_number, page_text in results:
+                            await asyncio.to_thread(ocr_cache.put, fingerprints[page_number], ocr_settings, page_text)
+                            yield page_number, fingerprints[page_number], page_text
+
+                # Once every range has been read, flush the partial OCR batch
+                if ranges_left == 0 and batch:
+                    pending.add(asyncio.ensure_future(ocr_batch(batch)))
+                    batch = []
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _extract_from_image(self, file_path: str) -> str:
+        """Extract text from image using OCR (Tesseract)
+
+        The image is downscaled, deskewed and binarized, cut into text tiles,
+        and the tiles are OCR'd in parallel across the CPU pool.
+        """
+        tiles, (width, height) = await self._run_cpu(_prepare_image_file, file_path, stage_name="preprocess")
+        texts = await asyncio.gather(*(self._run_cpu(_ocr_tile, tile, stage_name="ocr") for tile in tiles))
+        extracted_text = "\n".join(text.strip() for text in texts if text.strip())
+
+        # If no text found, provide helpful message
+        if not extracted_text:
+            return f"Image processed ({width}x{height} pixels) but no text was detected. The image may be too low quality or contain no readable text."
+
+        return extracted_text
+
+    async def structure_with_llm(self, content: str, instructions: Optional[str] = None) -> str:
+        """Structure content using the structuring model (Qwen2.5:0.5b by default)
+
+        Content larger than the chunk budget is split on page, heading and
+        paragraph boundaries, each chunk is structured concurrently and the
+        markdown is merged back in order.
+        """
         try:
-            # Open and process image
-            with Image.open(file_path) as img:
-                # Convert RGBA to RGB if necessary
-                if img.mode == 'RGBA':
-                    img = img.convert('RGB')
-                
-                # Use Tesseract OCR to extract text
-                extracted_text = pytesseract.image_to_string(img, config='--psm 6')
-                
-                # If no text found, provide helpful message
-                if not extracted_text.strip():
-                    width, height = img.size
-                    return f"Image processed ({width}x{height} pixels) but no text was detected. The image may be too low quality or contain no readable text."
-                
-                return extracted_text.strip()
-                
+            instructions = instructions or DEFAULT_STRUCTURE_INSTRUCTIONS
+
+            if estimate_tokens(content) <= STRUCTURE_CHUNK_TOKENS:
+                return await self._structure_chunk(content, instructions)
+
+            chunks = chunk_text(content, STRUCTURE_CHUNK_TOKENS)
+            # Per-host LLM limits bound how many chunks are in flight at once
+            results = await asyncio.gather(*(
+                self._structure_chunk(chunk.text, instructions, continuity_note(chunks, chunk))
+                for chunk in chunks
+            ))
+            return "\n\n".join(result.strip() for result in results)
+
         except Exception as e:
-            return f"Error processing image with OCR: {str(e)}"
-    
-    async def structure_with_llm(self, content: str, instructions: Optional[str] = None) -> str:
-        """Structure content using Ollama Qwen2.5:0.5b"""
+            log_error("LLM structuring failed", error=str(e))
+            raise
+
+    async def stream_structure(self, content: str, instructions: Optional[str] = None) -> AsyncIterator[Tuple[str, Any]]:
+        """Structure content, yielding markdown as the LLM generates it
+
+        Yields ("chunk", (index, total)) when a chunk's output starts and
+        ("token", text) for each piece of markdown, in document order. Chunks
+        are generated concurrently; later chunks are buffered until the ones
+        before them have been streamed.
+        """
+        if estimate_tokens(content) <= STRUCTURE_CHUNK_TOKENS:
+            pieces = [(content, "")]
+        else:
+            chunks = chunk_text(content, STRUCTURE_CHUNK_TOKENS)
+            pieces = [(chunk.text, continuity_note(chunks, chunk)) for chunk in chunks]
+        async for item in self.stream_structure_pieces(pieces, instructions):
+            yield item
+
+    async def stream_structure_pieces(
+        self,
+        pieces: List[Tuple[str, str]],
+        instructions: Optional[str] = None,
+        ready: Optional[Dict[int, str]] = None,
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """Structure (text, context) pieces, yielding like stream_structure
+
+        `ready` maps piece indexes to markdown structured earlier; those pieces
+        are yielded as they are, without an LLM call.
+        """
+        instructions = instructions or DEFAULT_STRUCTURE_INSTRUCTIONS
+        ready = ready or {}
+        queues = [asyncio.Queue() for _ in pieces]
+
+        async def produce(queue, text, context):
+            try:
+                async for token in self._stream_structure_chunk(text, instructions, context):
+                    queue.put_nowait(token)
+            except Exception as e:
+                queue.put_nowait(e)
+            finally:
+                queue.put_nowait(None)
+
+        # Per-host LLM limits bound how many chunks are generating at once
+        for index in ready:
+            queues[index].put_nowait(ready[index])
+            queues[index].put_nowait(None)
+        tasks = [
+            asyncio.ensure_future(produce(queue, text, context))
+            for index, (queue, (text, context)) in enumerate(zip(queues, pieces))
+            if index not in ready
+        ]
         try:
-            default_instructions = """
-            Please structure this content into clean, well-organized markdown format. 
-            Include appropriate headings, lists, tables where relevant, and maintain the logical flow of information.
-            Make it easy to read and understand.
-            """
-            
-            prompt = f"""
-            {instructions or default_instructions}
-            
+            for index, queue in enumerate(queues):
+                yield "chunk", (index, len(pieces))
+                if index:
+                    yield "token", "\n\n"
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    yield "token", item
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _stream_structure_chunk(self, content: str, instructions: str, context: str = "") -> AsyncIterator[str]:
+        """Stream the structuring of one piece of content, through the response cache"""
+        key = cache_key(STRUCTURE_MODEL, f"{instructions}\n{context}", content)
+        cached = await asyncio.to_thread(llm_cache.get, key)
+        record_cache_lookup("llm", cached is not None)
+        if cached is not None:
+            yield cached
+            return
+
+        parts = []
+        async for token in self._stream_chat(STRUCTURE_MODEL, self._structure_prompt(content, instructions, context)):
+            parts.append(token)
+            yield token
+        await asyncio.to_thread(llm_cache.put, key, STRUCTURE_MODEL, "".join(parts))
+
+    def _structure_prompt(self, content: str, instructions: str, context: str = "") -> str:
+        return f"""
+            {instructions}
+            {context}
+
             Content to structure:
             {content}
-            
+
             Return only the structured markdown content without any additional commentary.
             """
-            
-            response = ollama.chat(
-                model='qwen2.5:0.5b',
-                messages=[{
-                    'role': 'user',
-                    'content': prompt
-                }]
-            )
-            
-            return response['message']['content']
-            
-        except Exception as e:
-            print(f"Error in LLM structuring: {e}")
-            return f"Error structuring content: {str(e)}"
-    
+
+    async def _structure_chunk(self, content: str, instructions: str, context: str = "") -> str:
+        """Structure one piece of content with a single LLM call"""
+        prompt = self._structure_prompt(content, instructions, context)
+        return await self._cached_chat(STRUCTURE_MODEL, prompt, f"{instructions}\n{context}", content)
+
     async def extract_with_schema(self, content: str, schema: Dict[str, Any]) -> str:
         """Extract information according to a user-defined schema"""
+        extracted, _ = await self.extract_with_schema_detailed(content, schema)
+        return extracted
+
+    async def extract_with_schema_detailed(self, content: str, schema: Dict[str, Any]) -> Tuple[str, Dict[str, str]]:
+        """Extract with rules first and the LLM only for fields the rules could not fill
+
+        Returns the extracted JSON and which path ("rule" or "llm") served each field.
+        """
         try:
-            schema_prompt = f"""
+            rule_values, _ = extract_fields(content, schema)
+            remaining = {field: value for field, value in schema.items() if field not in rule_values}
+            sources = {field: "rule" if field in rule_values else "llm" for field in schema}
+            record_sources(sources)
+
+            llm_values = await self._extract_with_llm(content, remaining) if remaining else {}
+            return json.dumps(_merge_fields(schema, rule_values, llm_values), indent=2), sources
+
+        except Exception as e:
+            log_error("schema extraction failed", error=str(e))
+            raise
+
+    def _schema_prompt(self, content: str, schema: Dict[str, Any], invalid: Optional[Dict[str, str]] = None) -> str:
+        prompt = f"""
             Extract information from the following content according to this schema:
-            
+
             Schema: {json.dumps(schema, indent=2)}
-            
+
             Content: {content}
-            
+
             Return the extracted information as a JSON object that matches the schema structure.
             If a field cannot be found, use null or an appropriate default value.
             Return only valid JSON without any additional text or commentary.
             """
-            
-            response = ollama.chat(
-                model='qwen3:0.6b',
-                messages=[{
-                    'role': 'user',
-                    'content': schema_prompt
-                }]
+        if invalid:
+            problems = "\n".join(f"- {field}: {error}" for field, error in invalid.items())
+            prompt += f"""
+            A previous answer for these fields was invalid:
+            {problems}
+            """
+        return prompt
+
+    async def _extract_with_llm(self, content: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+        """Ask the LLM to fill a schema from the relevant parts of the content
+
+        The answer is constrained to a JSON Schema built from the schema
+        definition, then repaired and coerced locally. Only fields that still
+        fail validation are asked for again; any left invalid become null.
+        """
+        if estimate_tokens(content) > RETRIEVAL_MIN_TOKENS:
+            # Only send the chunks relevant to the schema's fields
+            index = await asyncio.to_thread(index_store.get_or_build, content)
+            content = index.select_for_schema(schema)
+
+        answer = await self._cached_chat(
+            EXTRACTION_MODEL, self._schema_prompt(content, schema),
+            json.dumps(schema, sort_keys=True), content, format=to_json_schema(schema),
+        )
+        values, invalid = validate_fields(schema, answer)
+
+        for attempt in range(EXTRACTION_REPAIR_ATTEMPTS):
+            if not invalid:
+                break
+            subset = {field: schema[field] for field in invalid}
+            answer = await self._cached_chat(
+                EXTRACTION_MODEL, self._schema_prompt(content, subset, invalid),
+                f"{json.dumps(subset, sort_keys=True)}\nrepair:{attempt}:{json.dumps(invalid, sort_keys=True)}",
+                content, format=to_json_schema(subset),
             )
-            
-            return response['message']['content']
-            
-        except Exception as e:
-            print(f"Error in schema extraction: {e}")
-            return f"Error extracting with schema: {str(e)}"
+            fixed, invalid = validate_fields(subset, answer)
+            values.update(fixed)
+
+        if invalid:
+            log_error("schema extraction left invalid fields as null", fields=sorted(invalid))
+        return values
+
+    async def extract_with_schemas(
+        self, content: str, schemas: Dict[int, Dict[str, Any]]
+    ) -> Dict[int, Tuple[str, Dict[str, str]]]:
+        """Extract several schemas from one document with a single merged prompt
+
+        Rules fill what they can per schema. The remaining fields of every
+        schema are nested under a "schema_<id>" key so names cannot collide
+        and sent in one prompt. Validation runs on those keys, so a schema
+        with any invalid field has its whole part re-asked, together with
+        the other invalid parts in one repair prompt.
+
+        Returns each schema's extracted JSON and which path ("rule" or "llm")
+        served each of its fields.
+        """
+        if len(schemas) == 1:
+            schema_id, schema = next(iter(schemas.items()))
+            return {schema_id: await self.extract_with_schema_detailed(content, schema)}
+
+        rule_values = {}
+        sources = {}
+        merged = {}
+        for schema_id, schema in schemas.items():
+            rule_values[schema_id], _ = extract_fields(content, schema)
+            remaining = {field: value for field, value in schema.items() if field not in rule_values[schema_id]}
+            sources[schema_id] = {field: "rule" if field in rule_values[schema_id] else "llm" for field in schema}
+            record_sources(sources[schema_id])
+            if remaining:
+                merged[f"schema_{schema_id}"] = remaining
+
+        parsed = await self._extract_with_llm(content, merged) if merged else {}
+
+        return {
+            schema_id: (
+                json.dumps(
+                    _merge_fields(schema, rule_values[schema_id], parsed.get(f"schema_{schema_id}") or {}), indent=2
+                ),
+                sources[schema_id],
+            )
+            for schema_id, schema in schemas.items()
+        }
 
 # Global processor instance
-processor = DocumentProcessor()
\ No newline at end of file
+processor = DocumentProcessor()
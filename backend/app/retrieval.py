@@ -0,0 +1,129 @@
+import os
+import re
+import json
+import math
+import hashlib
+import tempfile
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from chunking import chunk_text
+
+RETRIEVAL_INDEX_DIR = os.getenv("PAGEMONK_RETRIEVAL_INDEX_DIR", "cache/retrieval")
+RETRIEVAL_CHUNK_TOKENS = int(os.getenv("PAGEMONK_RETRIEVAL_CHUNK_TOKENS", "200"))
+RETRIEVAL_TOP_K = int(os.getenv("PAGEMONK_RETRIEVAL_TOP_K", "3"))
+# Documents shorter than this are sent to the LLM whole
+RETRIEVAL_MIN_TOKENS = int(os.getenv("PAGEMONK_RETRIEVAL_MIN_TOKENS", "1500"))
+
+# Schema values that only name a type carry no description worth searching for
+_TYPE_NAMES = {"string", "number", "integer", "float", "boolean", "date", "array", "object", "null"}
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower().replace("_", " "))
+
+
+def field_queries(schema: Any, path: Optional[List[str]] = None) -> List[str]:
+    """One search query per leaf field: its name, parents and any description"""
+    path = path or []
+    if isinstance(schema, dict):
+        queries = []
+        for name, value in schema.items():
+            # Batch extraction nests schemas under "schema_<id>"; that key means nothing to the text
+            segment = [] if re.fullmatch(r"schema_\d+", name) else [name]
+            queries.extend(field_queries(value, path + segment))
+        return queries
+    if isinstance(schema, list):
+        return [query for item in schema for query in field_queries(item, path)]
+
+    query = " ".join(path)
+    if isinstance(schema, str) and schema.lower() not in _TYPE_NAMES:
+        query += " " + schema
+    return [query] if query.strip() else []
+
+
+class ChunkIndex:
+    """BM25 index over the chunks of one document's text"""
+
+    k1 = 1.5
+    b = 0.75
+
+    def __init__(self, chunks: List[str], term_freqs: List[Dict[str, int]], doc_freqs: Dict[str, int]):
+        self.chunks = chunks
+        self.term_freqs = term_freqs
+        self.doc_freqs = doc_freqs
+        self.lengths = [sum(tf.values()) for tf in term_freqs]
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+
+    @classmethod
+    def build(cls, text: str, chunk_tokens: int = RETRIEVAL_CHUNK_TOKENS) -> "ChunkIndex":
+        chunks = [chunk.text for chunk in chunk_text(text, chunk_tokens)]
+        term_freqs = [dict(Counter(tokenize(chunk))) for chunk in chunks]
+        doc_freqs = Counter(term for tf in term_freqs for term in tf)
+        return cls(chunks, term_freqs, dict(doc_freqs))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"chunks": self.chunks, "term_freqs": self.term_freqs, "doc_freqs": self.doc_freqs}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ChunkIndex":
+        return cls(data["chunks"], data["term_freqs"], data["doc_freqs"])
+
+    def score(self, query: str) -> List[float]:
+        n = len(self.chunks)
+        scores = [0.0] * n
+        for term in set(tokenize(query)):
+            df = self.doc_freqs.get(term)
+            if not df:
+                continue
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for i, tf in enumerate(self.term_freqs):
+                freq = tf.get(term)
+                if freq:
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / (self.avg_length or 1))
+                    scores[i] += idf * freq * (self.k1 + 1) / (freq + norm)
+        return scores
+
+    def top_k(self, query: str, k: int) -> List[int]:
+        scores = self.score(query)
+        ranked = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+        return [i for i in ranked[:k] if scores[i] > 0]
+
+    def select_for_schema(self, schema: Dict[str, Any], k: int = RETRIEVAL_TOP_K) -> str:
+        """Keep the chunks most relevant to any schema field, in document order"""
+        # The opening chunk usually holds titles, parties and dates, so it always goes in
+        selected = {0} if self.chunks else set()
+        for query in field_queries(schema):
+            selected.update(self.top_k(query, k))
+        return "\n...\n".join(self.chunks[i] for i in sorted(selected))
+
+
+class IndexStore:
+    """Persists chunk indexes on disk keyed by a hash of the indexed text"""
+
+    def __init__(self, root: str = RETRIEVAL_INDEX_DIR):
+        self.root = root
+
+    def _path(self, content_hash: str) -> str:
+        return os.path.join(self.root, content_hash[:2], f"{content_hash}.json")
+
+    def get_or_build(self, text: str) -> ChunkIndex:
+        content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        path = self._path(content_hash)
+        try:
+            with open(path, encoding="utf-8") as f:
+                return ChunkIndex.from_dict(json.load(f))
+        except (FileNotFoundError, ValueError):
+            pass
+
+        index = ChunkIndex.build(text)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(index.to_dict(), f)
+        os.replace(tmp_path, path)
+        return index
+
+
+index_store = IndexStore()
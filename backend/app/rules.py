@@ -0,0 +1,169 @@
+import os
+import re
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Fields filled by a rule at or above this confidence never reach the LLM
+RULE_MIN_CONFIDENCE = float(os.getenv("PAGEMONK_RULE_MIN_CONFIDENCE", "0.9"))
+
+# Per-field counters of which path served each field: {(field, "rule"|"llm"): count}
+field_stats: Counter = Counter()
+
+_MONTHS = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?"
+
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+PHONE_RE = re.compile(r"(?<![\w/])(?:\+\d{1,3}[\s.-]?)?(?:\(\d{2,4}\)[\s.-]?|\d{2,4}[\s.-])\d{3,4}[\s.-]?\d{3,4}(?![\w/])")
+LINKEDIN_RE = re.compile(r"(?:https?://)?(?:[a-z]{2,3}\.)?linkedin\.com/(?:in|company)/[\w%-]+/?", re.IGNORECASE)
+URL_RE = re.compile(r"(?:https?://|www\.)[^\s<>()\"']+[^\s<>()\"'.,;]", re.IGNORECASE)
+DATE_RE = re.compile(
+    r"\b(?:\d{4}-\d{2}-\d{2}"                                  # 2024-01-31
+    r"|\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}"                        # 01/31/2024, 31.01.2024
+    rf"|{_MONTHS}\s+\d{{1,2}}(?:st|nd|rd|th)?,?\s+\d{{4}}"     # January 31, 2024
+    rf"|\d{{1,2}}(?:st|nd|rd|th)?\s+{_MONTHS},?\s+\d{{4}})\b",  # 31 Jan 2024
+    re.IGNORECASE,
+)
+AMOUNT_RE = re.compile(r"(?:[$€£¥₹]|\b[A-Z]{3}\b)?\s?-?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d{1,2})?(?![\d,]|\.\d|\s?%)")
+REFERENCE_RE = re.compile(r"[A-Z0-9][A-Z0-9/_.-]*\d[A-Z0-9/_.-]*", re.IGNORECASE)
+
+_CURRENCY_SYMBOLS = {"$": "USD", "€": "EUR", "£": "GBP", "¥": "JPY", "₹": "INR"}
+_CURRENCY_CODES = re.compile(r"\b(USD|EUR|GBP|JPY|INR|CAD|AUD|CHF|CNY|SGD|AED)\b")
+
+# Extra labels that introduce a field's value besides the field name itself
+_LABEL_ALIASES = {
+    "total_amount": ["total amount", "amount due", "grand total", "balance due", "total"],
+    "tax_amount": ["tax amount", "vat", "gst", "sales tax", "tax"],
+    "invoice_number": ["invoice number", "invoice no", "invoice #", "invoice"],
+    "invoice_date": ["invoice date", "date of issue", "issue date", "dated"],
+    "due_date": ["due date", "payment due", "due"],
+    "phone": ["phone", "tel", "telephone", "mobile", "cell"],
+}
+
+
+def _label_pattern(field: str) -> str:
+    labels = _LABEL_ALIASES.get(field, []) + [field.replace("_", " ")]
+    alternatives = "|".join(
+        r"\W*".join(re.escape(word) for word in label.split()) for label in sorted(set(labels), key=len, reverse=True)
+    )
+    return rf"(?:{alternatives})"
+
+
+def _labelled(text: str, field: str, value_re: re.Pattern) -> Optional[str]:
+    """Find a value that directly follows the field's label on the same line"""
+    label = re.compile(
+        r"(?<![a-z])" + _label_pattern(field) + r"(?![a-z])[\s:#.-]*(?:no\.?|number)?[\s:#.-]*",
+        re.IGNORECASE,
+    )
+    # Labels can overlap ("Total Amount Due"), so resume the search one character in
+    match = label.search(text)
+    while match:
+        tail = text[match.end():match.end() + 60].split("\n", 1)[0]
+        value = value_re.match(tail)
+        if value and value.group(0).strip():
+            return value.group(0).strip()
+        match = label.search(text, match.start() + 1)
+    return None
+
+
+def _unique(text: str, value_re: re.Pattern) -> Tuple[Optional[str], float]:
+    values = list(dict.fromkeys(match.group(0).strip() for match in value_re.finditer(text)))
+    if len(values) == 1:
+        return values[0], 0.9
+    return (values[0], 0.5) if values else (None, 0.0)
+
+
+def _parse_amount(value: str) -> Optional[float]:
+    digits = re.sub(r"[^\d.-]", "", value.replace(",", ""))
+    try:
+        return float(digits)
+    except ValueError:
+        return None
+
+
+def _pattern_rule(value_re: re.Pattern) -> Callable[[str, str], Tuple[Any, float]]:
+    def rule(text: str, field: str) -> Tuple[Any, float]:
+        labelled = _labelled(text, field, value_re)
+        if labelled:
+            return labelled, 0.95
+        return _unique(text, value_re)
+    return rule
+
+
+def _labelled_only(value_re: re.Pattern) -> Callable[[str, str], Tuple[Any, float]]:
+    # Dates and references appear many times per document; without a label we cannot tell which one is meant
+    def rule(text: str, field: str) -> Tuple[Any, float]:
+        labelled = _labelled(text, field, value_re)
+        return (labelled, 0.95) if labelled else (None, 0.0)
+    return rule
+
+
+def _amount_rule(text: str, field: str) -> Tuple[Any, float]:
+    labelled = _labelled(text, field, AMOUNT_RE)
+    amount = _parse_amount(labelled) if labelled else None
+    return (amount, 0.95) if amount is not None else (None, 0.0)
+
+
+def _currency_rule(text: str, field: str) -> Tuple[Any, float]:
+    found = set(_CURRENCY_CODES.findall(text))
+    found.update(code for symbol, code in _CURRENCY_SYMBOLS.items() if symbol in text)
+    if len(found) == 1:
+        return found.pop(), 0.9
+    return None, 0.0
+
+
+def rule_for(field: str, field_type: Any) -> Optional[Callable[[str, str], Tuple[Any, float]]]:
+    """Pick the deterministic extractor for a schema field, if one applies"""
+    if not isinstance(field_type, str):
+        return None
+    name = field.lower()
+    field_type = field_type.lower()
+
+    if "email" in name:
+        return _pattern_rule(EMAIL_RE)
+    if "linkedin" in name:
+        return _pattern_rule(LINKEDIN_RE)
+    if any(word in name for word in ("phone", "mobile", "fax", "tel")):
+        return _pattern_rule(PHONE_RE)
+    if "website" in name or name == "url" or name.endswith("_url"):
+        return _pattern_rule(URL_RE)
+    if "currency" in name:
+        return _currency_rule
+    if "date" in name or field_type == "date":
+        return _labelled_only(DATE_RE)
+    if field_type in ("number", "float", "integer") and any(
+        word in name for word in ("amount", "total", "tax", "price", "subtotal", "balance")
+    ):
+        return _amount_rule
+    if field_type == "string" and (name.endswith(("_number", "_no", "_id")) or name == "invoice_number"):
+        return _labelled_only(REFERENCE_RE)
+    return None
+
+
+def extract_fields(text: str, schema: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, float]]:
+    """Fill top-level scalar fields with rules
+
+    Returns (values, confidences) for the fields whose rule met
+    RULE_MIN_CONFIDENCE; everything else is left for the LLM.
+    """
+    values, confidences = {}, {}
+    for field, field_type in schema.items():
+        rule = rule_for(field, field_type)
+        if rule is None:
+            continue
+        value, confidence = rule(text, field)
+        if value is not None and confidence >= RULE_MIN_CONFIDENCE:
+            values[field] = value
+            confidences[field] = confidence
+    return values, confidences
+
+
+def record_sources(sources: Dict[str, str]):
+    for field, source in sources.items():
+        field_stats[(field, source)] += 1
+
+
+def stats() -> List[Dict[str, Any]]:
+    fields = sorted({field for field, _ in field_stats})
+    return [
+        {"field": field, "rule": field_stats[(field, "rule")], "llm": field_stats[(field, "llm")]}
+        for field in fields
+    ]
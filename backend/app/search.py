@@ -0,0 +1,358 @@
+import os
+import re
+import html
+import math
+import time
+import zlib
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import delete, func, insert, select
+
+from database import SessionLocal, Document, SearchChunk, SearchPosting
+from chunking import chunk_text
+from retrieval import tokenize, RETRIEVAL_CHUNK_TOKENS
+
+SEARCH_DIR = os.getenv("PAGEMONK_SEARCH_DIR", "cache/search")
+SEARCH_CHUNK_TOKENS = int(os.getenv("PAGEMONK_SEARCH_CHUNK_TOKENS", str(RETRIEVAL_CHUNK_TOKENS)))
+# Hashed text embeddings next to the keyword index; set to 0 for keyword search only
+SEARCH_VECTORS = os.getenv("PAGEMONK_SEARCH_VECTORS", "1").lower() not in ("0", "false", "no")
+SEARCH_VECTOR_DIM = int(os.getenv("PAGEMONK_SEARCH_VECTOR_DIM", "512"))
+# Share of the final score that comes from embedding similarity
+SEARCH_VECTOR_WEIGHT = float(os.getenv("PAGEMONK_SEARCH_VECTOR_WEIGHT", "0.3"))
+# Chunks without any query term are returned only above this similarity
+SEARCH_MIN_SIMILARITY = float(os.getenv("PAGEMONK_SEARCH_MIN_SIMILARITY", "0.35"))
+SNIPPET_CHARS = 240
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Rows of the vector file scored per block, bounding the float32 copy
+_SCORE_BLOCK_ROWS = 65536
+_WORD_RE = re.compile(r"[A-Za-z0-9]+")
+
+
+def embed(text: str, dim: int = SEARCH_VECTOR_DIM) -> np.ndarray:
+    """A unit-length hashed bag of words and character trigrams
+
+    Trigrams make related word forms ("revenue", "revenues") land close
+    together without a model; the hash keeps the vector a fixed size.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for token, count in Counter(tokenize(text)).items():
+        weight = 1 + math.log(count)
+        features = [(token, weight)]
+        padded = f"#{token}#"
+        features.extend((padded[i:i + 3], 0.5 * weight) for i in range(len(padded) - 2))
+        for feature, feature_weight in features:
+            h = zlib.crc32(feature.encode("utf-8"))
+            # The top bit picks the sign so collisions tend to cancel out
+            vector[h % dim] += feature_weight if h & 0x80000000 else -feature_weight
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class VectorFile:
+    """Chunk embeddings as float16 rows of a flat file, row number = chunk id
+
+    Writers (parse workers) write rows in place with pwrite; readers memory-map
+    the file and re-map when it grows. The file is never shrunk in place, so an
+    open mapping stays valid.
+    """
+
+    def __init__(self, root: str = SEARCH_DIR, dim: int = SEARCH_VECTOR_DIM):
+        self.dim = dim
+        self.path = os.path.join(root, f"vectors-{dim}.f16")
+        self.row_bytes = dim * 2
+        self._map: Optional[np.memmap] = None
+
+    def rows(self) -> int:
+        try:
+            return os.path.getsize(self.path) // self.row_bytes
+        except FileNotFoundError:
+            return 0
+
+    def write(self, ids: List[int], vectors: np.ndarray):
+        """Store vectors at their ids' rows, one write per run of consecutive ids"""
+        if not ids:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        data = vectors.astype(np.float16)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            start = 0
+            for i in range(1, len(ids) + 1):
+                if i == len(ids) or ids[i] != ids[i - 1] + 1:
+                    os.pwrite(fd, data[start:i].tobytes(), ids[start] * self.row_bytes)
+                    start = i
+        finally:
+            os.close(fd)
+
+    def erase(self, ids: List[int]):
+        """Zero the rows of removed chunks so they never match"""
+        self.write(sorted(ids), np.zeros((len(ids), self.dim), dtype=np.float16))
+
+    def clear(self):
+        if os.path.exists(self.path):
+            # Replace rather than truncate: readers may still have the old file mapped
+            tmp_path = f"{self.path}.tmp"
+            open(tmp_path, "wb").close()
+            os.replace(tmp_path, self.path)
+        self._map = None
+
+    def matrix(self) -> Optional[np.memmap]:
+        rows = self.rows()
+        if rows == 0:
+            return None
+        if self._map is None or self._map.shape[0] != rows:
+            self._map = np.memmap(self.path, dtype=np.float16, mode="r", shape=(rows, self.dim))
+        return self._map
+
+    def similarities(self, query: np.ndarray, ids: Optional[np.ndarray] = None) -> np.ndarray:
+        """Cosine similarity of the query to every row, or to the rows in `ids` (0 where missing)"""
+        matrix = self.matrix()
+        if ids is not None:
+            scores = np.zeros(len(ids), dtype=np.float32)
+            if matrix is not None:
+                present = ids < matrix.shape[0]
+                scores[present] = matrix[ids[present]].astype(np.float32) @ query
+            return scores
+        if matrix is None:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate([
+            matrix[start:start + _SCORE_BLOCK_ROWS].astype(np.float32) @ query
+            for start in range(0, matrix.shape[0], _SCORE_BLOCK_ROWS)
+        ])
+
+
+vector_file = VectorFile()
+
+
+def remove_document(db, document_id: int):
+    """Drop a document's chunks and postings from the index (caller commits)"""
+    chunk_ids = db.scalars(select(SearchChunk.id).where(SearchChunk.document_id == document_id)).all()
+    if not chunk_ids:
+        return []
+    db.execute(delete(SearchPosting).where(SearchPosting.document_id == document_id))
+    db.execute(delete(SearchChunk).where(SearchChunk.document_id == document_id))
+    return list(chunk_ids)
+
+
+def index_document(db, document: Document) -> bool:
+    """Index a document's extracted text, replacing only this document's entries
+
+    Returns False when the index already holds this exact text.
+    """
+    text = document.original_content or ""
+    indexed_hash = db.scalar(
+        select(SearchChunk.content_hash).where(SearchChunk.document_id == document.id).limit(1)
+    )
+    if indexed_hash is not None and indexed_hash == document.original_content_hash:
+        return False
+
+    removed = remove_document(db, document.id)
+    chunks = [
+        SearchChunk(
+            document_id=document.id,
+            content_hash=document.original_content_hash,
+            ordinal=chunk.index,
+            first_page=chunk.first_page,
+            last_page=chunk.last_page,
+            text=chunk.text,
+            length=len(tokenize(chunk.text)),
+        )
+        for chunk in chunk_text(text, SEARCH_CHUNK_TOKENS)
+        if chunk.text.strip()
+    ]
+    db.add_all(chunks)
+    db.flush()
+
+    postings = [
+        {"term": term, "chunk_id": chunk.id, "document_id": document.id, "tf": tf, "chunk_length": chunk.length}
+        for chunk in chunks
+        for term, tf in Counter(tokenize(chunk.text)).items()
+    ]
+    if postings:
+        db.execute(insert(SearchPosting), postings)
+    db.commit()
+
+    # Rows of removed chunks first: the new chunks may have reused their ids
+    if removed:
+        vector_file.erase([chunk_id for chunk_id in removed if chunk_id not in {chunk.id for chunk in chunks}])
+    if SEARCH_VECTORS and chunks:
+        vector_file.write([chunk.id for chunk in chunks], np.stack([embed(chunk.text) for chunk in chunks]))
+    return True
+
+
+def clear_index(db):
+    """Empty the whole index (caller commits)"""
+    db.query(SearchPosting).delete()
+    db.query(SearchChunk).delete()
+    vector_file.clear()
+
+
+def _bm25(db, terms: List[str], document_id: Optional[int]) -> Dict[int, float]:
+    """BM25 scores of every chunk containing a query term, computed over arrays of postings"""
+    chunk_count, average_length = db.execute(select(func.count(SearchChunk.id), func.avg(SearchChunk.length))).one()
+    if not chunk_count:
+        return {}
+    doc_freqs = dict(db.execute(
+        select(SearchPosting.term, func.count()).where(SearchPosting.term.in_(terms)).group_by(SearchPosting.term)
+    ).all())
+    query = select(SearchPosting.term, SearchPosting.chunk_id, SearchPosting.tf, SearchPosting.chunk_length).where(
+        SearchPosting.term.in_(terms)
+    )
+    if document_id is not None:
+        query = query.where(SearchPosting.document_id == document_id)
+    rows = db.execute(query).all()
+    if not rows:
+        return {}
+
+    term_index = {term: i for i, term in enumerate(terms)}
+    idf = np.array([
+        math.log(1 + (chunk_count - doc_freqs.get(term, 0) + 0.5) / (doc_freqs.get(term, 0) + 0.5)) for term in terms
+    ])
+    term_ids = np.fromiter((term_index[row.term] for row in rows), dtype=np.int64, count=len(rows))
+    chunk_ids = np.fromiter((row.chunk_id for row in rows), dtype=np.int64, count=len(rows))
+    tf = np.fromiter((row.tf for row in rows), dtype=np.float64, count=len(rows))
+    lengths = np.fromiter((row.chunk_length or 0 for row in rows), dtype=np.float64, count=len(rows))
+
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / (float(average_length) or 1.0))
+    contributions = idf[term_ids] * tf * (BM25_K1 + 1) / (tf + norm)
+    unique_ids, position = np.unique(chunk_ids, return_inverse=True)
+    scores = np.zeros(len(unique_ids))
+    np.add.at(scores, position, contributions)
+    return dict(zip(unique_ids.tolist(), scores.tolist()))
+
+
+def highlight(text: str, terms: Iterable[str], width: int = SNIPPET_CHARS) -> str:
+    """The window of `text` with the most query terms, HTML-escaped, matches wrapped in <mark>"""
+    terms = set(terms)
+    matches = [m for m in _WORD_RE.finditer(text) if m.group().lower() in terms]
+    if matches:
+        # Start the window at the match that covers the most distinct terms
+        best = max(
+            range(len(matches)),
+            key=lambda i: len({m.group().lower() for m in matches[i:] if m.start() < matches[i].start() + width}),
+        )
+        start = max(0, matches[best].start() - width // 4)
+    else:
+        start = 0
+    end = min(len(text), start + width)
+    # Do not cut words in half at either edge
+    if start > 0:
+        space = text.find(" ", start)
+        start = space + 1 if 0 <= space < start + 20 else start
+    if end < len(text):
+        space = text.rfind(" ", start, end)
+        end = space if space > start else end
+
+    parts, position = [], start
+    for m in matches:
+        if m.start() >= start and m.end() <= end:
+            parts.append(html.escape(text[position:m.start()]))
+            parts.append(f"<mark>{html.escape(m.group())}</mark>")
+            position = m.end()
+    parts.append(html.escape(text[position:end]))
+    snippet = " ".join("".join(parts).split())
+    return ("… " if start > 0 else "") + snippet + (" …" if end < len(text) else "")
+
+
+def search(db, query: str, limit: int = 10, document_id: Optional[int] = None) -> Dict[str, Any]:
+    """Rank chunks by BM25 blended with embedding similarity and return the top `limit`"""
+    started = time.perf_counter()
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return {"query": query, "results": [], "took_ms": 0.0}
+
+    keyword = _bm25(db, terms, document_id)
+    candidates = np.array(sorted(keyword), dtype=np.int64)
+    keyword_scores = np.array([keyword[chunk_id] for chunk_id in candidates.tolist()], dtype=np.float32)
+    vector_scores = np.zeros(len(candidates), dtype=np.float32)
+
+    if SEARCH_VECTORS:
+        query_vector = embed(query)
+        vector_scores = vector_file.similarities(query_vector, candidates)
+        # Chunks similar to the query that share none of its terms
+        if document_id is None:
+            pool = None
+            similarities = vector_file.similarities(query_vector)
+        else:
+            pool = np.array(
+                db.scalars(select(SearchChunk.id).where(SearchChunk.document_id == document_id)).all(), dtype=np.int64
+            )
+            similarities = vector_file.similarities(query_vector, pool)
+        take = min(len(similarities), limit * 4)
+        if take:
+            nearest = np.argpartition(-similarities, take - 1)[:take]
+            nearest = nearest[similarities[nearest] >= SEARCH_MIN_SIMILARITY]
+            ids = nearest if pool is None else pool[nearest]
+            extra = ~np.isin(ids, candidates)
+            candidates = np.concatenate([candidates, ids[extra]])
+            keyword_scores = np.concatenate([keyword_scores, np.zeros(int(extra.sum()), dtype=np.float32)])
+            vector_scores = np.concatenate([vector_scores, similarities[nearest[extra]]])
+
+    if not len(candidates):
+        return {"query": query, "results": [], "took_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+    top_keyword = keyword_scores.max() or 1.0
+    weight = SEARCH_VECTOR_WEIGHT if SEARCH_VECTORS else 0.0
+    scores = (1 - weight) * keyword_scores / top_keyword + weight * np.clip(vector_scores, 0, None)
+    take = min(limit, len(scores))
+    top = np.argpartition(-scores, take - 1)[:take]
+    top = top[np.argsort(-scores[top])]
+
+    chunk_ids = candidates[top].tolist()
+    rows = {
+        row.SearchChunk.id: row
+        for row in db.execute(
+            select(SearchChunk, Document.filename)
+            .join(Document, Document.id == SearchChunk.document_id)
+            .where(SearchChunk.id.in_(chunk_ids))
+        ).all()
+    }
+    results = []
+    for i, chunk_id in zip(top.tolist(), chunk_ids):
+        row = rows.get(chunk_id)
+        if row is None:
+            # Removed between scoring and loading
+            continue
+        chunk = row.SearchChunk
+        results.append({
+            "document_id": chunk.document_id,
+            "filename": row.filename,
+            "chunk_id": chunk.id,
+            "pages": [chunk.first_page, chunk.last_page],
+            "score": round(float(scores[i]), 4),
+            "keyword_score": round(float(keyword_scores[i]), 4),
+            "vector_score": round(float(vector_scores[i]), 4),
+            "snippet": highlight(chunk.text, terms),
+        })
+    return {"query": query, "results": results, "took_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+
+def reindex(only_missing: bool = True) -> int:
+    """Index every parsed document, skipping ones whose text is already indexed"""
+    db = SessionLocal()
+    try:
+        ids = db.scalars(
+            select(Document.id).where(Document.processing_status == "completed", Document.original_content_hash.isnot(None))
+        ).all()
+        count = 0
+        for document_id in ids:
+            document = db.get(Document, document_id)
+            if not only_missing:
+                remove_document(db, document_id)
+            count += index_document(db, document)
+        return count
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    # Backfill documents parsed before the search index existed
+    import sys
+    from migrations import run_migrations
+
+    run_migrations()
+    print(f"Indexed {reindex(only_missing='--all' not in sys.argv)} documents")
@@ -0,0 +1,61 @@
+import os
+import uuid
+import asyncio
+import hashlib
+from typing import Tuple
+
+import aiofiles
+from fastapi import UploadFile
+
+UPLOAD_DIR = os.getenv("PAGEMONK_UPLOAD_DIR", "uploads")
+CHUNK_SIZE = 1024 * 1024
+
+
+class BlobStore:
+    """Content-addressed file store: blobs live at <root>/<ab>/<cd>/<sha256><ext>"""
+
+    def __init__(self, root: str = UPLOAD_DIR):
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+
+    def path_for(self, digest: str, extension: str = "") -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}{extension.lower()}")
+
+    async def save_upload(self, upload: UploadFile) -> Tuple[str, int, str, bool]:
+        """Stream an upload to disk while hashing it
+
+        Returns (sha256, size, path, is_duplicate). When a blob with the same
+        content already exists, the new copy is discarded.
+        """
+        extension = os.path.splitext(upload.filename or "")[1]
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            async with aiofiles.open(tmp_path, "wb") as out:
+                while True:
+                    chunk = await upload.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    # hashlib releases the GIL for large buffers, so a thread keeps the loop free
+                    await asyncio.to_thread(hasher.update, chunk)
+                    await out.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        digest = hasher.hexdigest()
+        path = self.path_for(digest, extension)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            return digest, size, path, True
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        return digest, size, path, False
+
+
+blob_store = BlobStore()
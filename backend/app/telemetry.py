@@ -0,0 +1,215 @@
+import os
+import sys
+import json
+import time
+import uuid
+import logging
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+# Workers and the API are separate processes; metrics are shared through files
+# in this directory. It must be set before prometheus_client is imported.
+METRICS_DIR = os.path.abspath(os.getenv("PAGEMONK_METRICS_DIR", "cache/metrics"))
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", METRICS_DIR)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+from prometheus_client import Counter, Gauge, Histogram  # noqa: E402
+
+LOG_LEVEL = os.getenv("PAGEMONK_LOG_LEVEL", "INFO")
+# Log a span for every stage, not only for requests that ask for a trace
+TRACE_ALL = os.getenv("PAGEMONK_TRACE_ALL", "").lower() in ("1", "true", "yes")
+
+_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+STAGE_SECONDS = Histogram(
+    "pagemonk_stage_seconds", "Time spent in each pipeline stage", ["stage"], buckets=_DURATION_BUCKETS
+)
+STAGE_IN_FLIGHT = Gauge(
+    "pagemonk_stage_in_flight", "Operations currently running per stage", ["stage"], multiprocess_mode="livesum"
+)
+STAGE_ERRORS = Counter("pagemonk_stage_errors_total", "Stage operations that raised", ["stage"])
+HTTP_SECONDS = Histogram(
+    "pagemonk_http_request_seconds", "API request latency", ["method", "route", "status"], buckets=_DURATION_BUCKETS
+)
+LLM_TOKENS = Counter("pagemonk_llm_tokens_total", "Tokens processed by Ollama", ["model", "kind"])
+LLM_TOKENS_PER_SECOND = Histogram(
+    "pagemonk_llm_tokens_per_second", "Generation speed per LLM call", ["model"],
+    buckets=(1, 2, 5, 10, 20, 35, 50, 75, 100, 150, 200, 300, 500),
+)
+CACHE_LOOKUPS = Counter("pagemonk_cache_lookups_total", "Cache lookups by result", ["cache", "result"])
+JOBS = Counter("pagemonk_jobs_total", "Parse job attempts by outcome", ["outcome"])
+LLM_ROUTED = Counter(
+    "pagemonk_llm_routed_total", "LLM calls per host; cold means the model was not known to be loaded there",
+    ["host", "model", "placement"],
+)
+LLM_COALESCED = Counter("pagemonk_llm_coalesced_total", "LLM calls served by an identical call in flight", ["model"])
+LLM_HOST_IN_FLIGHT = Gauge("pagemonk_llm_host_in_flight", "LLM calls running per host", ["host"], multiprocess_mode="livesum")
+LLM_HOST_ERRORS = Counter("pagemonk_llm_host_errors_total", "Connection failures per Ollama host", ["host"])
+ADMISSION_REJECTED = Counter(
+    "pagemonk_admission_rejected_total", "Ingestion requests turned away", ["stage", "reason"]
+)
+ADMISSION_WAITING = Gauge(
+    "pagemonk_admission_waiting", "Requests waiting for a stage slot", ["stage"], multiprocess_mode="livesum"
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "pagemonk_admission_wait_seconds", "Time queued requests waited for a stage slot", ["stage", "priority"],
+    buckets=_DURATION_BUCKETS,
+)
+
+# Per-request trace context; copied into tasks started while handling the request
+_trace_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_id", default=None)
+_tracing: contextvars.ContextVar[bool] = contextvars.ContextVar("tracing", default=False)
+_span_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("span_id", default=None)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, message and any structured fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "pid": record.process,
+        }
+        trace_id = _trace_id.get()
+        if trace_id:
+            entry["trace_id"] = trace_id
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+logger = logging.getLogger("pagemonk")
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stderr)
+    _handler.setFormatter(JsonFormatter())
+    logger.addHandler(_handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+
+
+def log(level: int, msg: str, **fields):
+    logger.log(level, msg, extra={"fields": fields})
+
+
+def log_error(msg: str, **fields):
+    log(logging.ERROR, msg, **fields)
+
+
+def start_trace(trace_id: Optional[str] = None, enabled: bool = False) -> str:
+    """Begin a trace for the current request or job; spans are logged if enabled"""
+    trace_id = trace_id or uuid.uuid4().hex[:16]
+    _trace_id.set(trace_id)
+    _tracing.set(enabled or TRACE_ALL)
+    _span_id.set(None)
+    return trace_id
+
+
+@contextmanager
+def stage(name: str, **fields) -> Iterator[Dict[str, Any]]:
+    """Time a pipeline stage: histogram, in-flight gauge and, when tracing, a span log
+
+    Yields a dict the caller can add span fields to (e.g. page counts).
+    """
+    span = dict(fields)
+    span_id = uuid.uuid4().hex[:8]
+    parent_id = _span_id.get()
+    token = _span_id.set(span_id)
+    in_flight = STAGE_IN_FLIGHT.labels(name)
+    in_flight.inc()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield span
+    except BaseException as e:
+        error = e
+        STAGE_ERRORS.labels(name).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        in_flight.dec()
+        STAGE_SECONDS.labels(name).observe(elapsed)
+        _span_id.reset(token)
+        if _tracing.get():
+            log(
+                logging.INFO, "span",
+                span=name, span_id=span_id, parent_id=parent_id,
+                duration_ms=round(elapsed * 1000, 2), error=repr(error) if error else None, **span,
+            )
+
+
+def record_stage(name: str, seconds: float):
+    """Record a duration measured elsewhere, e.g. time a job spent queued"""
+    STAGE_SECONDS.labels(name).observe(max(seconds, 0.0))
+
+
+def record_llm_call(model: str, response: Any, elapsed: float):
+    """Count prompt and completion tokens and generation speed from an Ollama response"""
+    prompt_tokens = response.get("prompt_eval_count") or 0
+    completion_tokens = response.get("eval_count") or 0
+    eval_seconds = (response.get("eval_duration") or 0) / 1e9
+    LLM_TOKENS.labels(model, "prompt").inc(prompt_tokens)
+    LLM_TOKENS.labels(model, "completion").inc(completion_tokens)
+    tokens_per_second = completion_tokens / eval_seconds if eval_seconds > 0 else None
+    if tokens_per_second:
+        LLM_TOKENS_PER_SECOND.labels(model).observe(tokens_per_second)
+    log(
+        logging.INFO, "llm_call",
+        model=model, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+        tokens_per_second=round(tokens_per_second, 1) if tokens_per_second else None,
+        duration_ms=round(elapsed * 1000, 1),
+    )
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def mark_process_dead(pid: int):
+    """Drop a finished process's live gauges so in-flight counts stay accurate"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(pid)
+
+
+def reset_metrics_dir():
+    """Delete the metric files of earlier runs; call before any worker process starts
+
+    Counters and histograms of exited processes are otherwise summed into
+    /metrics forever, so totals would carry over across restarts.
+    """
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    own = f"_{os.getpid()}.db"
+    for name in os.listdir(directory):
+        if name.endswith(".db") and not name.endswith(own):
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                continue
+
+
+def clear_dead_processes():
+    """Remove live gauge files left behind by processes that no longer exist"""
+    for name in os.listdir(os.environ["PROMETHEUS_MULTIPROC_DIR"]):
+        if not name.startswith("gauge_live"):
+            continue
+        try:
+            pid = int(name.rsplit("_", 1)[1].split(".")[0])
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            mark_process_dead(pid)
+        except (ValueError, IndexError, PermissionError):
+            continue
+
+
+def render_metrics(extra_collectors=()) -> bytes:
+    """Prometheus exposition of the metrics of every PageMonk process"""
+    from prometheus_client import CollectorRegistry, generate_latest, multiprocess
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    for collector in extra_collectors:
+        registry.register(collector)
+    return generate_latest(registry)
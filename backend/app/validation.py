@@ -0,0 +1,202 @@
+import re
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from rules import AMOUNT_RE
+
+# Schema values that name a type; anything else is a free-text field description
+_TYPES = {
+    "string": "string", "date": "string",
+    "number": "number", "float": "number",
+    "integer": "integer", "int": "integer",
+    "boolean": "boolean", "bool": "boolean",
+    "array": "array", "object": "object",
+}
+_TRUE = {"true", "yes", "y", "1"}
+_FALSE = {"false", "no", "n", "0"}
+# Placeholders small models write instead of null
+_NULLS = {"", "null", "none", "n/a", "na", "unknown", "not found", "not available", "-"}
+
+
+class InvalidValue(ValueError):
+    """A value that cannot be coerced to its schema type"""
+
+
+def to_json_schema(schema: Any) -> Dict[str, Any]:
+    """Translate a PageMonk schema_definition into JSON Schema for constrained generation
+
+    Every field is required but nullable, so the model always emits every key
+    and uses null for what it cannot find.
+    """
+    if isinstance(schema, dict):
+        return {
+            "type": "object",
+            "properties": {field: to_json_schema(value) for field, value in schema.items()},
+            "required": list(schema),
+        }
+    if isinstance(schema, list):
+        items = to_json_schema(schema[0]) if schema else {}
+        return {"type": ["array", "null"], "items": items}
+    if isinstance(schema, str) and schema.lower() in _TYPES:
+        json_type = _TYPES[schema.lower()]
+        return {"type": [json_type, "null"]}
+    # A description instead of a type name
+    return {"type": ["string", "null"], "description": str(schema)}
+
+
+def as_number(value: Any) -> Optional[float]:
+    """Numeric form of an extracted value: numbers and amounts like "$1,250.00" """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str) and AMOUNT_RE.fullmatch(value.strip()):
+        try:
+            return float(re.sub(r"[^\d.-]", "", value))
+        except ValueError:
+            return None
+    return None
+
+
+def coerce(schema: Any, value: Any) -> Any:
+    """Coerce an extracted value to its schema type, raising InvalidValue if it cannot be"""
+    if value is None or (isinstance(value, str) and value.strip().lower() in _NULLS):
+        return None
+
+    if isinstance(schema, dict):
+        if not isinstance(value, dict):
+            raise InvalidValue(f"expected an object, got {value!r}")
+        return {field: coerce(field_schema, value.get(field)) for field, field_schema in schema.items()}
+
+    if isinstance(schema, list):
+        # A single item where a list was asked for is still a list of one
+        items = value if isinstance(value, list) else [value]
+        item_schema = schema[0] if schema else "string"
+        return [coerce(item_schema, item) for item in items if item is not None]
+
+    json_type = _TYPES.get(schema.lower()) if isinstance(schema, str) else None
+    if json_type not in ("array", "object") and isinstance(value, list) and len(value) == 1:
+        # ["USD"] where a single value was asked for
+        value = value[0]
+        if value is None:
+            return None
+    if json_type in ("number", "integer"):
+        number = as_number(value)
+        if number is None:
+            raise InvalidValue(f"expected a number, got {value!r}")
+        if json_type == "integer":
+            if not number.is_integer():
+                raise InvalidValue(f"expected an integer, got {value!r}")
+            return int(number)
+        return number
+    if json_type == "boolean":
+        if isinstance(value, bool):
+            return value
+        text = str(value).strip().lower()
+        if text in _TRUE or text in _FALSE:
+            return text in _TRUE
+        raise InvalidValue(f"expected a boolean, got {value!r}")
+    if json_type in ("array", "object"):
+        if not isinstance(value, list if json_type == "array" else dict):
+            raise InvalidValue(f"expected an {json_type}, got {value!r}")
+        return value
+
+    # Strings, dates and described fields
+    if isinstance(value, (dict, list)):
+        raise InvalidValue(f"expected a string, got {value!r}")
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def repair_json(text: str) -> Any:
+    """Parse the JSON object in an LLM answer, repairing common damage
+
+    Handles think-tags, code fences and prose around the object, trailing
+    commas, and answers truncated mid-value by closing open strings and
+    brackets (dropping the incomplete last member if needed).
+    """
+    text = re.sub(r"<think>.*?(</think>|$)", "", text, flags=re.DOTALL)
+    start = text.find("{")
+    if start == -1:
+        raise ValueError("No JSON object in response")
+
+    out: List[str] = []
+    stack: List[str] = []
+    # Last comma outside strings and the brackets open at that point
+    last_comma: Optional[Tuple[int, List[str]]] = None
+    in_string = escaped = False
+    for ch in text[start:]:
+        if in_string:
+            out.append(ch)
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            # Drop a trailing comma before the closing bracket
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            if not stack or stack[-1] != ch:
+                break
+            stack.pop()
+            out.append(ch)
+            if not stack:
+                break
+            continue
+        elif ch == ",":
+            last_comma = (len(out), list(stack))
+        out.append(ch)
+
+    candidates = []
+    if not stack:
+        candidates.append("".join(out))
+    else:
+        # Truncated: close what is open, or cut back to the last complete member
+        tail = "".join(out) + ('"' if in_string else "")
+        tail = tail.rstrip().rstrip(",")
+        if tail.endswith(":"):
+            tail += " null"
+        candidates.append(tail + "".join(reversed(stack)))
+        if last_comma:
+            position, open_brackets = last_comma
+            candidates.append("".join(out[:position]) + "".join(reversed(open_brackets)))
+
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            continue
+    raise ValueError("Could not repair JSON in response")
+
+
+def validate_fields(schema: Dict[str, Any], answer: str) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """Repair and coerce an extraction answer against a schema
+
+    Returns (values, invalid): coerced values for every schema field (missing
+    fields are None) and an error message for each top-level field whose
+    value could not be coerced. If the answer cannot be parsed at all every
+    field is invalid.
+    """
+    try:
+        parsed = repair_json(answer)
+    except ValueError as e:
+        return {field: None for field in schema}, {field: str(e) for field in schema}
+    if not isinstance(parsed, dict):
+        return {field: None for field in schema}, {field: "answer is not a JSON object" for field in schema}
+
+    values, invalid = {}, {}
+    for field, field_schema in schema.items():
+        try:
+            values[field] = coerce(field_schema, parsed.get(field))
+        except InvalidValue as e:
+            values[field] = None
+            invalid[field] = str(e)
+    return values, invalid
@@ -0,0 +1,276 @@
+import os
+import difflib
+from collections import Counter
+from itertools import groupby
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import func, insert, select
+
+from database import Document, DocumentPage, blob_hash
+from chunking import join_pages, split_pages
+
+# Share of pages an upload must have in common with an earlier document to become its next version
+VERSION_MIN_SIMILARITY = float(os.getenv("PAGEMONK_VERSION_MIN_SIMILARITY", "0.5"))
+
+
+class Page(NamedTuple):
+    number: int
+    fingerprint: str  # hash of the page in the source file, "" when unknown
+    text: str
+
+
+class StoredPage(NamedTuple):
+    number: int
+    fingerprint: str
+    text_hash: str
+    text: str
+    segment_first_page: int
+    markdown: str  # markdown of the whole segment the page belongs to
+
+
+class Segment(NamedTuple):
+    """Consecutive pages structured by the LLM together"""
+    first_page: int
+    last_page: int
+    text: str
+    markdown: Optional[str]  # already structured in an earlier version, or None
+
+
+def text_hash(text: str) -> str:
+    return blob_hash(text.strip())
+
+
+def pages_from_text(content: str) -> List[Page]:
+    """Pages of text extracted before page fingerprints were stored"""
+    return [Page(number, "", text) for number, text in enumerate(split_pages(content or ""), 1)]
+
+
+def previous_upload(db, document: Document) -> Optional[Document]:
+    """The latest earlier document with the same filename, a likely previous version
+
+    Generic names ("scan.pdf") are common, so the name alone does not link
+    them; link_similar checks the pages once they are extracted. A
+    byte-identical file is not a new version; its parse reuses the earlier one anyway.
+    """
+    previous = (
+        db.query(Document)
+        .filter(Document.filename == document.filename, Document.id < document.id)
+        .order_by(Document.id.desc())
+        .first()
+    )
+    if not previous or previous.content_hash == document.content_hash:
+        return None
+    return previous
+
+
+def link_similar(db, document: Document, pages: List[Page], candidate: Optional[Document] = None) -> Optional[Document]:
+    """Link a document to an earlier one sharing enough of its page texts
+
+    A candidate (the previous upload with the same filename) is preferred
+    when it is similar enough; otherwise the earlier document sharing the
+    most pages is linked, if it is similar enough.
+    """
+    hashes = {text_hash(page.text) for page in pages if page.text.strip()}
+    if not hashes:
+        return None
+    if candidate is not None and _similarity(db, hashes, candidate.id) >= VERSION_MIN_SIMILARITY:
+        _link(document, candidate)
+        return candidate
+
+    best = db.execute(
+        select(DocumentPage.document_id, func.count())
+        .where(DocumentPage.text_hash.in_(hashes), DocumentPage.document_id < document.id)
+        .group_by(DocumentPage.document_id)
+        .order_by(func.count().desc())
+        .limit(1)
+    ).first()
+    if not best:
+        return None
+    if _similarity(db, hashes, best[0], best[1]) < VERSION_MIN_SIMILARITY:
+        return None
+    previous = db.get(Document, best[0])
+    _link(document, previous)
+    return previous
+
+
+def _similarity(db, hashes: set, candidate_id: int, shared: Optional[int] = None) -> float:
+    """Share of pages two documents have in common, relative to the longer one"""
+    if shared is None:
+        shared = db.scalar(
+            select(func.count())
+            .select_from(DocumentPage)
+            .where(DocumentPage.document_id == candidate_id, DocumentPage.text_hash.in_(hashes))
+        )
+    candidate_pages = db.scalar(
+        select(func.count())
+        .select_from(DocumentPage)
+        .where(DocumentPage.document_id == candidate_id, DocumentPage.text_end > DocumentPage.text_start)
+    )
+    return shared / max(len(hashes), candidate_pages or 0)
+
+
+def _link(document: Document, previous: Document):
+    document.previous_version_id = previous.id
+    document.version = (previous.version or 1) + 1
+
+
+def previous_version(db, document: Document) -> Optional[Document]:
+    return db.get(Document, document.previous_version_id) if document.previous_version_id else None
+
+
+def version_chain(db, document: Document) -> List[Document]:
+    """Every version of a document: its ancestors, itself and all later revisions"""
+    chain = {document.id: document}
+    current = document
+    while current.previous_version_id and current.previous_version_id not in chain:
+        current = db.get(Document, current.previous_version_id)
+        if current is None:
+            break
+        chain[current.id] = current
+
+    frontier = [document.id]
+    while frontier:
+        later = db.query(Document).filter(Document.previous_version_id.in_(frontier)).all()
+        frontier = [revision.id for revision in later if revision.id not in chain]
+        chain.update((revision.id, revision) for revision in later)
+    return sorted(chain.values(), key=lambda revision: (revision.version or 1, revision.id))
+
+
+def load_pages(db, document: Document) -> List[StoredPage]:
+    """A parsed document's pages, with their text and segment markdown"""
+    rows = (
+        db.query(DocumentPage)
+        .filter(DocumentPage.document_id == document.id)
+        .order_by(DocumentPage.page_number)
+        .all()
+    )
+    if not rows:
+        return []
+    text = document.original_content or ""
+    markdown = document.markdown_content or ""
+    return [
+        StoredPage(
+            row.page_number, row.fingerprint or "", row.text_hash, text[row.text_start:row.text_end],
+            row.segment_first_page, markdown[row.markdown_start:row.markdown_end],
+        )
+        for row in rows
+    ]
+
+
+def plan_segments(pages: List[Page], previous: List[StoredPage], max_tokens: int) -> List[Segment]:
+    """Group pages into structuring segments, reusing the previous version's unchanged ones
+
+    A previous segment is reused when all of its pages appear, in order and
+    next to each other, in the new version. The pages in between are grouped
+    into new segments of whole pages within the token budget.
+    """
+    hashes = [text_hash(page.text) for page in pages]
+    reused: Dict[int, tuple] = {}  # first page index -> (last page index, markdown)
+    if previous:
+        mapping = {}
+        matcher = difflib.SequenceMatcher(None, [page.text_hash for page in previous], hashes, autojunk=False)
+        for block in matcher.get_matching_blocks():
+            mapping.update((block.a + k, block.b + k) for k in range(block.size))
+        for _, group in groupby(range(len(previous)), key=lambda i: previous[i].segment_first_page):
+            indexes = list(group)
+            if all(i in mapping for i in indexes) and mapping[indexes[-1]] - mapping[indexes[0]] == len(indexes) - 1:
+                reused[mapping[indexes[0]]] = (mapping[indexes[-1]], previous[indexes[0]].markdown)
+
+    segments: List[Segment] = []
+    run: List[int] = []
+
+    def segment(first: int, last: int, markdown: Optional[str] = None) -> Segment:
+        text, _ = join_pages([page.text for page in pages[first:last + 1]])
+        return Segment(pages[first].number, pages[last].number, text, markdown)
+
+    def flush_run():
+        start, tokens = None, 0
+        for i in run:
+            size = len(pages[i].text.strip()) // 4
+            if start is not None and tokens + size > max_tokens:
+                segments.append(segment(start, i - 1))
+                start, tokens = None, 0
+            if start is None:
+                start = i
+            tokens += size
+        if start is not None:
+            segments.append(segment(start, run[-1]))
+        run.clear()
+
+    i = 0
+    while i < len(pages):
+        if i in reused:
+            flush_run()
+            last, markdown = reused[i]
+            segments.append(segment(i, last, markdown))
+            i = last + 1
+        else:
+            run.append(i)
+            i += 1
+    flush_run()
+    return segments
+
+
+def save_pages(db, document: Document, pages: List[Page], segments: List[Segment], markdown_offsets: List[tuple]):
+    """Store a parse's page fingerprints and offsets, replacing earlier ones (caller commits)"""
+    db.query(DocumentPage).filter(DocumentPage.document_id == document.id).delete(synchronize_session=False)
+    _, text_offsets = join_pages([page.text for page in pages])
+    rows = []
+    index = 0
+    for page, (text_start, text_end) in zip(pages, text_offsets):
+        while index < len(segments) - 1 and page.number > segments[index].last_page:
+            index += 1
+        markdown_start, markdown_end = markdown_offsets[index] if segments else (0, 0)
+        rows.append({
+            "document_id": document.id,
+            "page_number": page.number,
+            "fingerprint": page.fingerprint,
+            "text_hash": text_hash(page.text),
+            "text_start": text_start,
+            "text_end": text_end,
+            "segment_first_page": segments[index].first_page if segments else page.number,
+            "markdown_start": markdown_start,
+            "markdown_end": markdown_end,
+        })
+    if rows:
+        db.execute(insert(DocumentPage), rows)
+
+
+def diff_versions(db, document: Document, previous: Document) -> Dict[str, Any]:
+    """Which pages were added, removed or changed between two parsed documents, with text diffs"""
+    new_pages = load_pages(db, document)
+    old_pages = load_pages(db, previous)
+    for revision, revision_pages in ((document, new_pages), (previous, old_pages)):
+        if not revision_pages:
+            raise ValueError(f"Document {revision.id} has no page fingerprints; parse it again")
+
+    matcher = difflib.SequenceMatcher(
+        None, [page.text_hash for page in old_pages], [page.text_hash for page in new_pages], autojunk=False
+    )
+    summary = Counter(unchanged=0, changed=0, added=0, removed=0)
+    changes = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            summary["unchanged"] += j2 - j1
+            continue
+        status = {"replace": "changed", "insert": "added", "delete": "removed"}[tag]
+        summary[status] += max(i2 - i1, j2 - j1)
+        old_range = [old_pages[i1].number, old_pages[i2 - 1].number] if i2 > i1 else None
+        new_range = [new_pages[j1].number, new_pages[j2 - 1].number] if j2 > j1 else None
+        diff = difflib.unified_diff(
+            "\n".join(page.text for page in old_pages[i1:i2]).splitlines(),
+            "\n".join(page.text for page in new_pages[j1:j2]).splitlines(),
+            fromfile=f"{previous.id}:pages {old_range}" if old_range else f"{previous.id}",
+            tofile=f"{document.id}:pages {new_range}" if new_range else f"{document.id}",
+            lineterm="",
+        )
+        changes.append({"status": status, "pages": new_range, "previous_pages": old_range, "diff": "\n".join(diff)})
+
+    return {
+        "document_id": document.id,
+        "version": document.version,
+        "previous_id": previous.id,
+        "previous_version": previous.version,
+        "summary": dict(summary),
+        "changes": changes,
+    }
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+
+"""
+Generate a deterministic benchmark corpus: text PDFs, scanned PDFs and images.
+
+The same --seed always produces the same files, so reports from different
+runs are comparable. Sizes:
+
+    text PDFs     1, 10 and 50 pages of financial-report prose and tables
+    scanned PDFs  1 and 5 image-only pages (rasterized at 150 DPI)
+    images        a small receipt and a full A4 page photo
+
+With --copies N every file is generated N times with different content, so
+parsing the copies does not just hit the OCR and LLM caches. A manifest.json
+lists every file with its kind, page count and size.
+
+Usage:
+    python corpus.py --out corpus --seed 7 --copies 3
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import time
+
+from PIL import Image, ImageDraw, ImageFont
+
+# (kind, name, pages)
+LAYOUT = [
+    ("text_pdf", "text_1p.pdf", 1),
+    ("text_pdf", "text_10p.pdf", 10),
+    ("text_pdf", "text_50p.pdf", 50),
+    ("scanned_pdf", "scanned_1p.pdf", 1),
+    ("scanned_pdf", "scanned_5p.pdf", 5),
+    ("image", "receipt.png", 1),
+    ("image", "page_photo.jpg", 1),
+]
+KINDS = sorted({kind for kind, _, _ in LAYOUT})
+
+WORDS = (
+    "revenue operating income quarter fiscal growth margin segment customers cash flow "
+    "assets liabilities equity guidance outlook expenses capital investment dividend "
+    "subsidiary region market share compliance audit board strategy risk inventory"
+).split()
+ROWS = ["Cash and equivalents", "Accounts receivable", "Inventory", "Property and equipment",
+        "Accounts payable", "Long-term debt", "Shareholders' equity", "Total assets"]
+
+
+def page_lines(rng, page_number, count=46):
+    """Lines of one report page: a heading, prose and a small balance table"""
+    lines = [f"Annual Report - Section {page_number}", ""]
+    while len(lines) < count - len(ROWS) - 2:
+        lines.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 13))).capitalize() + ".")
+    lines.append("")
+    lines.append("Balance sheet (USD thousands)")
+    lines.extend(f"{row:<28}{rng.randint(1_000, 900_000):>12,}" for row in ROWS)
+    return lines
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_text_pdf(path, pages):
+    """Write a PDF with a real text layer (Helvetica, one content stream per page)"""
+    objects = {1: b"<< /Type /Catalog /Pages 2 0 R >>", 3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    kids = []
+    for index, lines in enumerate(pages):
+        page_id, content_id = 4 + index * 2, 5 + index * 2
+        kids.append(f"{page_id} 0 R")
+        stream = "BT /F1 10 Tf 14 TL 56 790 Td " + " ".join(f"({_pdf_escape(line)}) '" for line in lines) + " ET"
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode()
+        objects[content_id] = f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream".encode()
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(out)
+        out += f"{number} 0 obj\n".encode() + objects[number] + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offsets[number]:010d} 00000 n \n".encode() for number in sorted(objects))
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def _font(size):
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def render_page(rng, lines, size=(1240, 1754), skew=0.0, noise=0):
+    """Rasterize lines of text like a scan or photo of a printed page"""
+    img = Image.new("L", size, 245)
+    draw = ImageDraw.Draw(img)
+    font = _font(max(12, size[1] // 70))
+    step = max(14, size[1] // 48)
+    for i, line in enumerate(lines):
+        draw.text((size[0] // 12, size[1] // 20 + i * step), line, fill=25, font=font)
+    if skew:
+        img = img.rotate(skew, resample=Image.BICUBIC, fillcolor=245)
+    if noise:
+        # Speckle like sensor noise, deterministic through rng
+        pixels = img.load()
+        for _ in range(size[0] * size[1] // 200):
+            x, y = rng.randrange(size[0]), rng.randrange(size[1])
+            pixels[x, y] = max(0, min(255, pixels[x, y] + rng.randint(-noise, noise)))
+    return img
+
+
+def write_scanned_pdf(path, rng, pages):
+    images = [render_page(rng, page_lines(rng, n + 1), skew=rng.uniform(-1.5, 1.5), noise=30) for n in range(pages)]
+    # Fixed dates keep the file bytes identical between runs
+    fixed = time.gmtime(1704067200)
+    images[0].save(path, "PDF", resolution=150, save_all=True, append_images=images[1:],
+                   creationDate=fixed, modDate=fixed)
+
+
+def write_image(path, rng, name):
+    if name.startswith("receipt"):
+        lines = [f"RECEIPT #{rng.randint(1000, 9999)}", ""] + [
+            f"{rng.choice(WORDS):<14}{rng.randint(1, 40)}.{rng.randint(0, 99):02d}" for _ in range(8)
+        ] + ["", f"TOTAL         {rng.randint(50, 300)}.{rng.randint(0, 99):02d}"]
+        img = render_page(rng, lines, size=(600, 420))
+    else:
+        # A phone photo of an A4 page: large, slightly rotated and noisy
+        img = render_page(rng, page_lines(rng, 1), size=(2480, 3508), skew=rng.uniform(-2, 2), noise=40)
+    img.convert("RGB").save(path, quality=85)
+
+
+def generate(out_dir, seed=7, kinds=None, copies=1):
+    """Write the corpus into out_dir and return its manifest"""
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {"seed": seed, "copies": copies, "files": []}
+    for copy in range(copies):
+        for kind, base_name, pages in LAYOUT:
+            if kinds and kind not in kinds:
+                continue
+            stem, ext = os.path.splitext(base_name)
+            name = f"{stem}-{copy}{ext}" if copies > 1 else base_name
+            # One generator per file, so filtering kinds does not change the other files
+            rng = random.Random(f"{seed}:{copy}:{base_name}")
+            path = os.path.join(out_dir, name)
+            if kind == "text_pdf":
+                write_text_pdf(path, [page_lines(rng, n + 1) for n in range(pages)])
+            elif kind == "scanned_pdf":
+                write_scanned_pdf(path, rng, pages)
+            else:
+                write_image(path, rng, base_name)
+            with open(path, "rb") as f:
+                data = f.read()
+            manifest["files"].append({
+                "name": name, "kind": kind, "pages": pages, "bytes": len(data),
+                "sha256": hashlib.sha256(data).hexdigest(),
+            })
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="corpus")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--kinds", default=",".join(KINDS), help=f"Comma-separated subset of {', '.join(KINDS)}")
+    parser.add_argument("--copies", type=int, default=1, help="Variants of each file, with different content")
+    args = parser.parse_args()
+
+    manifest = generate(args.out, args.seed, set(args.kinds.split(",")), args.copies)
+    for entry in manifest["files"]:
+        print(f"{entry['name']:<18} {entry['kind']:<12} {entry['pages']:>3} pages  {entry['bytes'] / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+"""
+Load test: concurrent database writes through the API.
+
+Many clients upload small files and enqueue /parse for each of them at the
+same time, so the server commits new documents, jobs and status updates
+concurrently (and the worker pool adds its own status writes). Reports
+write throughput, latency percentiles and how many requests failed with a
+"database is locked" error.
+
+Usage:
+    python db_concurrency.py --url http://localhost:8000 --clients 32 --requests 20
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import httpx
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def client_loop(client, client_id, requests, results):
+    """Upload a unique file and enqueue its parse, `requests` times"""
+    for n in range(requests):
+        # Unique bytes so the blob store cannot deduplicate the write away
+        body = f"client {client_id} request {n} {os.urandom(8).hex()}\n".encode() * 16
+        start = time.perf_counter()
+        try:
+            upload = await client.post("/upload", files={"file": (f"bench-{client_id}-{n}.txt", body)})
+            results["status"].append(upload.status_code)
+            if upload.status_code == 200:
+                parse = await client.post(f"/parse/{upload.json()['id']}")
+                results["status"].append(parse.status_code)
+                if "locked" in parse.text:
+                    results["locked"] += 1
+            elif "locked" in upload.text:
+                results["locked"] += 1
+        except httpx.HTTPError as e:
+            results["errors"].append(str(e))
+        results["latencies"].append((time.perf_counter() - start) * 1000)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=20, help="Upload + parse pairs per client")
+    args = parser.parse_args()
+
+    results = {"status": [], "latencies": [], "errors": [], "locked": 0}
+    limits = httpx.Limits(max_connections=args.clients)
+    async with httpx.AsyncClient(base_url=args.url, timeout=120, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client, i, args.requests, results) for i in range(args.clients)))
+        elapsed = time.perf_counter() - start
+
+    writes = sum(1 for status in results["status"] if status < 400)
+    failed = sum(1 for status in results["status"] if status >= 500)
+    latencies = results["latencies"]
+    print(f"clients={args.clients} pairs={len(latencies)} elapsed={elapsed:.1f}s")
+    print(f"successful writes: {writes} ({writes / elapsed:.1f}/s)")
+    print(
+        f"pair latency p50={percentile(latencies, 50):.1f}ms "
+        f"p95={percentile(latencies, 95):.1f}ms "
+        f"p99={percentile(latencies, 99):.1f}ms "
+        f"mean={statistics.mean(latencies):.1f}ms"
+    )
+    print(f"5xx responses: {failed}, 'database is locked': {results['locked']}, transport errors: {len(results['errors'])}")
+    if results["locked"]:
+        raise SystemExit(f"{results['locked']} requests failed with 'database is locked'")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
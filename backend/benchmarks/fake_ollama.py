@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+
+"""
+A stand-in Ollama server for benchmarks, with configurable latency and token rate.
+
+Implements the endpoints PageMonk uses (/api/chat and /api/generate, both
+streaming and not, plus /api/tags and /api/version). Each answer waits
+--latency seconds before the first token, then produces tokens at
+--tokens-per-second. Structuring prompts get markdown built from the prompt's
+words; requests with a JSON Schema `format` get an object matching the schema.
+Token counts and durations are reported the way Ollama reports them.
+
+Model residency is simulated too: a request for a model that is not loaded
+waits --load-seconds first, and loading more than --max-loaded models evicts
+the least recently used one. /api/ps lists the loaded models. --parallel
+caps how many requests are generated at once, like OLLAMA_NUM_PARALLEL.
+
+Usage:
+    python fake_ollama.py --port 11435 --latency 0.2 --tokens-per-second 80
+    python fake_ollama.py --port 11436 --load-seconds 3 --max-loaded 1 --parallel 2
+    OLLAMA_HOST=http://127.0.0.1:11435 uvicorn main:app
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _value_for(schema):
+    """A plausible value of the given JSON Schema type"""
+    types = schema.get("type", "string")
+    kind = next((t for t in types if t != "null"), "null") if isinstance(types, list) else types
+    if kind == "object":
+        return {name: _value_for(prop) for name, prop in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [_value_for(schema.get("items", {}))]
+    return {"number": 1250.5, "integer": 42, "boolean": True, "string": "sample", "null": None}.get(kind, "sample")
+
+
+class FakeOllama(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency, tokens_per_second, completion_tokens,
+                 load_seconds=0.0, max_loaded=0, parallel=0):
+        super().__init__(address, Handler)
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.load_seconds = load_seconds
+        self.max_loaded = max_loaded
+        self.slots = threading.Semaphore(parallel) if parallel > 0 else None
+        self.requests = 0
+        self.loads = 0
+        self.loaded = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+    def load_model(self, model):
+        """Seconds to wait for `model` to be loaded, evicting others beyond max_loaded"""
+        now = time.monotonic()
+        with self._lock:
+            if model in self.loaded:
+                self.loaded.move_to_end(model)
+                # Requests arriving mid-load wait for the same load to finish
+                return max(0.0, self.loaded[model] - now)
+            self.loaded[model] = now + self.load_seconds
+            self.loads += 1
+            while self.max_loaded and len(self.loaded) > self.max_loaded:
+                self.loaded.popitem(last=False)
+        return self.load_seconds
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/version":
+            self._send_json({"version": "0.0.0-fake"})
+        elif self.path == "/api/ps":
+            with self.server._lock:
+                models = [{"name": model, "model": model} for model in self.server.loaded]
+            self._send_json({"models": models})
+        elif self.path == "/api/tags":
+            self._send_json({"models": []})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        if self.path not in ("/api/chat", "/api/generate"):
+            self._send_json({"error": "not found"}, 404)
+            return
+        self.server.count()
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.server.slots:
+            with self.server.slots:
+                self._generate(request)
+        else:
+            self._generate(request)
+
+    def _generate(self, request):
+        chat = self.path == "/api/chat"
+        prompt = request["messages"][-1]["content"] if chat else request.get("prompt", "")
+        tokens = self._answer_tokens(prompt, request.get("format"))
+
+        started = time.perf_counter()
+        load_seconds = self.server.load_model(request.get("model", ""))
+        time.sleep(load_seconds + self.server.latency)
+        load_done = time.perf_counter()
+        interval = 1 / self.server.tokens_per_second if self.server.tokens_per_second > 0 else 0
+
+        if request.get("stream", True):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for token in tokens:
+                time.sleep(interval)
+                self._write_chunk(self._part(request, chat, token, False))
+            self._write_chunk(self._final(request, chat, "", prompt, tokens, started, load_done, load_seconds))
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            time.sleep(interval * len(tokens))
+            self._send_json(self._final(request, chat, "".join(tokens), prompt, tokens, started, load_done, load_seconds))
+
+    def _answer_tokens(self, prompt, format):
+        if isinstance(format, dict):
+            answer = json.dumps(_value_for(format))
+            return [answer[i:i + 4] for i in range(0, len(answer), 4)]
+        if format == "json":
+            return ["{}"]
+        if not prompt:
+            # An empty prompt only loads the model
+            return []
+        words = prompt.split() or ["empty"]
+        words = [words[i % len(words)] for i in range(self.server.completion_tokens)]
+        return ["# Document\n\n"] + [f"{word} " for word in words]
+
+    def _part(self, request, chat, text, done):
+        part = {"model": request.get("model", ""), "created_at": _now(), "done": done}
+        if chat:
+            part["message"] = {"role": "assistant", "content": text}
+        else:
+            part["response"] = text
+        return part
+
+    def _final(self, request, chat, text, prompt, tokens, started, load_done, load_seconds):
+        part = self._part(request, chat, text, True)
+        end = time.perf_counter()
+        part.update({
+            "done_reason": "stop",
+            "total_duration": int((end - started) * 1e9),
+            "load_duration": int(load_seconds * 1e9),
+            "prompt_eval_count": max(1, len(prompt) // 4),
+            "prompt_eval_duration": int((load_done - started) * 1e9),
+            "eval_count": len(tokens),
+            "eval_duration": max(1, int((end - load_done) * 1e9)),
+        })
+        return part
+
+    def _write_chunk(self, payload):
+        data = json.dumps(payload).encode() + b"\n"
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+def serve(port=11435, latency=0.2, tokens_per_second=80.0, completion_tokens=120, host="127.0.0.1", **options):
+    """Start the server on a background thread and return it
+
+    `options` are the FakeOllama residency settings: load_seconds, max_loaded, parallel.
+    """
+    server = FakeOllama((host, port), latency, tokens_per_second, completion_tokens, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0, help="Generation speed (0 for instant)")
+    parser.add_argument("--completion-tokens", type=int, default=120, help="Length of markdown answers")
+    parser.add_argument("--load-seconds", type=float, default=0.0, help="Time to load a model that is not resident")
+    parser.add_argument("--max-loaded", type=int, default=0, help="Models resident at once (0 for no limit)")
+    parser.add_argument("--parallel", type=int, default=0, help="Requests generated at once (0 for no limit)")
+    args = parser.parse_args()
+
+    server = FakeOllama(
+        (args.host, args.port), args.latency, args.tokens_per_second, args.completion_tokens,
+        args.load_seconds, args.max_loaded, args.parallel,
+    )
+    print(f"Fake Ollama on http://{args.host}:{args.port} "
+          f"(latency {args.latency}s, {args.tokens_per_second} tokens/s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark: LLM call latency across Ollama hosts, per routing policy.
+
+Starts fake Ollama hosts (fake_ollama.py) that take --load-seconds to load a
+model that is not resident and keep only one model loaded, then sends a mix
+of structuring and extraction calls for two models through LLMRouter:
+
+    single        every call on one host, as with a plain OLLAMA_HOST
+    least_loaded  spread over all hosts by load only
+    affinity      kept on hosts that already have the model (the default)
+
+A share of the calls repeat an identical prompt while it is in flight and
+are coalesced. Reports p50/p95/p99 latency and model loads per policy.
+
+Usage:
+    python llm_routing.py --hosts 2 --calls 200 --load-seconds 2
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("PAGEMONK_METRICS_DIR", tempfile.mkdtemp(prefix="pagemonk-metrics-"))
+os.environ.setdefault("PAGEMONK_LOG_LEVEL", "WARNING")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+import fake_ollama  # noqa: E402
+from llm_router import LLMRouter  # noqa: E402
+
+MODELS = ["qwen2.5:0.5b", "qwen3:0.6b"]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(router, calls, concurrency, duplicates, seed):
+    rng = random.Random(seed)
+    # Bursts of one model at a time, like a document's chunks, interleaved with the other model
+    workload = []
+    while len(workload) < calls:
+        model = rng.choice(MODELS)
+        for _ in range(rng.randint(1, 8)):
+            prompt = f"prompt {rng.randint(0, 5)}" if rng.random() < duplicates else f"prompt {len(workload)}-{rng.random()}"
+            workload.append((model, prompt))
+    slots = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def call(model, prompt):
+        async with slots:
+            start = time.perf_counter()
+            if model == MODELS[0]:
+                async for _ in router.stream_chat(model, [{"role": "user", "content": prompt}]):
+                    pass
+            else:
+                await router.chat(model, [{"role": "user", "content": prompt}], format={"type": "object"})
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(call(model, prompt) for model, prompt in workload[:calls]))
+    return latencies, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hosts", type=int, default=2)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8, help="Calls in flight from the client")
+    parser.add_argument("--host-concurrency", type=int, default=2, help="Per-host cap (and fake host parallelism)")
+    parser.add_argument("--load-seconds", type=float, default=2.0)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--completion-tokens", type=int, default=40)
+    parser.add_argument("--duplicates", type=float, default=0.1, help="Share of calls repeating a common prompt")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    for policy in ("single", "least_loaded", "affinity"):
+        servers = [
+            fake_ollama.serve(
+                0, args.latency, args.tokens_per_second, args.completion_tokens,
+                load_seconds=args.load_seconds, max_loaded=1, parallel=args.host_concurrency,
+            )
+            for _ in range(1 if policy == "single" else args.hosts)
+        ]
+        router = LLMRouter(
+            hosts=[f"http://127.0.0.1:{server.server_address[1]}" for server in servers],
+            capacity=args.host_concurrency,
+            routing="least_loaded" if policy == "single" else policy,
+        )
+        latencies, elapsed = asyncio.run(run(router, args.calls, args.concurrency, args.duplicates, args.seed))
+        requests = sum(server.requests for server in servers)
+        loads = sum(server.loads for server in servers)
+        for server in servers:
+            server.shutdown()
+        print(
+            f"{policy:<13} hosts={len(servers)}  {len(latencies) / elapsed:6.1f} calls/s  "
+            f"p50={percentile(latencies, 50):7.0f}ms  p95={percentile(latencies, 95):7.0f}ms  "
+            f"p99={percentile(latencies, 99):7.0f}ms  model loads={loads:<4} "
+            f"requests sent={requests} (coalesced {len(latencies) - requests})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark: OCR throughput on many small images, per OCR engine.
+
+Runs the same batch of small receipt-sized images through a process pool
+once per engine: "pytesseract" starts a tesseract process per image, while
+"tesserocr" keeps one Tesseract instance loaded per pool worker. Reports
+images per second for each.
+
+Usage:
+    python ocr_small_batch.py --images 200 --workers 4
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+
+def receipt(n):
+    """A small binarized receipt image as a NumPy array"""
+    img = Image.new("L", (400, 240), 255)
+    draw = ImageDraw.Draw(img)
+    for i, line in enumerate([f"RECEIPT #{1000 + n}", "Coffee      3.50", "Bagel       2.25", f"TOTAL       {5.75 + n % 7:.2f}"]):
+        draw.text((20, 20 + i * 50), line, fill=0)
+    return np.asarray(img, dtype=np.uint8)
+
+
+def ocr(tile):
+    import ocr_engine
+    return ocr_engine.image_to_string(Image.fromarray(tile), 6)
+
+
+def init():
+    import ocr_engine
+    ocr_engine.init_worker()
+
+
+def engine_in_worker(_):
+    import ocr_engine
+    return ocr_engine.engine_name()
+
+
+def run(engine, images, workers):
+    # Workers are spawned, so they read the engine choice from the environment
+    os.environ["PAGEMONK_OCR_ENGINE"] = engine
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init) as pool:
+        actual = set(pool.map(engine_in_worker, range(workers)))
+        start = time.perf_counter()
+        texts = list(pool.map(ocr, images, chunksize=4))
+        elapsed = time.perf_counter() - start
+    words = sum(len(text.split()) for text in texts)
+    print(f"{engine:<12} (workers ran {', '.join(sorted(actual))}): "
+          f"{len(images) / elapsed:7.1f} images/s  {elapsed:6.2f}s  {words} words")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--engines", default="pytesseract,tesserocr")
+    args = parser.parse_args()
+
+    images = [receipt(n) for n in range(args.images)]
+    for engine in args.engines.split(","):
+        run(engine.strip(), images, args.workers)
+
+
+if __name__ == "__main__":
+    main()
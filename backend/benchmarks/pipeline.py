@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark: the ingestion pipeline end to end, with a JSON report for regressions.
+
+Generates a deterministic corpus (corpus.py), starts the fake Ollama server
+(fake_ollama.py) and a PageMonk API with its workers in a scratch directory,
+then measures at the given concurrency:
+
+    upload        POST /upload for every corpus file
+    parse         POST /parse/{id} (enqueue only)
+    parse_e2e     enqueue until the job completes, also broken down by file kind
+    extract       POST /extract/{id}?refresh=true for every parsed document
+    documents     GET /documents?view=summary
+    document      GET /documents/{id}
+
+Each gets count, errors, throughput and p50/p95/p99/mean/max latency in ms.
+Pipeline stage totals scraped from /metrics are included as well. With
+--baseline the run is compared against an earlier report and the script
+exits non-zero when a p95 or throughput regresses beyond --tolerance.
+
+Pass --url to benchmark an already running server instead (it should be
+using a fake or otherwise stable Ollama for comparable numbers).
+
+Usage:
+    python pipeline.py --concurrency 8 --copies 3 --output report.json
+    python pipeline.py --kinds text_pdf --baseline report.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+import corpus
+import fake_ollama
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+REPORT_VERSION = 1
+
+BENCH_SCHEMA = {
+    "name": "benchmark-report",
+    "description": "Fields from the generated annual report pages",
+    "schema_definition": {
+        "company_name": "string",
+        "report_year": "number",
+        "total_assets": "number",
+        "summary": "string",
+    },
+}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Recorder:
+    """Latency samples and error counts per endpoint"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.wall = {}
+
+    def add(self, name, seconds):
+        self.samples[name].append(seconds * 1000)
+
+    def fail(self, name):
+        self.errors[name] += 1
+
+    def summary(self):
+        result = {}
+        for name in sorted(set(self.samples) | set(self.errors)):
+            samples = self.samples[name]
+            wall = self.wall.get(name.split("[")[0])
+            entry = {"count": len(samples), "errors": self.errors[name]}
+            if wall:
+                entry["throughput_per_s"] = round(len(samples) / wall, 3)
+            if samples:
+                entry.update({
+                    "p50_ms": round(percentile(samples, 50), 2),
+                    "p95_ms": round(percentile(samples, 95), 2),
+                    "p99_ms": round(percentile(samples, 99), 2),
+                    "mean_ms": round(statistics.mean(samples), 2),
+                    "max_ms": round(max(samples), 2),
+                })
+            result[name] = entry
+        return result
+
+
+async def run_phase(recorder, name, items, concurrency, func):
+    """Run func(item) over items with at most `concurrency` in flight, timing the phase"""
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(item):
+        async with slots:
+            try:
+                return await func(item)
+            except Exception as e:
+                recorder.fail(name)
+                print(f"Error in {name}: {e}", file=sys.stderr)
+                return None
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(item) for item in items))
+    recorder.wall[name] = time.perf_counter() - start
+    return results
+
+
+async def timed_request(recorder, name, client, method, url, **kwargs):
+    start = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    elapsed = time.perf_counter() - start
+    response.raise_for_status()
+    recorder.add(name, elapsed)
+    return response
+
+
+async def upload_all(client, recorder, files, corpus_dir, concurrency):
+    async def upload(entry):
+        with open(os.path.join(corpus_dir, entry["name"]), "rb") as f:
+            data = f.read()
+        response = await timed_request(recorder, "upload", client, "POST", "/upload", files={"file": (entry["name"], data)})
+        return entry, response.json()["id"]
+
+    return [result for result in await run_phase(recorder, "upload", files, concurrency, upload) if result]
+
+
+async def parse_all(client, recorder, documents, concurrency, job_timeout):
+    async def parse(item):
+        entry, document_id = item
+        start = time.perf_counter()
+        response = await timed_request(recorder, "parse", client, "POST", f"/parse/{document_id}")
+        job_id = response.json()["job_id"]
+        deadline = start + job_timeout
+        while time.perf_counter() < deadline:
+            status = (await client.get(f"/jobs/{job_id}")).json()["status"]
+            if status == "completed":
+                elapsed = time.perf_counter() - start
+                recorder.add("parse_e2e", elapsed)
+                recorder.add(f"parse_e2e[{entry['kind']}]", elapsed)
+                return document_id
+            if status == "failed":
+                raise RuntimeError(f"job {job_id} for {entry['name']} failed")
+            await asyncio.sleep(0.05)
+        raise TimeoutError(f"job {job_id} for {entry['name']} did not finish in {job_timeout}s")
+
+    results = await run_phase(recorder, "parse_e2e", documents, concurrency, parse)
+    recorder.wall["parse"] = recorder.wall["parse_e2e"]
+    return [document_id for document_id in results if document_id]
+
+
+async def extract_all(client, recorder, document_ids, concurrency):
+    response = await client.post("/schemas", json=BENCH_SCHEMA)
+    response.raise_for_status()
+    schema = response.json()
+
+    async def extract(document_id):
+        await timed_request(
+            recorder, "extract", client, "POST", f"/extract/{document_id}",
+            params={"schema_id": schema["id"], "refresh": "true"},
+        )
+
+    await run_phase(recorder, "extract", document_ids, concurrency, extract)
+
+
+async def read_all(client, recorder, document_ids, reads, concurrency):
+    async def list_documents(_):
+        await timed_request(recorder, "documents", client, "GET", "/documents", params={"view": "summary", "limit": 50})
+
+    async def get_document(i):
+        await timed_request(recorder, "document", client, "GET", f"/documents/{document_ids[i % len(document_ids)]}")
+
+    await run_phase(recorder, "documents", range(reads), concurrency, list_documents)
+    if document_ids:
+        await run_phase(recorder, "document", range(reads), concurrency, get_document)
+
+
+def stage_totals(metrics_text):
+    """Sum and count of pagemonk_stage_seconds per stage from a /metrics scrape"""
+    totals = defaultdict(dict)
+    for kind, stage_name, value in re.findall(
+        r'^pagemonk_stage_seconds_(sum|count)\{stage="([^"]+)"\} (\S+)$', metrics_text, re.MULTILINE
+    ):
+        totals[stage_name][kind] = float(value)
+    return {
+        name: {"count": int(t.get("count", 0)), "total_s": round(t.get("sum", 0.0), 3),
+               "mean_ms": round(t.get("sum", 0.0) / t["count"] * 1000, 2) if t.get("count") else None}
+        for name, t in sorted(totals.items())
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir, ollama_url, workers, port):
+    """Start a PageMonk API with its own database, uploads and caches under workdir"""
+    # The benchmark is a single client pushing a burst of uploads; per-client rate limits would skew it
+    env = dict(
+        os.environ, OLLAMA_HOSTS=ollama_url, PAGEMONK_WORKERS=str(workers), PAGEMONK_LOG_LEVEL="WARNING",
+        PAGEMONK_RATE_LIMIT="0",
+    )
+    log = open(os.path.join(workdir, "server.log"), "w")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", APP_DIR, "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited; see {log.name}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/ready").status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Server did not start in 60s; see {log.name}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, tolerance):
+    """Print the change against a baseline report and return the regressions"""
+    regressions = []
+    print(f"\n{'endpoint':<24}{'p95 base':>10}{'p95 now':>10}{'change':>9}{'tput base':>11}{'tput now':>10}")
+    for name, now in report["endpoints"].items():
+        base = baseline.get("endpoints", {}).get(name)
+        if not base or "p95_ms" not in now or "p95_ms" not in base:
+            continue
+        change = now["p95_ms"] / max(base["p95_ms"], 1e-6) - 1
+        print(f"{name:<24}{base['p95_ms']:>10.1f}{now['p95_ms']:>10.1f}{change:>+9.0%}"
+              f"{base.get('throughput_per_s', 0):>11.2f}{now.get('throughput_per_s', 0):>10.2f}")
+        if change > tolerance:
+            regressions.append(f"{name} p95 {base['p95_ms']:.1f}ms -> {now['p95_ms']:.1f}ms ({change:+.0%})")
+        if base.get("throughput_per_s") and now.get("throughput_per_s") is not None:
+            drop = 1 - now["throughput_per_s"] / base["throughput_per_s"]
+            if drop > tolerance:
+                regressions.append(f"{name} throughput {base['throughput_per_s']}/s -> {now['throughput_per_s']}/s (-{drop:.0%})")
+    return regressions
+
+
+async def benchmark(args, base_url, files, corpus_dir):
+    recorder = Recorder()
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.job_timeout) as client:
+        documents = await upload_all(client, recorder, files, corpus_dir, args.concurrency)
+        parsed = await parse_all(client, recorder, documents, args.concurrency, args.job_timeout)
+        if parsed:
+            await extract_all(client, recorder, parsed, args.concurrency)
+        await read_all(client, recorder, [document_id for _, document_id in documents], args.reads, args.concurrency)
+        metrics = await client.get("/metrics")
+    return recorder, stage_totals(metrics.text) if metrics.status_code == 200 else {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Benchmark a running server instead of starting one")
+    parser.add_argument("--corpus", help="Existing corpus directory (default: generate one)")
+    parser.add_argument("--kinds", default=",".join(corpus.KINDS), help="File kinds to include")
+    parser.add_argument("--copies", type=int, default=3, help="Variants of each corpus file")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--reads", type=int, default=500, help="Requests each for GET /documents and /documents/{id}")
+    parser.add_argument("--workers", type=int, default=2, help="Parse workers of the started server")
+    parser.add_argument("--job-timeout", type=float, default=600)
+    parser.add_argument("--ollama-latency", type=float, default=0.2, help="Fake Ollama seconds to first token")
+    parser.add_argument("--ollama-tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--ollama-completion-tokens", type=int, default=120)
+    parser.add_argument("--output", default="benchmark_report.json")
+    parser.add_argument("--baseline", help="Earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 growth / throughput drop")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="pagemonk-bench-")
+    corpus_dir = args.corpus or os.path.join(workdir, "corpus")
+    if args.corpus:
+        with open(os.path.join(corpus_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+    else:
+        manifest = corpus.generate(corpus_dir, args.seed, set(args.kinds.split(",")), args.copies)
+    files = [entry for entry in manifest["files"] if entry["kind"] in args.kinds.split(",")]
+
+    server = ollama = None
+    base_url = args.url
+    if not base_url:
+        ollama = fake_ollama.serve(
+            free_port(), args.ollama_latency, args.ollama_tokens_per_second, args.ollama_completion_tokens
+        )
+        port = free_port()
+        server = start_server(workdir, f"http://127.0.0.1:{ollama.server_address[1]}", args.workers, port)
+        base_url = f"http://127.0.0.1:{port}"
+
+    try:
+        started = time.time()
+        recorder, stages = asyncio.run(benchmark(args, base_url, files, corpus_dir))
+    finally:
+        if server:
+            server.terminate()
+            server.wait(30)
+        if ollama:
+            ollama.shutdown()
+
+    report = {
+        "version": REPORT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(started)),
+        "duration_s": round(time.time() - started, 2),
+        "git_commit": git_commit(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {
+            "server": args.url or "local",
+            "concurrency": args.concurrency,
+            "workers": None if args.url else args.workers,
+            "reads": args.reads,
+            "ollama": None if args.url else {
+                "latency_s": args.ollama_latency,
+                "tokens_per_second": args.ollama_tokens_per_second,
+                "completion_tokens": args.ollama_completion_tokens,
+            },
+        },
+        "corpus": {
+            "seed": manifest.get("seed"),
+            "files": len(files),
+            "kinds": sorted({entry["kind"] for entry in files}),
+            "pages": sum(entry["pages"] for entry in files),
+            "bytes": sum(entry["bytes"] for entry in files),
+        },
+        "endpoints": recorder.summary(),
+        "stages": stages,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'endpoint':<24}{'n':>6}{'err':>5}{'per s':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for name, entry in report["endpoints"].items():
+        print(f"{name:<24}{entry['count']:>6}{entry['errors']:>5}{entry.get('throughput_per_s', 0):>9.2f}"
+              f"{entry.get('p50_ms', 0):>9.1f}{entry.get('p95_ms', 0):>9.1f}{entry.get('p99_ms', 0):>9.1f}")
+    print(f"Report written to {args.output} (server files in {workdir})")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            raise SystemExit("Regressions:\n  " + "\n  ".join(regressions))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+"""
+Load test: read endpoint latency while parses and structuring run.
+
+Measures GET /documents latency on an idle server, then again while a
+batch of /parse and /structure requests is in flight, and compares p99.
+A flat p99 means heavy work is no longer blocking the event loop.
+
+Usage:
+    python read_latency.py --url http://localhost:8000 --file sample.pdf
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def measure_reads(client, duration, concurrency):
+    """Hammer GET /documents for `duration` seconds and return latencies in ms"""
+    latencies = []
+    deadline = time.perf_counter() + duration
+
+    async def reader():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = await client.get("/documents")
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(reader() for _ in range(concurrency)))
+    return latencies
+
+
+async def generate_load(client, file_path, parses, structures):
+    """Fire parse and structure requests concurrently"""
+    tasks = []
+
+    if file_path:
+        for _ in range(parses):
+            with open(file_path, "rb") as f:
+                upload = await client.post("/upload", files={"file": (file_path.split("/")[-1], f.read())})
+            upload.raise_for_status()
+            tasks.append(client.post(f"/parse/{upload.json()['id']}"))
+
+    for _ in range(structures):
+        tasks.append(client.post("/structure", json={"content": "Quarterly report\n" * 200}))
+
+    return await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def summarize(label, latencies):
+    print(
+        f"{label:<10} n={len(latencies):<6} "
+        f"p50={percentile(latencies, 50):8.1f}ms "
+        f"p95={percentile(latencies, 95):8.1f}ms "
+        f"p99={percentile(latencies, 99):8.1f}ms "
+        f"mean={statistics.mean(latencies):8.1f}ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--file", help="Document to upload and parse during the load phase")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per measurement phase")
+    parser.add_argument("--readers", type=int, default=8, help="Concurrent GET /documents clients")
+    parser.add_argument("--parses", type=int, default=8)
+    parser.add_argument("--structures", type=int, default=8)
+    parser.add_argument("--max-ratio", type=float, default=2.0, help="Allowed loaded/idle p99 ratio")
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=600) as client:
+        idle = await measure_reads(client, args.duration, args.readers)
+
+        load = asyncio.create_task(generate_load(client, args.file, args.parses, args.structures))
+        loaded = await measure_reads(client, args.duration, args.readers)
+        await load
+
+    summarize("idle", idle)
+    summarize("loaded", loaded)
+
+    ratio = percentile(loaded, 99) / max(percentile(idle, 99), 0.001)
+    print(f"p99 ratio loaded/idle: {ratio:.2f}")
+    if ratio > args.max_ratio:
+        raise SystemExit(f"p99 read latency grew {ratio:.2f}x under load (limit {args.max_ratio}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark: API cold start, with budgets for CI.
+
+Measures, each in fresh processes so nothing is cached in memory:
+
+    import        `import main` wall time (median of --runs), plus the slowest
+                  top-level imports from `python -X importtime`
+    heavy         PDF, OCR and LLM client modules loaded by `import main`;
+                  an API process should load none of them until first use
+    ready         seconds from starting uvicorn with PAGEMONK_ROLE=api until
+                  GET /ready returns 200 (median of --runs)
+
+Exits non-zero when the import time exceeds --import-budget-ms, the time to
+ready exceeds --ready-budget-ms, or a heavy module is imported eagerly.
+
+Usage:
+    python startup.py
+    python startup.py --runs 10 --import-budget-ms 1200 --output startup.json
+"""
+
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+
+# Modules only parse workers and OCR endpoints need
+HEAVY_MODULES = ["PyPDF2", "pdf2image", "PIL", "numpy", "pytesseract", "tesserocr", "ollama", "docling"]
+
+_IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def _env(workdir):
+    return dict(
+        os.environ,
+        PAGEMONK_ROLE="api",
+        PAGEMONK_LOG_LEVEL="WARNING",
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'startup.db')}",
+        PAGEMONK_METRICS_DIR=os.path.join(workdir, "metrics"),
+        PAGEMONK_UPLOAD_DIR=os.path.join(workdir, "uploads"),
+    )
+
+
+def measure_import(workdir):
+    """Seconds to import main, and the heavy modules it left loaded"""
+    script = (
+        f"import sys, time, json; sys.path.insert(0, {APP_DIR!r})\n"
+        "start = time.perf_counter()\n"
+        "import main\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"print(json.dumps([elapsed, [m for m in {HEAVY_MODULES!r} if m in sys.modules]]))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=workdir, env=_env(workdir), capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(workdir, count):
+    """Top-level packages by cumulative import time, from -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import sys; sys.path.insert(0, {APP_DIR!r}); import main"],
+        cwd=workdir, env=_env(workdir), capture_output=True, text=True, check=True,
+    )
+    # Modules are listed after the imports they triggered: collect each
+    # top-level import's direct children and keep those of main
+    totals, children = {}, {}
+    for line in result.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if not match:
+            continue
+        depth, name = len(match.group(3)), match.group(4)
+        if depth == 3:
+            package = name.split(".")[0]
+            children[package] = children.get(package, 0) + int(match.group(2))
+        elif depth == 1:
+            if name == "main":
+                totals = children
+            children = {}
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:count]
+    return [{"module": name, "ms": round(us / 1000, 1)} for name, us in ranked]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_ready(workdir, timeout=60):
+    """Seconds from launching an API-only server until /ready answers 200"""
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", APP_DIR, "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=_env(workdir), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError("Server exited during startup")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/ready", timeout=1).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.02)
+        raise RuntimeError(f"Server was not ready within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-budget-ms", type=float, default=1500)
+    parser.add_argument("--ready-budget-ms", type=float, default=4000)
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list")
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="pagemonk-startup-")
+    imports, heavy = [], set()
+    for _ in range(args.runs):
+        elapsed, loaded = measure_import(workdir)
+        imports.append(elapsed)
+        heavy.update(loaded)
+    ready = [measure_ready(workdir) for _ in range(args.runs)]
+
+    report = {
+        "import_ms": round(statistics.median(imports) * 1000, 1),
+        "ready_ms": round(statistics.median(ready) * 1000, 1),
+        "heavy_modules": sorted(heavy),
+        "slowest_imports": slowest_imports(workdir, args.top),
+        "budgets": {"import_ms": args.import_budget_ms, "ready_ms": args.ready_budget_ms},
+        "python": sys.version.split()[0],
+    }
+
+    print(f"import main   {report['import_ms']:8.1f} ms  (budget {args.import_budget_ms:.0f})")
+    print(f"ready         {report['ready_ms']:8.1f} ms  (budget {args.ready_budget_ms:.0f})")
+    print(f"heavy modules {', '.join(report['heavy_modules']) or 'none'}")
+    for entry in report["slowest_imports"]:
+        print(f"  {entry['module']:<24}{entry['ms']:8.1f} ms")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failures = []
+    if report["import_ms"] > args.import_budget_ms:
+        failures.append(f"import took {report['import_ms']} ms")
+    if report["ready_ms"] > args.ready_budget_ms:
+        failures.append(f"ready took {report['ready_ms']} ms")
+    if heavy:
+        failures.append(f"imported eagerly: {', '.join(sorted(heavy))}")
+    for failure in failures:
+        print(f"OVER BUDGET: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+"""Point the app at a throwaway database and cache directories before any test imports it"""
+
+import os
+import sys
+import tempfile
+
+TEST_DIR = tempfile.mkdtemp(prefix="pagemonk-test-")
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(TEST_DIR, 'pagemonk.db')}")
+os.environ.setdefault("PAGEMONK_UPLOAD_DIR", os.path.join(TEST_DIR, "uploads"))
+os.environ.setdefault("PAGEMONK_LLM_CACHE_DB", os.path.join(TEST_DIR, "llm_cache.db"))
+os.environ.setdefault("PAGEMONK_METRICS_DIR", os.path.join(TEST_DIR, "metrics"))
+os.environ.setdefault("PAGEMONK_OCR_CACHE_DIR", os.path.join(TEST_DIR, "ocr"))
+os.environ.setdefault("PAGEMONK_SEARCH_DIR", os.path.join(TEST_DIR, "search"))
+os.environ.setdefault("PAGEMONK_RETRIEVAL_INDEX_DIR", os.path.join(TEST_DIR, "retrieval"))
+os.environ.setdefault("PAGEMONK_LOG_LEVEL", "WARNING")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app'))
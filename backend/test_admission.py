@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+import asyncio
+
+import conftest  # noqa: F401  (throwaway database and app path)
+
+import admission
+from admission import BULK, INTERACTIVE, Overloaded, RateLimiter, StageGate
+
+
+def _refused(func, *args):
+    try:
+        func(*args)
+    except Overloaded as e:
+        return e
+    return None
+
+
+async def _settle():
+    """Let woken waiters run"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_rate_limiter_allows_burst_then_refuses():
+    limiter = RateLimiter(rate=1, burst=3, key_limits="")
+    for _ in range(3):
+        limiter.check("ip:1.2.3.4", "upload")
+    error = _refused(limiter.check, "ip:1.2.3.4", "upload")
+    assert error is not None and error.reason == "rate_limited" and error.retry_after >= 1
+    # Other clients have their own bucket
+    limiter.check("ip:5.6.7.8", "upload")
+
+
+def test_rate_limiter_per_key_limits():
+    limiter = RateLimiter(rate=1, burst=1, key_limits="batch:100:50, internal:0")
+    for _ in range(50):
+        limiter.check("key:batch", "extract")
+    assert _refused(limiter.check, "key:batch", "extract") is not None
+    # A zero rate disables limiting for that key
+    for _ in range(500):
+        limiter.check("key:internal", "extract")
+    # A request costing more than the burst is charged the whole burst, not refused forever
+    limiter.check("key:other", "upload", 10)
+
+
+def test_rate_limiter_evicts_least_recent_clients():
+    limiter = RateLimiter(rate=1, burst=1, key_limits="", max_clients=2)
+    limiter.check("ip:a", "upload")
+    limiter.check("ip:b", "upload")
+    limiter.check("ip:c", "upload")
+    assert list(limiter._buckets) == ["ip:b", "ip:c"]
+    # Evicted clients start again with a full bucket
+    limiter.check("ip:a", "upload")
+
+
+def test_stage_gate_runs_queued_requests_by_priority():
+    async def scenario():
+        gate = StageGate("llm", concurrency=2, queue_limit=10)
+        await gate.acquire(INTERACTIVE)
+        await gate.acquire(INTERACTIVE)
+
+        order = []
+
+        async def request(name, priority):
+            await gate.acquire(priority)
+            order.append(name)
+
+        tasks = [asyncio.create_task(request("bulk", BULK))]
+        await _settle()
+        tasks.append(asyncio.create_task(request("interactive", INTERACTIVE)))
+        await _settle()
+        assert gate.status()["waiting"] == {"interactive": 1, "bulk": 1}
+
+        # The interactive request queued later is admitted first
+        gate.release(INTERACTIVE, 0.5)
+        await _settle()
+        assert order == ["interactive"]
+        gate.release(INTERACTIVE, 0.5)
+        await asyncio.gather(*tasks)
+        assert order == ["interactive", "bulk"]
+        assert gate.status()["running"] == {"interactive": 1, "bulk": 1}
+
+    asyncio.run(scenario())
+
+
+def test_stage_gate_limits_bulk_share():
+    async def scenario():
+        gate = StageGate("upload", concurrency=4, queue_limit=10)
+        await gate.acquire(BULK)
+        await gate.acquire(BULK)
+        # Bulk may hold only half of the slots; interactive requests still get in
+        waiter = asyncio.create_task(gate.acquire(BULK))
+        await _settle()
+        assert not waiter.done()
+        await gate.acquire(INTERACTIVE)
+        gate.release(BULK, 0.1)
+        await waiter
+        assert gate.status()["running"] == {"interactive": 1, "bulk": 2}
+
+    asyncio.run(scenario())
+
+
+def test_stage_gate_refuses_when_full():
+    async def scenario():
+        gate = StageGate("upload", concurrency=1, queue_limit=2)
+        await gate.acquire(INTERACTIVE)
+        waiters = [asyncio.create_task(gate.acquire(INTERACTIVE)) for _ in range(2)]
+        await _settle()
+        try:
+            await gate.acquire(INTERACTIVE)
+        except Overloaded as e:
+            assert e.reason == "queue_full" and e.retry_after >= 1
+        else:
+            raise AssertionError("queue limit not enforced")
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        assert gate.status()["waiting"] == {"interactive": 0, "bulk": 0}
+
+    asyncio.run(scenario())
+
+
+def test_stage_gate_wait_timeout_and_cancel():
+    async def scenario():
+        gate = StageGate("llm", concurrency=1, queue_limit=5)
+        await gate.acquire(INTERACTIVE)
+        try:
+            await gate.acquire(INTERACTIVE)
+        except Overloaded as e:
+            assert e.reason == "wait_timeout"
+        else:
+            raise AssertionError("wait did not time out")
+
+        # A cancelled waiter does not take the slot when it frees up
+        cancelled = asyncio.create_task(gate.acquire(INTERACTIVE))
+        await _settle()
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        gate.release(INTERACTIVE, 0)
+        assert gate.status()["running"] == {"interactive": 0, "bulk": 0}
+        await gate.acquire(INTERACTIVE)
+
+    max_wait = admission.MAX_WAIT_SECONDS
+    admission.MAX_WAIT_SECONDS = 0.05
+    try:
+        asyncio.run(scenario())
+    finally:
+        admission.MAX_WAIT_SECONDS = max_wait
+
+
+if __name__ == "__main__":
+    test_rate_limiter_allows_burst_then_refuses()
+    test_rate_limiter_per_key_limits()
+    test_rate_limiter_evicts_least_recent_clients()
+    test_stage_gate_runs_queued_requests_by_priority()
+    test_stage_gate_limits_bulk_share()
+    test_stage_gate_refuses_when_full()
+    test_stage_gate_wait_timeout_and_cancel()
+    print("Admission tests passed")
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+import threading
+from datetime import datetime, timedelta
+
+import conftest  # noqa: F401  (throwaway database and app path)
+
+import jobs
+from database import SessionLocal, Document, Job, JobEvent
+from migrations import run_migrations
+from jobs import enqueue_parse, claim_job, recover_stale_jobs, _schedule_retry
+
+
+def _reset():
+    run_migrations()
+    with SessionLocal() as db:
+        db.query(JobEvent).delete()
+        db.query(Job).delete()
+        db.query(Document).delete()
+        db.commit()
+
+
+def _document(db, status="uploaded"):
+    document = Document(filename="sample.pdf", processing_status=status)
+    db.add(document)
+    db.commit()
+    return document
+
+
+def test_claim_is_compare_and_set():
+    _reset()
+    with SessionLocal() as db:
+        enqueue_parse(db, _document(db))
+
+    with SessionLocal() as first, SessionLocal() as second:
+        job = claim_job(first)
+        assert job is not None and job.status == "running" and job.attempts == 1
+        # The row is no longer queued, so a second worker cannot take it too
+        assert claim_job(second) is None
+
+
+def test_racing_workers_claim_each_job_once():
+    _reset()
+    with SessionLocal() as db:
+        for _ in range(20):
+            enqueue_parse(db, _document(db))
+
+    claimed = []
+    lock = threading.Lock()
+
+    def worker():
+        with SessionLocal() as db:
+            while True:
+                job = claim_job(db)
+                if job is None:
+                    return
+                with lock:
+                    claimed.append(job.id)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(claimed) == 20
+    assert len(set(claimed)) == 20
+
+
+def test_claim_order_and_schedule():
+    _reset()
+    with SessionLocal() as db:
+        bulk = enqueue_parse(db, _document(db), priority=1)
+        interactive = enqueue_parse(db, _document(db), priority=0)
+        later = enqueue_parse(db, _document(db), priority=0)
+        later.next_run_at = datetime.utcnow() + timedelta(hours=1)
+        db.commit()
+        ids = (bulk.id, interactive.id)
+
+    with SessionLocal() as db:
+        assert claim_job(db).id == ids[1]
+        assert claim_job(db).id == ids[0]
+        # A job waiting out its backoff is not runnable yet
+        assert claim_job(db) is None
+
+
+def test_retry_backoff_then_failure():
+    _reset()
+    with SessionLocal() as db:
+        document = _document(db)
+        enqueue_parse(db, document)
+        document_id = document.id
+
+    delays = []
+    for attempt in range(1, jobs.MAX_ATTEMPTS + 1):
+        with SessionLocal() as db:
+            job = db.query(Job).one()
+            job.next_run_at = datetime.utcnow()
+            db.commit()
+            job = claim_job(db)
+            assert job.attempts == attempt
+            before = datetime.utcnow()
+            _schedule_retry(db, job, "boom")
+            db.commit()
+            if attempt < jobs.MAX_ATTEMPTS:
+                assert job.status == "queued" and job.claim_token is None
+                delays.append((job.next_run_at - before).total_seconds())
+
+    for attempt, delay in enumerate(delays, start=1):
+        expected = jobs.RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+        assert abs(delay - expected) < 1, (attempt, delay)
+
+    with SessionLocal() as db:
+        job = db.query(Job).one()
+        document = db.get(Document, document_id)
+        assert job.status == "failed" and job.last_error == "boom"
+        assert document.processing_status == "failed"
+        assert db.query(JobEvent).filter(JobEvent.event == "failed").count() == 1
+
+
+def test_expired_lease_is_recovered():
+    _reset()
+    with SessionLocal() as db:
+        enqueue_parse(db, _document(db))
+        enqueue_parse(db, _document(db))
+        stale = claim_job(db)
+        fresh = claim_job(db)
+        stale.locked_at = datetime.utcnow() - timedelta(seconds=jobs.LEASE_SECONDS + 10)
+        db.commit()
+        stale_id, fresh_id = stale.id, fresh.id
+
+    with SessionLocal() as db:
+        assert recover_stale_jobs(db) == 1
+        stale = db.get(Job, stale_id)
+        assert stale.status == "queued" and stale.last_error == "Worker lease expired"
+        assert db.get(Job, fresh_id).status == "running"
+
+
+def test_orphaned_documents_are_requeued():
+    _reset()
+    with SessionLocal() as db:
+        orphan = _document(db, status="processing")
+        queued = _document(db, status="queued")
+        done = _document(db, status="completed")
+        covered = _document(db)
+        enqueue_parse(db, covered)
+        covered.processing_status = "processing"
+        db.commit()
+        ids = (orphan.id, queued.id, done.id, covered.id)
+
+    with SessionLocal() as db:
+        assert recover_stale_jobs(db) == 2
+        by_document = {}
+        for job in db.query(Job).all():
+            by_document.setdefault(job.document_id, []).append(job)
+        assert [job.status for job in by_document[ids[0]]] == ["queued"]
+        assert [job.status for job in by_document[ids[1]]] == ["queued"]
+        assert ids[2] not in by_document
+        assert len(by_document[ids[3]]) == 1
+        assert db.get(Document, ids[0]).processing_status == "queued"
+        # A second pass finds nothing left to recover
+        assert recover_stale_jobs(db) == 0
+
+
+if __name__ == "__main__":
+    test_claim_is_compare_and_set()
+    test_racing_workers_claim_each_job_once()
+    test_claim_order_and_schedule()
+    test_retry_backoff_then_failure()
+    test_expired_lease_is_recovered()
+    test_orphaned_documents_are_requeued()
+    print("Job queue tests passed")
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+
+import conftest  # noqa: F401  (throwaway database and app path)
+
+from sqlalchemy import inspect, text, Column, DateTime, Integer, MetaData, String, Table, Text, Boolean
+from sqlalchemy.orm import Session
+
+from database import create_db_engine, blob_hash, Base, ContentBlob, Document, Job, Schema
+from migrations import MIGRATIONS, run_migrations, schema_migrations
+from jobs import recover_stale_jobs
+
+# The tables as the first release created them, before versioned migrations
+baseline = MetaData()
+Table(
+    "documents",
+    baseline,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("filename", String, index=True),
+    Column("original_content", Text),
+    Column("markdown_content", Text),
+    Column("structured_content", Text),
+    Column("extracted_schema", Text),
+    Column("upload_date", DateTime),
+    Column("file_size", Integer),
+    Column("file_type", String),
+    Column("processing_status", String),
+)
+Table(
+    "schemas",
+    baseline,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String, index=True),
+    Column("description", Text),
+    Column("schema_definition", Text),
+    Column("created_date", DateTime),
+    Column("is_active", Boolean),
+)
+
+
+def _engine():
+    path = os.path.join(tempfile.mkdtemp(dir=conftest.TEST_DIR), "pagemonk.db")
+    return create_db_engine(f"sqlite:///{path}")
+
+
+def _applied(engine):
+    with engine.connect() as conn:
+        return sorted(row.version for row in conn.execute(schema_migrations.select()))
+
+
+def test_fresh_database():
+    engine = _engine()
+    versions = [version for version, _ in MIGRATIONS]
+    assert run_migrations(bind=engine) == versions
+    assert _applied(engine) == versions
+    tables = set(inspect(engine).get_table_names())
+    assert {"documents", "jobs", "content_blobs", "job_events", "document_pages", "schemas"} <= tables
+
+    # A second run finds everything applied
+    assert run_migrations(bind=engine) == []
+    assert _applied(engine) == versions
+
+
+def test_migrations_build_the_models_schema():
+    engine = _engine()
+    run_migrations(bind=engine)
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        columns = {column["name"]: column for column in inspector.get_columns(table.name)}
+        assert set(columns) == set(table.columns.keys()), table.name
+        for column in table.columns:
+            reflected = columns[column.name]["type"].compile(dialect=engine.dialect)
+            assert reflected == column.type.compile(dialect=engine.dialect), (table.name, column.name)
+        primary_key = inspector.get_pk_constraint(table.name)["constrained_columns"]
+        assert set(primary_key) == {column.name for column in table.primary_key}, table.name
+        indexes = {index["name"]: index["column_names"] for index in inspector.get_indexes(table.name)}
+        assert indexes == {index.name: [column.name for column in index.columns] for index in table.indexes}, table.name
+
+
+def test_upgrade_baseline_database():
+    engine = _engine()
+    baseline.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO documents (id, filename, original_content, markdown_content, processing_status) "
+            "VALUES (1, 'report.pdf', 'page one text', '# Report', 'completed'), "
+            "(2, 'stuck.pdf', NULL, NULL, 'processing'), "
+            "(3, 'copy.pdf', 'page one text', NULL, 'completed')"
+        ))
+        conn.execute(text("INSERT INTO schemas (id, name, schema_definition) VALUES (1, 'Invoice', '{}')"))
+
+    assert run_migrations(bind=engine) == [version for version, _ in MIGRATIONS]
+
+    columns = {column["name"] for column in inspect(engine).get_columns("documents")}
+    assert not columns & {"original_content", "markdown_content", "structured_content", "extracted_schema"}
+    assert {"original_content_hash", "version", "previous_version_id"} <= columns
+    assert "priority" in {column["name"] for column in inspect(engine).get_columns("jobs")}
+
+    with Session(bind=engine) as db:
+        report = db.get(Document, 1)
+        assert report.original_content == "page one text"
+        assert report.markdown_content == "# Report"
+        assert report.structured_content is None
+        assert report.version == 1
+        # Identical text is stored once
+        assert db.get(Document, 3).original_content_hash == report.original_content_hash == blob_hash("page one text")
+        assert db.query(ContentBlob).count() == 2
+        assert db.get(Schema, 1).name == "Invoice"
+
+        # The document a crash left in "processing" is queued again at startup
+        assert recover_stale_jobs(db) == 1
+        job = db.query(Job).one()
+        assert job.document_id == 2 and job.status == "queued" and job.priority == 0
+        assert db.get(Document, 2).processing_status == "queued"
+
+
+if __name__ == "__main__":
+    test_fresh_database()
+    test_migrations_build_the_models_schema()
+    test_upgrade_baseline_database()
+    print("Migration tests passed")
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app'))
+
+from rules import extract_fields
+
+SCHEMA = {"tax_amount": "number", "total_amount": "number"}
+
+
+def test_amounts():
+    values, _ = extract_fields("Tax: $100.00\nTotal: 1,100.00", SCHEMA)
+    assert values == {"tax_amount": 100.0, "total_amount": 1100.0}
+
+
+def test_percentages_are_not_amounts():
+    for text in ("Tax: 10%  Total: 1,100.00", "Tax: 10 %  Total: 1,100.00", "Tax: 7.5%  Total: 1,100.00"):
+        values, _ = extract_fields(text, SCHEMA)
+        assert "tax_amount" not in values, text
+        assert values["total_amount"] == 1100.0, text
+
+
+if __name__ == "__main__":
+    test_amounts()
+    test_percentages_are_not_amounts()
+    print("Rule tests passed")
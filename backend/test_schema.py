@@ -1,14 +1,16 @@
 #!/usr/bin/env python3
 
-import sys
-import os
-sys.path.append('/home/opensource/PageMonk/backend')
-
 import json
-from app.database import engine, get_db, Schema
+
+import conftest  # noqa: F401  (throwaway database and app path)
+
+from database import engine, Schema
+from migrations import run_migrations
 from sqlalchemy.orm import Session
 
 def test_schema_creation():
+    # Tables are created by the migrations, not at import
+    run_migrations()
     # Create a database session
     db = Session(bind=engine)
     
@@ -50,6 +52,7 @@ def test_schema_creation():
         print(f"Error: {e}")
         import traceback
         traceback.print_exc()
+        raise
     finally:
         db.close()
 
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app'))
+
+from validation import InvalidValue, coerce, repair_json, validate_fields
+
+
+def test_repair_json_wrapped_answers():
+    expected = {"total": 12.5, "vendor": "Acme"}
+    for answer in (
+        '{"total": 12.5, "vendor": "Acme"}',
+        '```json\n{"total": 12.5, "vendor": "Acme"}\n```',
+        'Here is the result: {"total": 12.5, "vendor": "Acme"} Hope this helps!',
+        '<think>{"draft": true}</think>{"total": 12.5, "vendor": "Acme"}',
+        '{"total": 12.5, "vendor": "Acme",}',
+    ):
+        assert repair_json(answer) == expected, answer
+
+
+def test_repair_json_truncated_answers():
+    assert repair_json('{"vendor": "Acme", "items": [1, 2') == {"vendor": "Acme", "items": [1, 2]}
+    assert repair_json('{"vendor": "Acme", "note": "cut of') == {"vendor": "Acme", "note": "cut of"}
+    assert repair_json('{"vendor": "Acme", "total":') == {"vendor": "Acme", "total": None}
+    # Braces inside strings do not count as structure
+    assert repair_json('{"note": "a } b", "n": 1}') == {"note": "a } b", "n": 1}
+
+
+def test_repair_json_without_object():
+    for answer in ("I could not find anything.", "<think>{}</think>no json"):
+        try:
+            repair_json(answer)
+        except ValueError:
+            continue
+        raise AssertionError(answer)
+
+
+def test_coerce_scalars():
+    assert coerce("number", "$1,250.00") == 1250.0
+    assert coerce("number", 3) == 3.0
+    assert coerce("integer", "42") == 42
+    assert coerce("boolean", "Yes") is True
+    assert coerce("boolean", "no") is False
+    assert coerce("string", 17) == "17"
+    assert coerce("date", "2024-01-31") == "2024-01-31"
+    assert coerce("Name of the vendor", "Acme") == "Acme"
+    # Placeholders and one-item lists where a single value was asked for
+    assert coerce("number", "N/A") is None
+    assert coerce("string", ["USD"]) == "USD"
+
+
+def test_coerce_nested():
+    schema = {"vendor": "string", "items": [{"name": "string", "price": "number"}]}
+    value = {"vendor": "Acme", "items": {"name": "Widget", "price": "9.99"}, "extra": 1}
+    assert coerce(schema, value) == {"vendor": "Acme", "items": [{"name": "Widget", "price": 9.99}]}
+
+
+def test_coerce_rejects_wrong_types():
+    for schema, value in (
+        ("number", "twelve"),
+        ("integer", "2.5"),
+        ("boolean", "maybe"),
+        ("number", True),
+        ("string", {"a": 1}),
+        ({"vendor": "string"}, "Acme"),
+    ):
+        try:
+            coerce(schema, value)
+        except InvalidValue:
+            continue
+        raise AssertionError((schema, value))
+
+
+def test_validate_fields_reports_invalid_fields():
+    values, invalid = validate_fields({"total": "number", "vendor": "string"}, '{"total": "lots", "vendor": "Acme"}')
+    assert values == {"total": None, "vendor": "Acme"}
+    assert list(invalid) == ["total"]
+
+
+if __name__ == "__main__":
+    test_repair_json_wrapped_answers()
+    test_repair_json_truncated_answers()
+    test_repair_json_without_object()
+    test_coerce_scalars()
+    test_coerce_nested()
+    test_coerce_rejects_wrong_types()
+    test_validate_fields_reports_invalid_fields()
+    print("Validation tests passed")
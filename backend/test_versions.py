@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+import conftest  # noqa: F401  (throwaway database and app path)
+
+from chunking import join_pages
+from database import SessionLocal, Document, DocumentPage
+from migrations import run_migrations
+from versions import Page, StoredPage, link_similar, plan_segments, save_pages, text_hash
+
+
+def _pages(*texts):
+    return [Page(number, "", text) for number, text in enumerate(texts, 1)]
+
+
+def _stored(pages, segments):
+    """The pages of a previous version, structured in `segments` of (first, last, markdown)"""
+    stored = []
+    for first, last, markdown in segments:
+        for page in pages[first - 1:last]:
+            stored.append(StoredPage(page.number, "", text_hash(page.text), page.text, first, markdown))
+    return stored
+
+
+def test_new_pages_are_split_by_token_budget():
+    pages = _pages(*(f"page {n} " + "x" * 400 for n in range(1, 6)))
+    segments = plan_segments(pages, [], max_tokens=250)
+    assert [(s.first_page, s.last_page) for s in segments] == [(1, 2), (3, 4), (5, 5)]
+    assert all(s.markdown is None for s in segments)
+    assert "page 1" in segments[0].text and "page 2" in segments[0].text
+
+
+def test_unchanged_segments_are_reused():
+    old = _pages("intro", "terms", "prices", "appendix a", "appendix b")
+    previous = _stored(old, [(1, 2, "# Intro"), (3, 3, "# Prices"), (4, 5, "# Appendix")])
+    # Prices changed, and a page was inserted inside the appendix segment
+    new = _pages("intro", "terms", "new prices", "appendix a", "inserted", "appendix b")
+    segments = plan_segments(new, previous, max_tokens=1000)
+    assert [(s.first_page, s.last_page, s.markdown) for s in segments] == [
+        (1, 2, "# Intro"),
+        (3, 6, None),
+    ]
+
+
+def test_reused_segment_can_move():
+    old = _pages("cover", "summary", "details")
+    previous = _stored(old, [(1, 1, "# Cover"), (2, 3, "# Summary")])
+    new = _pages("new cover", "cover", "summary", "details")
+    segments = plan_segments(new, previous, max_tokens=1000)
+    assert [(s.first_page, s.last_page, s.markdown) for s in segments] == [
+        (1, 1, None),
+        (2, 2, "# Cover"),
+        (3, 4, "# Summary"),
+    ]
+
+
+def _parsed(db, filename, texts):
+    """A parsed document whose page rows are stored, as process_parse leaves it"""
+    pages = _pages(*texts)
+    document = Document(filename=filename, processing_status="completed")
+    document.original_content, _ = join_pages(texts)
+    db.add(document)
+    db.flush()
+    segments = plan_segments(pages, [], max_tokens=1000)
+    save_pages(db, document, pages, segments, [(0, 0)] * len(segments))
+    db.commit()
+    return document
+
+
+def _upload(db, filename):
+    document = Document(filename=filename, processing_status="processing")
+    db.add(document)
+    db.commit()
+    return document
+
+
+def _reset():
+    run_migrations()
+    with SessionLocal() as db:
+        db.query(DocumentPage).delete()
+        db.query(Document).delete()
+        db.commit()
+
+
+def test_link_similar_prefers_similar_candidate():
+    _reset()
+    with SessionLocal() as db:
+        other = _parsed(db, "contract.pdf", ["a", "b", "c", "d"])
+        candidate = _parsed(db, "scan.pdf", ["a", "b", "c", "x"])
+        document = _upload(db, "scan.pdf")
+        linked = link_similar(db, document, _pages("a", "b", "c", "y"), candidate)
+        assert linked is candidate
+        assert document.previous_version_id == candidate.id and document.version == 2
+        assert other.id != linked.id
+
+
+def test_link_similar_skips_unrelated_candidate():
+    _reset()
+    with SessionLocal() as db:
+        contract = _parsed(db, "contract.pdf", ["a", "b", "c", "d"])
+        unrelated = _parsed(db, "scan.pdf", ["invoice 1", "invoice 2"])
+        document = _upload(db, "scan.pdf")
+        # Same filename but no shared pages: the most similar document wins instead
+        linked = link_similar(db, document, _pages("a", "b", "c", "e"), unrelated)
+        assert linked is contract
+        assert document.previous_version_id == contract.id
+
+
+def test_link_similar_needs_enough_shared_pages():
+    _reset()
+    with SessionLocal() as db:
+        _parsed(db, "report.pdf", ["a", "b", "c", "d", "e", "f"])
+        document = _upload(db, "other.pdf")
+        assert link_similar(db, document, _pages("a", "x", "y", "z")) is None
+        assert document.previous_version_id is None
+        assert link_similar(db, document, _pages("", "  ")) is None
+
+
+if __name__ == "__main__":
+    test_new_pages_are_split_by_token_budget()
+    test_unchanged_segments_are_reused()
+    test_reused_segment_can_move()
+    test_link_similar_prefers_similar_candidate()
+    test_link_similar_skips_unrelated_candidate()
+    test_link_similar_needs_enough_shared_pages()
+    print("Version tests passed")
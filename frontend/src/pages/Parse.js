@@ -63,8 +63,8 @@ const Parse = ({ darkMode }) => {
         // Then start the parsing process
         await api.post(`/parse/${documentId}`);
         
-        // Start polling for processing completion
-        pollProcessingStatus(documentId, fileData.id);
+        // Follow processing progress over server-sent events
+        watchProcessing(documentId, fileData.id);
         
       } catch (error) {
         console.error('Upload error:', error);
@@ -77,6 +77,45 @@ const Parse = ({ darkMode }) => {
     setIsUploading(false);
   }, []);
 
+  const watchProcessing = (documentId, fileId) => {
+    if (typeof EventSource === 'undefined') {
+      pollProcessingStatus(documentId, fileId);
+      return;
+    }
+
+    const events = new EventSource(`${api.defaults.baseURL}/documents/${documentId}/events`);
+
+    // Show markdown as it is generated; the stored document replaces it on completion
+    events.addEventListener('markdown', (event) => {
+      const { text } = JSON.parse(event.data);
+      setProcessingResults(prev => ({
+        ...prev,
+        [fileId]: {
+          ...prev[fileId],
+          markdown: (prev[fileId]?.markdown || '') + text
+        }
+      }));
+    });
+
+    events.addEventListener('retry', () => {
+      setProcessingResults(prev => ({ ...prev, [fileId]: { ...prev[fileId], markdown: '' } }));
+    });
+
+    const finish = () => {
+      events.close();
+      pollProcessingStatus(documentId, fileId);
+    };
+    events.addEventListener('completed', finish);
+    events.addEventListener('failed', finish);
+
+    // Fall back to polling if the stream cannot be opened or drops for good
+    events.onerror = () => {
+      if (events.readyState === EventSource.CLOSED) {
+        pollProcessingStatus(documentId, fileId);
+      }
+    };
+  };
+
   const pollProcessingStatus = async (documentId, fileId) => {
     try {
       const response = await api.get(`/documents/${documentId}`);
@@ -297,14 +336,14 @@ const Parse = ({ darkMode }) => {
                     </div>
                   )}
                   
-                  {fileData.status === 'completed' && results && (
+                  {(fileData.status === 'completed' || (fileData.status === 'processing' && results?.markdown)) && results && (
                     <div className="mt-6 p-4 bg-slate-50 dark:bg-slate-800 rounded-xl">
                       <div className="flex items-center justify-between mb-3">
                         <h4 className="text-sm font-medium text-slate-900 dark:text-slate-50">
                           Extracted Content Preview
                         </h4>
                         <span className="text-xs text-emerald-600 dark:text-emerald-400 font-medium">
-                          Ready
+                          {fileData.status === 'completed' ? 'Ready' : 'Generating...'}
                         </span>
                       </div>
                       